@@ -1,103 +1,196 @@
-import math
-import numpy as np
+import asyncio
+import concurrent.futures
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import pandas as pd
-import joblib
-from script.model_data_fetch import safe_fetch
-from script.classifier_model_training import predict_with_threshold
-from script.train_volatility_prediction import volatility_predict
+from script.model_data_fetch import fetch_scheduler
+from script.prediction import forecast_volatility, fetch_latest, init_worker, predict_in_worker
+from script.prediction_cache import with_threshold
+from script.precompute_store import PrecomputeStore, PRECOMPUTE_PATH
+from script.engine import default_engine, versioned
+from script.metrics import trace_http_request, record_spans, render_metrics
+from script.stream_encoding import encode_ndjson, encode_arrow, NDJSON_MEDIA_TYPE, ARROW_MEDIA_TYPE
+from datetime import date
 import os
 import uvicorn
 
 import warnings
 warnings.filterwarnings('ignore')
 
-MODEL_FOLDER = "model"
-MODEL_FILE_NAME = "stock_prediction26-09-2025_21-59-07.pkl"
-MODEL_PATH = os.path.join(MODEL_FOLDER, MODEL_FILE_NAME)
+# the served model, bar store, garch options, streaming feature engines, prediction cache and shared
+# panel, built by script.engine the same way app.py builds them for its in process mode (see default_engine)
+engine = default_engine()
+model_registry = engine.model_registry
+bar_store = engine.bar_store
+GARCH_OPTIONS = engine.garch_options
+feature_engines = engine.feature_engines
+prediction_cache = engine.prediction_cache
+shared_panel = engine.panel
 
-model = joblib.load(MODEL_PATH)
+# fitted volatility forecasters per ticker, each new bar only costs one variance recursion step
+volatility_forecasters = {}
+
+# pre-market results written by script.precompute, read back by /predict/precomputed
+precompute_store = PrecomputeStore(PRECOMPUTE_PATH)
+
+# async mode: fetches run as awaitable threads, at most FETCH_CONCURRENCY at a time, while the
+# classifier and garch run on a process pool sized to the cores (created on first use)
+FETCH_CONCURRENCY = 16
+fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+cpu_pool = None
+
+def get_cpu_pool():
+    global cpu_pool
+    if cpu_pool is None:
+        cpu_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1, initializer=init_worker, initargs=(model_registry.current().path,)
+        )
+    return cpu_pool
 
 app = FastAPI(title="ML API with Automated feature fetech")
 
+# stage timings to /metrics and the X-Stage-Timings header, a [TIMING] line with API_TIMING_LOG=1
+# and a stack profile with ?profile=1 (see script.metrics.trace_http_request)
+app.middleware("http")(trace_http_request)
+
 class InputData(BaseModel):
     ticker: str
     threshold: float
 
-def make_json_serializable(obj):
-    """
-    Recursively convert objects into JSON-serializable formats.
-    Also converts NaN and infinite values to None.
-    """
-    if isinstance(obj, dict):
-        return {str(k): make_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [make_json_serializable(v) for v in obj]
-    elif hasattr(obj, "item"):
-        try:
-            value = obj.item()
-            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-                return None
-            return value
-        except Exception:
-            return str(obj)
-    elif isinstance(obj, (pd.Timestamp, pd.Timedelta)):
-        return str(obj)
-    elif isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif isinstance(obj, np.generic):
-        value = obj.item()
-        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-            return None
-        return value
-    else:
-        return obj
+class BatchInputData(BaseModel):
+    tickers: list[str]
+    threshold: float
+
+class StreamInputData(BaseModel):
+    tickers: list[str]
+    threshold: float
+    format: str = "ndjson"  # or "arrow"
+
+class VolatilityInputData(BaseModel):
+    ticker: str
+    refit: bool = False
+
+class ActivateModelData(BaseModel):
+    version: str  # sha256, a unique prefix of it, or the model file name
 
 @app.post("/predict")
 def predict(data: InputData):
     try:
-        # fetching the data from function made and assigning it  
-        print("Starting fetching data process...")
-        df, X, _ = safe_fetch(
-            data.ticker,
-            interval="1d",
-            period="5y",
-            feature_cal=True,
-        )
+        return engine.reply(data.ticker, data.threshold)
+    except Exception as e:
+        return {"Error": str(e)}
 
-        last_date = df.index[-1]
+@app.post("/predict/batch")
+def predict_batch_endpoint(data: BatchInputData):
+    # one classifier call for every ticker, failed tickers carry their own error
+    try:
+        version, replies = engine.replies(data.tickers, data.threshold)
+        return {"Model Version": version, "Predictions": replies}
+    except Exception as e:
+        return {"Error": str(e)}
 
-        print("Aligning the feature to predict....")
-        features = X.tail(1) # getting on which prediction is to be made
+@app.post("/predict/stream")
+def predict_stream(data: StreamInputData):
+    # one flat record per ticker as soon as it is done (ndjson lines or arrow ipc record batches),
+    # failed tickers carry their error in the record. the body is produced while tickers are
+    # still running, only a bounded window of them is in flight
+    if data.format == "ndjson":
+        return StreamingResponse(encode_ndjson(engine.stream(data.tickers, data.threshold)), media_type=NDJSON_MEDIA_TYPE)
+    if data.format == "arrow":
+        return StreamingResponse(encode_arrow(engine.stream(data.tickers, data.threshold)), media_type=ARROW_MEDIA_TYPE)
+    return {"Error": f"Unknown stream format {data.format}, use ndjson or arrow"}
 
-        print("Sending the data for clf model.")
-        direction_pred, direction_proba = predict_with_threshold(
-            model, features, data.threshold # trigger model for direction prediction
-        )
+@app.post("/predict/async")
+async def predict_async(data: InputData):
+    # same response as /predict without holding a worker thread for the whole request
+    try:
+        served = model_registry.current()
+        async with fetch_semaphore:
+            key, last_close = await asyncio.to_thread(engine.lookup, data.ticker, data.threshold, served.version)
+            reply = prediction_cache.get(key)
+            if reply is not None:
+                return versioned(with_threshold(reply, data.threshold), served.version, last_close)
+            df, features = await asyncio.to_thread(
+                fetch_latest, data.ticker, store=bar_store, engines=feature_engines, panel=shared_panel
+            )
 
-        direction = "Up" if direction_pred == 1 else "Down"
-        
-        print("Sending the data for Garch model.")
-        # garch model prediton for the volatility
-        garch_reply = volatility_predict(df)
+        registry = GARCH_OPTIONS["registry"]
+        # one process per request already, so the garch grid itself runs sequentially
+        garch_options = dict(GARCH_OPTIONS, n_jobs=1)
+        garch_options["registry"] = registry.snapshot(data.ticker) if registry is not None else None
 
-        # Make sure garch_reply is fully serializable
-        garch_reply = make_json_serializable(garch_reply)
+        loop = asyncio.get_running_loop()
+        reply, snapshot, spans = await loop.run_in_executor(
+            get_cpu_pool(), predict_in_worker, data.ticker, features, df[["Close"]], data.threshold, garch_options,
+            served.path,
+        )
+        record_spans(spans)
+        if registry is not None:
+            registry.merge(snapshot)
+        prediction_cache.put(key, reply)
+        return versioned(reply, served.version, last_close)
+    except Exception as e:
+        return {"Error": str(e)}
 
-        print("Sucessfull")
+@app.post("/predict/precomputed")
+def predict_precomputed(data: BatchInputData):
+    # lookup only: today's pre-market run for the served model, tickers not in it are listed as missing
+    try:
+        run = precompute_store.latest_run(
+            run_date=date.today().isoformat(), model_version=model_registry.current().version
+        )
+        if run is None:
+            return {"Error": "No pre-market run for today with the loaded model"}
+        found = precompute_store.get_many(data.tickers, *run)
         return {
-            "Last Date": str(last_date),
-            "Direction Prediction": {
-                "Direction": direction,
-                "Probability": float(direction_proba),
+            "Run Date": run[0],
+            "Model Version": run[1],
+            "Predictions": {
+                t: {"Error": e["error"]} if e["error"] is not None else with_threshold(e["reply"], data.threshold)
+                for t, e in found.items()
             },
-            "Volatility Prediction": garch_reply,
+            "Missing": [t for t in dict.fromkeys(data.tickers) if t not in found],
         }
     except Exception as e:
         return {"Error": str(e)}
 
+@app.post("/predict/volatility")
+def predict_volatility(data: VolatilityInputData):
+    # no mle fit unless the ticker is new or a refit is asked for
+    try:
+        return forecast_volatility(
+            volatility_forecasters, data.ticker, store=bar_store, refit=data.refit, garch_options=GARCH_OPTIONS
+        )
+    except Exception as e:
+        return {"Error": str(e)}
+
+@app.get("/models")
+def list_models():
+    # manifest of the model folder: every version with its file, training date and metrics
+    return model_registry.versions()
+
+@app.post("/models/activate")
+def activate_model(data: ActivateModelData):
+    # loads the version while the current one keeps serving, then swaps
+    try:
+        model_registry.activate(data.version)
+        served = model_registry.current()
+        return {"Model Version": served.version, "File": os.path.basename(served.path)}
+    except Exception as e:
+        return {"Error": str(e)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # prometheus scrape target: latency histograms per prediction stage and per endpoint
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/fetch/stats")
+def fetch_stats():
+    return fetch_scheduler.stats()
+
 if __name__ == "__main__":
     uvicorn.run("api_app:app", host="127.0.0.1", port=5000, reload=True)
\ No newline at end of file
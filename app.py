@@ -7,15 +7,55 @@ from datetime import datetime
 import warnings
 
 from script.tickers import get_ticker_nse
-from script.trade_calculator import request_to_api_loacal_host
-from script.trade_performance import trade_performance_calculator
+from script.trade_calculator import (request_to_api_loacal_host, precomputed_trade_setups, served_model_version,
+                                    stream_predictions)
+from script.trade_performance import simulate_trades
+from script.intraday_store import session_days, today
+from script.engine import default_engine, Prediction, TradeSetup
 
 warnings.filterwarnings('ignore')
 
+ENGINE_MODE = "In-process engine"
+HTTP_MODE = "HTTP API (api_app.py)"
+
+# trade performance session picker: the latest completed session, or a weekday of the minute bar window
+LATEST_SESSION = "Latest completed session"
+SESSION_CHOICE_DAYS = 30
+
+@st.cache_resource
+def prediction_engine():
+    # built once per streamlit server and shared by every session: model, bar store and caches stay loaded
+    return default_engine()
+
+def trade_setups(tickers: list, risk: float, mode: str):
+    """ {ticker: TradeSetup} from the in-process engine, or one pooled api request per ticker. """
+    if mode == ENGINE_MODE:
+        return prediction_engine().trade_setups(tickers, risk)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+        rows = executor.map(request_to_api_loacal_host, tickers, [risk]*len(tickers))
+        return {t: TradeSetup.from_row(row) for t, row in zip(tickers, rows)}
+
+def stream_trade_setups(tickers: list, risk: float, mode: str):
+    """ yields a TradeSetup per ticker as soon as its prediction is done (engine.stream or /predict/stream). """
+    if mode == ENGINE_MODE:
+        predictions = (prediction for batch in prediction_engine().stream(tickers) for prediction in batch)
+    else:
+        predictions = (Prediction(**record) for record in stream_predictions(tickers))
+    for prediction in predictions:
+        yield TradeSetup.from_prediction(prediction, risk)
+
+def served_version(mode: str):
+    """ version of the model the live predictions of mode come from. """
+    if mode == ENGINE_MODE:
+        return prediction_engine().model_registry.current().version
+    return served_model_version()
+
 # ----------------- UI -----------------
 st.set_page_config(page_title="Trading Assistant", layout="wide")
 st.title("Trading Assistant")
 
+mode = st.sidebar.radio("Predictions from", [ENGINE_MODE, HTTP_MODE])
+
 tabs = st.tabs(["Prediction API Test", "Trade Calculator", "Trade Performance"])
 
 # ----------------- Tab 1: API Test -----------------
@@ -26,30 +66,13 @@ with tabs[0]:
     st.write("The value should be betweem 0-1, which representing the confidence where lower leans to short trades and higher leans to long trades.")
     if st.button("Run Prediction", key="api_test"):
         try:
-            # Call API (or directly import from api_app)
-            from script.trade_calculator import request_to_api_loacal_host
-            result = request_to_api_loacal_host(ticker, threshold)
+            setup = trade_setups([ticker], threshold, mode)[ticker]
 
-            if result[0] is None:
+            if setup.ticker is None:
                 st.error("Prediction failed.")
             else:
-                (ticker, type_, ticker_proba, ticker_predicted_change, 
-                ticker_predicted_var, confidence, current_price, 
-                target_price, sl_price, aic_score) = result
-
                 st.write("Prediction Result")
-                st.json({
-                    "Ticker": ticker,
-                    "Type": type_,
-                    "Probability": ticker_proba,
-                    "Predicted Change": ticker_predicted_change,
-                    "Predicted Variance": ticker_predicted_var,
-                    "Confidence": confidence,
-                    "Current Price": current_price,
-                    "Target Price": target_price,
-                    "SL Price": sl_price,
-                    "AIC Score": aic_score
-                })
+                st.json(setup.display())
         except Exception as e:
             st.error(f"Error: {e}")
 
@@ -67,35 +90,31 @@ with tabs[1]:
 
     st.write("Note: This function should only be runned before the trading hours.")
     if st.button("Run Trade Calculator"):
-        results_list = []
+        table = st.empty()
 
         with st.spinner("Fetching predictions..."):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-                results = list(executor.map(request_to_api_loacal_host, tickers, [risk_rate]*len(tickers)))
-
-            for res in results:
-                if res[0] is None:
-                    continue
-                (ticker, type_, ticker_proba, ticker_predicted_change, 
-                 ticker_predicted_var, confidence, current_price, 
-                 target_price, sl_price, aic_score) = res
-
-                results_list.append({
-                    "Ticker": ticker,
-                    "Type": type_,
-                    "Probability": ticker_proba,
-                    "Predicted Change": ticker_predicted_change,
-                    "Predicted Variance": ticker_predicted_var,
-                    "Confidence": confidence,
-                    "Current Price": current_price,
-                    "Target Price": target_price,
-                    "SL Price": sl_price,
-                    "AIC Score": aic_score
-                })
+            # today's pre-market run (python -m script.precompute) of the served model first, the rest is
+            # streamed and every row shows up as soon as its ticker is done
+            precomputed, run_date = precomputed_trade_setups(tickers, risk_rate, served_version(mode))
+            if run_date is not None:
+                st.info(f"{len(precomputed)}/{len(tickers)} tickers read from the pre-market run of {run_date}.")
+            results = {t: TradeSetup.from_row(precomputed[t]) for t in tickers if t in precomputed}
+            if results:
+                table.dataframe(pd.DataFrame([setup.display() for setup in results.values()]))
+            live = [t for t in tickers if t not in precomputed]
+            try:
+                for setup in stream_trade_setups(live, risk_rate, mode) if live else []:
+                    results[setup.ticker] = setup
+                    table.dataframe(pd.DataFrame([setup.display() for setup in results.values()]))
+            except Exception as e:
+                st.error(f"Prediction stream failed: {e}")
+
+            # the final sheet in the order the tickers were picked
+            results_list = [results[t].display() for t in tickers if t in results]
 
         if results_list:
             df = pd.DataFrame(results_list)
-            st.dataframe(df)
+            table.dataframe(df)
             filename = f"trades-{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.csv"
             st.success(f"Successfully Completed the process, Download the data from the button.")
             st.download_button("Download CSV", df.to_csv(index=False), file_name=filename)
@@ -104,6 +123,10 @@ with tabs[1]:
 with tabs[2]:
     st.subheader("Trade Performance Calculator")
     uploaded_file = st.file_uploader("Upload Trade Data (CSV)", type=["csv"])
+    current = pd.Timestamp(today())
+    choices = session_days(current - pd.Timedelta(days=SESSION_CHOICE_DAYS - 1), current)[::-1]
+    choice = st.selectbox("Session", [LATEST_SESSION] + choices)
+    session = None if choice == LATEST_SESSION else choice
     st.write("Note: This function only support a specific format which is generated from the Trade Calculator tab and should be runned after the trading hours.")
 
     if uploaded_file is not None:
@@ -111,21 +134,11 @@ with tabs[2]:
         df.dropna(inplace=True) 
         st.write("Uploaded Data", df)
 
-        # Apply trade performance
-        def apply_trade_performance(row):
-            return trade_performance_calculator(
-                ticker=row["Ticker"],
-                last_price=row["Current Price"],
-                stop_loss=row["SL Price"],
-                target_price=row["Target Price"],
-                long=True if row["Type"].lower() == "long" else False,
-                executing_interval=5,
-                executing_interval_price=0.2
-            )
-
         with st.spinner("Calculating performance..."):
-            performance_results = df.apply(apply_trade_performance, axis=1)
-            performance_df = pd.DataFrame(list(performance_results))
+            # whole sheet at once, the session's minute bars are read once per ticker from the intraday store
+            performance_results = simulate_trades(df, executing_interval=5, executing_interval_price=0.2,
+                                                  session=session)
+            performance_df = pd.DataFrame(performance_results)
 
         st.write("Performance Results", performance_df)
         filename = f"trade_performance-{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.csv"
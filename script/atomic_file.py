@@ -0,0 +1,56 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path: str):
+    """
+        yields a temp file path of its own in the folder of path and renames it over path when the
+        block is done, so readers never see a half written file and two writers (threads or api
+        workers) never write into the same temp file. the temp file is removed on an error.
+    """
+    folder = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile(dir=folder, prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     delete=False) as f:
+        tmp = f.name
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def file_lock(path: str):
+    """ exclusive lock across processes on path + ".lock", held for the block. """
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def merge_json(path: str, changed: dict):
+    """
+        writes the changed keys into the json object at path and returns the merged object.
+        the file is read again under the lock first, so the keys other processes wrote since this
+        one loaded it are kept instead of being overwritten by a stale in-memory copy.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with file_lock(path):
+        merged = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                merged = json.load(f)
+        merged.update(changed)
+        with atomic_path(path) as tmp, open(tmp, "w") as f:
+            json.dump(merged, f, indent=2)
+    return merged
@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from script import model_data_fetch
+from script.model_data_fetch import safe_fetch, ticker_sector, FEATURE_COLUMNS
+from script.panel_features import panel_features, CHUNK_SIZE
+from script.lean_model import load_model
+
+# rows per predict_proba call when scoring the history
+SCORE_CHUNK = 250_000
+
+# threshold / band configurations evaluated together, bounds the (rows x configs) work arrays
+CONFIG_CHUNK = 16
+
+# the default sweep, 21 thresholds x 16 bands. a row trades when |proba - 0.5| > band, long when
+# proba >= threshold and short otherwise. the trade calculator's confidence levels are the bands
+# 0.02 (Medium), 0.04 (High) and 0.10 (Very High) at the api's default threshold of 0.5
+THRESHOLDS = np.round(np.arange(0.40, 0.6001, 0.01), 2)
+BANDS = np.round(np.arange(0.0, 0.1501, 0.01), 2)
+CONFIDENCE_BANDS = {"Medium": 0.02, "High": 0.04, "Very High": 0.10}
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+STATS = ("days", "trades", "hits", "pnl", "turnover")
+
+
+def trained_until(model_path: str):
+    """
+        newest bar date of the dataset the model was trained from (that bar had no label yet, the
+        model saw the rows before it), from the json script/train.py writes next to it.
+    """
+    if not os.path.exists(model_path + ".json"):
+        return None
+    with open(model_path + ".json") as f:
+        return json.load(f).get("trained_until")
+
+
+def score(model, X: pd.DataFrame, chunk: int = SCORE_CHUNK):
+    """ probability of an up move for every row of X, predict_proba on chunk rows at a time. """
+    return np.concatenate([
+        model.predict_proba(X.iloc[start:start + chunk])[:, 1] for start in range(0, len(X), chunk)
+    ]) if len(X) else np.empty(0)
+
+
+def _after(dates: pd.DatetimeIndex, since):
+    cutoff = pd.Timestamp(since)
+    if dates.tz is not None and cutoff.tz is None:
+        cutoff = cutoff.tz_localize(dates.tz)
+    return dates > cutoff
+
+
+def backtest_frame(model, ticker_list, store=None, period: str = "5y", since=None, max_workers: int = 8,
+                   chunk_size: int = CHUNK_SIZE):
+    """
+        walk-forward scores of model over the daily history of ticker_list: every row is the model's
+        probability from the features known at that close and the return of the next close, so
+        nothing after the bar leaks into its position. bars come from store (a BarStore) or yahoo,
+        features from panel_features a chunk of tickers at a time, and each chunk is scored in one
+        predict_proba call before its features are dropped. since keeps only bars after it (pass
+        the model's trained_until to stay out of sample). the last bar of a ticker has no next
+        close and is left out.
+        returns a frame indexed by Date, ordered by ticker then date, with proba, next_return,
+        ticker, sector and day_of_week.
+    """
+    model_data_fetch.ticker_metadata.refresh_missing(ticker_list)
+    parts = []
+    for first in range(0, len(ticker_list), chunk_size):
+        chunk = ticker_list[first:first + chunk_size]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda t: safe_fetch(t, "1d", period, False, store), chunk))
+        bars = {t: r[0] for t, r in zip(chunk, results) if r is not None and r[0] is not None and not r[0].empty}
+        if not bars:
+            continue
+        long = pd.concat([df.assign(ticker=t) for t, df in bars.items()]).rename_axis("Date")
+        del results, bars
+        X, _ = panel_features(long, {t: ticker_sector(t) for t in long["ticker"].unique()})
+
+        long = long.reset_index().sort_values(["ticker", "Date"], kind="stable")
+        close = long["Close"].to_numpy()
+        next_return = np.full(len(long), np.nan)
+        same_ticker = long["ticker"].to_numpy()[1:] == long["ticker"].to_numpy()[:-1]
+        next_return[:-1] = np.where(same_ticker, close[1:] / close[:-1] - 1, np.nan)
+        lookup = pd.Series(next_return, index=pd.MultiIndex.from_arrays([long["ticker"], long["Date"]]))
+        del long
+
+        keep = lookup.reindex(pd.MultiIndex.from_arrays([X["ticker"].astype(str), X.index])).to_numpy()
+        rows = ~np.isnan(keep)
+        if since is not None:
+            rows &= _after(X.index, since)
+        X, keep = X[rows], keep[rows]
+        parts.append(pd.DataFrame({
+            "proba": score(model, X[FEATURE_COLUMNS]),
+            "next_return": keep,
+            "ticker": X["ticker"].astype(str).to_numpy(),
+            "sector": X["sector"].astype(str).to_numpy(),
+            "day_of_week": X["day_of_week"].astype(str).to_numpy(),
+        }, index=X.index))
+        print(f"{min(first + chunk_size, len(ticker_list))}/{len(ticker_list)} tickers scored")
+    if not parts:
+        raise ValueError("No ticker had enough history to backtest")
+    return pd.concat(parts, axis=0)
+
+
+def _sums(frame: pd.DataFrame, thresholds, bands, cost: float):
+    """
+        (tickers x weekdays x configs) sums of every STATS column. the rows are grouped by
+        (ticker, weekday) cell once, so every stat is one reduceat over the cells, and each row
+        keeps the index of its ticker's previous day for the position change (turnover).
+    """
+    ticker_codes, tickers = pd.factorize(frame["ticker"], sort=True)
+    cell = ticker_codes * len(WEEKDAYS) + pd.Categorical(frame["day_of_week"], categories=WEEKDAYS).codes
+    # frame is in ticker / date order, the previous day is the row before unless the ticker changes
+    n_rows = len(frame)
+    previous = np.r_[-1, np.arange(n_rows - 1)]
+    previous[np.r_[True, ticker_codes[1:] != ticker_codes[:-1]]] = -1
+
+    order = np.argsort(cell, kind="stable")
+    position_of = np.empty(n_rows, dtype=np.int64)
+    position_of[order] = np.arange(n_rows)
+    # a ticker's first day points at an extra all flat row past the end
+    previous = np.where(previous[order] >= 0, position_of[previous[order]], n_rows)
+    cell = cell[order]
+    cell_starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+    cell_ids = cell[cell_starts]
+
+    p = frame["proba"].to_numpy(np.float64)[order]
+    r = frame["next_return"].to_numpy(np.float64)[order]
+    up = np.where(r > 0, 1, -1).astype(np.int8)[:, None]
+    r = r.astype(np.float32)[:, None]
+    confidence = np.abs(p - 0.5)[:, None]
+    p = p[:, None]
+
+    n_cells, n_configs = len(tickers) * len(WEEKDAYS), len(thresholds)
+    sums = {stat: np.zeros((n_cells, n_configs)) for stat in STATS}
+    sums["days"][:] = np.bincount(cell, minlength=n_cells)[:, None]
+    for first in range(0, n_configs, CONFIG_CHUNK):
+        t = thresholds[first:first + CONFIG_CHUNK]
+        b = bands[first:first + CONFIG_CHUNK]
+        columns = slice(first, first + len(t))
+        position = np.zeros((n_rows + 1, len(t)), dtype=np.int8)
+        position[:n_rows] = np.where(p >= t, np.int8(1), np.int8(-1))
+        position[:n_rows][confidence <= b] = 0
+        change = np.abs(position[:n_rows] - position[previous])
+        position = position[:n_rows]
+        sums["trades"][cell_ids, columns] = np.add.reduceat(position != 0, cell_starts, axis=0, dtype=np.int32)
+        # up is never 0, so a match is a traded day that went the way of the position
+        sums["hits"][cell_ids, columns] = np.add.reduceat(position == up, cell_starts, axis=0, dtype=np.int32)
+        sums["turnover"][cell_ids, columns] = np.add.reduceat(change, cell_starts, axis=0, dtype=np.int32)
+        sums["pnl"][cell_ids, columns] = np.add.reduceat(position * r, cell_starts, axis=0)
+    sums["pnl"] -= cost * sums["turnover"]
+    return tickers, {stat: values.reshape(len(tickers), len(WEEKDAYS), n_configs) for stat, values in sums.items()}
+
+
+def _table(names, stats: dict, level: str, thresholds, bands):
+    """ long table, one row per (threshold, band, group), from (groups x configs) sums. """
+    n_groups, n_configs = stats["days"].shape
+    table = pd.DataFrame({
+        "threshold": np.tile(thresholds, n_groups),
+        "band": np.tile(bands, n_groups),
+        level: np.repeat(np.asarray(names), n_configs),
+        **{stat: stats[stat].ravel() for stat in STATS},
+    })
+    table = table[table["days"] > 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table["hit_rate"] = table["hits"] / table["trades"]
+        table["pnl_per_trade"] = table["pnl"] / table["trades"]
+        table["coverage"] = table["trades"] / table["days"]
+        table["turnover"] = table["turnover"] / table["days"]
+    for stat in ("days", "trades", "hits"):
+        table[stat] = table[stat].astype(np.int64)
+    return table.set_index(["threshold", "band", level]).sort_index()
+
+
+def sweep(frame: pd.DataFrame, thresholds=THRESHOLDS, bands=BANDS, cost_bps: float = 0.0):
+    """
+        evaluates every (threshold, band) pair over a backtest_frame at once. a row's position is
+        +1 when proba >= threshold and -1 otherwise, flat when |proba - 0.5| <= band, and is held
+        from one close to the next. per configuration and group it reports days, trades, hits,
+        hit_rate, pnl (sum of next day returns of unit positions less cost_bps per unit of position
+        change), pnl_per_trade, coverage (trades / days) and turnover (position change per day).
+        the garch "room for trade" filter and intraday target / stop levels of the trade
+        calculator are not part of it, this scores the direction signal alone.
+        returns {"overall", "ticker", "sector", "weekday": table indexed by (threshold, band[, group])}.
+    """
+    thresholds, bands = (np.asarray(a, dtype=np.float64) for a in np.meshgrid(thresholds, bands, indexing="ij"))
+    thresholds, bands = thresholds.ravel(), bands.ravel()
+    frame = frame.rename_axis("Date").reset_index().sort_values(["ticker", "Date"], kind="stable")
+    tickers, cells = _sums(frame, thresholds, bands, cost_bps / 10_000)
+    by_ticker = {stat: values.sum(axis=1) for stat, values in cells.items()}
+    by_weekday = {stat: values.sum(axis=0) for stat, values in cells.items()}
+
+    # a ticker has one sector, so the sector and overall sums come from the ticker sums
+    sector_of = frame.groupby("ticker", sort=True)["sector"].first().reindex(tickers).to_numpy()
+    sector_codes, sectors = pd.factorize(sector_of, sort=True)
+    sector_onehot = (sector_codes == np.arange(len(sectors))[:, None]).astype(np.float64)
+    by_sector = {stat: sector_onehot @ values for stat, values in by_ticker.items()}
+    overall = {stat: values.sum(axis=0, keepdims=True) for stat, values in by_ticker.items()}
+
+    return {
+        "overall": _table(["all"], overall, "group", thresholds, bands).droplevel("group"),
+        "ticker": _table(tickers, by_ticker, "ticker", thresholds, bands),
+        "sector": _table(sectors, by_sector, "sector", thresholds, bands),
+        "weekday": _table(WEEKDAYS, by_weekday, "day_of_week", thresholds, bands),
+    }
+
+
+def hand_picked(tables: dict, threshold: float = 0.5):
+    """ the overall rows of the trade calculator's confidence bands at the api's default threshold. """
+    overall = tables["overall"]
+    rows = {name: overall.loc[(threshold, band)] for name, band in CONFIDENCE_BANDS.items()
+            if (threshold, band) in overall.index}
+    return pd.DataFrame(rows).T
+
+
+if __name__ == "__main__":
+    # python -m script.backtest [--model MODEL.pkl] [--since DATE] [--limit N] [--out FOLDER]
+    from script.bar_store import BarStore
+    from script.model_data_fetch import fetch_scheduler
+    from script.tickers import get_ticker_nse
+
+    parser = argparse.ArgumentParser(description="walk-forward backtest and threshold / band sweep")
+    parser.add_argument("--model", default=os.path.join("model", "stock_prediction26-09-2025_21-59-07.pkl"))
+    parser.add_argument("--since", default=None, help="first bar date to score (default: the model's trained_until)")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N tickers of the NSE list")
+    parser.add_argument("--cost-bps", type=float, default=0.0, help="cost per unit of position change")
+    parser.add_argument("--out", default=os.path.join("data", "backtest"), help="folder for the csv tables")
+    args = parser.parse_args()
+
+    since = args.since or trained_until(args.model)
+    if since is None:
+        print("[WARN] The model has no trained_until and no --since was given, in-sample bars are scored too")
+    tickers = get_ticker_nse()[:args.limit]
+    frame = backtest_frame(load_model(args.model), tickers, store=BarStore(os.path.join("data", "bars"),
+                           provider=fetch_scheduler), since=since)
+    tables = sweep(frame, cost_bps=args.cost_bps)
+    os.makedirs(args.out, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(args.out, f"{name}.csv"))
+    print(tables["overall"].sort_values("pnl", ascending=False).head(10))
+    print(hand_picked(tables))
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+from script.atomic_file import atomic_path
+from script.providers import YahooProvider, period_start, slice_period
+
+# period used when a ticker is seen for the first time and we have nothing on disk
+DEFAULT_BACKFILL_PERIOD = "5y"
+
+
+def _backfill_period(interval: str, period: str):
+    """
+        period a full fetch asks for: at least DEFAULT_BACKFILL_PERIOD of daily bars, so a short
+        first read (the 5d cache key lookup) does not store a file the next 5y read must fetch again.
+        other intervals keep the requested period, the provider only serves a short intraday history.
+    """
+    if interval != "1d":
+        return period
+    now = pd.Timestamp.now()
+    start = period_start(now, period)
+    return period if start is None or start <= period_start(now, DEFAULT_BACKFILL_PERIOD) else DEFAULT_BACKFILL_PERIOD
+
+
+class BarStore:
+    """
+        on-disk OHLCV store, one parquet file per (ticker, interval) with a small json sidecar
+        holding the high-water mark (last stored bar), how far back the file is complete and
+        when the tail was last checked.
+
+        history() serves the requested period from disk and only asks the provider for the
+        bars after the high-water mark. the provider is pluggable so the store can be run
+        offline against script.providers.FixtureProvider.
+    """
+
+    def __init__(self, folder: str, provider=None, refresh_interval: float = 300):
+        self.folder = folder
+        self.provider = provider if provider is not None else YahooProvider()
+        self.refresh_interval = refresh_interval  # seconds before the tail is checked again
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _key_path(self, ticker: str, interval: str):
+        name = f"{ticker}_{interval}".replace(os.sep, "_")
+        return os.path.join(self.folder, name)
+
+    def _lock(self, ticker: str, interval: str):
+        with self._locks_guard:
+            return self._locks.setdefault((ticker, interval), threading.Lock())
+
+    def _load(self, ticker: str, interval: str):
+        base = self._key_path(ticker, interval)
+        if not (os.path.exists(base + ".parquet") and os.path.exists(base + ".json")):
+            return None, None
+        with open(base + ".json") as f:
+            meta = json.load(f)
+        return pd.read_parquet(base + ".parquet"), meta
+
+    def _save(self, ticker: str, interval: str, df: pd.DataFrame, meta: dict):
+        base = self._key_path(ticker, interval)
+        # a temp file of its own first so readers never see a half written file, and api workers
+        # saving the same ticker never write into each other's temp file
+        with atomic_path(base + ".parquet") as tmp:
+            df.to_parquet(tmp)
+        with atomic_path(base + ".json") as tmp, open(tmp, "w") as f:
+            json.dump(meta, f)
+
+    def high_water_mark(self, ticker: str, interval: str):
+        """ returns the timestamp of the last stored bar or None. """
+        _, meta = self._load(ticker, interval)
+        return None if meta is None else pd.Timestamp(meta["high_water_mark"])
+
+    def _full_fetch(self, ticker: str, interval: str, period: str):
+        df = self.provider.history(ticker, interval=interval, period=period)
+        if df is None or df.empty:
+            return None, None
+        cutoff = period_start(df.index[-1], period)
+        meta = {
+            "high_water_mark": str(df.index[-1]),
+            # "max" means the file holds the whole available history
+            "covered_from": "max" if cutoff is None else str(cutoff),
+            "checked_at": time.time(),
+        }
+        return df, meta
+
+    def _append_tail(self, ticker: str, interval: str, df: pd.DataFrame, meta: dict):
+        # re-fetch from the bar before the high-water mark, the last bar may still be forming
+        # and the one before it tells us if the provider re-adjusted history (split/dividend)
+        anchor = df.index[-2] if len(df) > 1 else df.index[-1]
+        tail = self.provider.history(ticker, interval=interval, start=anchor)
+        meta["checked_at"] = time.time()
+        if tail is None or tail.empty:
+            return df, meta
+        tail = tail[df.columns.intersection(tail.columns)]
+        if anchor in tail.index and len(df) > 1:
+            old_close, new_close = df.loc[anchor, "Close"], tail.loc[anchor, "Close"]
+            if abs(old_close - new_close) > 1e-6 * max(abs(old_close), 1.0):
+                return None, None  # history was adjusted, caller falls back to a full fetch
+        df = pd.concat([df, tail])
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        meta["high_water_mark"] = str(df.index[-1])
+        return df, meta
+
+    def history(self, ticker: str, interval: str, period: str = DEFAULT_BACKFILL_PERIOD):
+        """
+            returns the bars of ticker for the given period, fetching only what is missing.
+            returns an empty frame when the provider has nothing for the ticker.
+        """
+        with self._lock(ticker, interval):
+            df, meta = self._load(ticker, interval)
+            if df is not None and meta["covered_from"] != "max":
+                cutoff = period_start(pd.Timestamp(meta["high_water_mark"]), period)
+                # stored file does not go back far enough for this period, backfill it
+                if cutoff is None or cutoff < pd.Timestamp(meta["covered_from"]) - pd.Timedelta(days=7):
+                    df = None
+            if df is None:
+                df, meta = self._full_fetch(ticker, interval, _backfill_period(interval, period))
+                if df is None:
+                    return pd.DataFrame()
+                self._save(ticker, interval, df, meta)
+            elif time.time() - meta["checked_at"] >= self.refresh_interval:
+                df, meta = self._append_tail(ticker, interval, df, meta)
+                if df is None:
+                    df, meta = self._full_fetch(ticker, interval, _backfill_period(interval, period))
+                    if df is None:
+                        return pd.DataFrame()
+                self._save(ticker, interval, df, meta)
+            return slice_period(df, period).copy()
@@ -0,0 +1,460 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+import concurrent.futures
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+import requests
+from script import model_data_fetch
+from script.trade_performance import trade_performance_calculator, simulate_trades
+from script.model_data_fetch import model_data, safe_fetch, FEATURE_COLUMNS
+from script.dataset_builder import build_dataset, load_dataset, peak_memory
+from script.model_data_fetch import add_features
+from script.panel_features import panel_features
+from script.providers import SyntheticProvider, synthetic_minute_bars, synthetic_daily_bars
+from script.ticker_metadata import TickerMetadataIndex
+from script.lean_model import predict_with_threshold, load_model, lean_path, LeanModel
+from script.prediction import make_json_serializable
+from script.train_volatility_prediction import volatility_predict
+
+# where run_suite writes its results, one json per commit
+RESULTS_FOLDER = os.path.join("data", "benchmarks")
+BENCHMARK_MODEL = os.path.join("model", "stock_prediction26-09-2025_21-59-07.pkl")
+
+# daily bars per ticker and tickers per call the suite scales over
+HISTORY_LENGTHS = (250, 1250, 2500)
+TICKER_COUNTS = (1, 10, 100)
+
+# loads the model file in a fresh interpreter, so the pickle also pays for importing its libraries
+COLD_LOAD = {
+    "pipeline": "import sys, joblib; joblib.load(sys.argv[1])",
+    "lean": "import sys; from script.lean_model import LeanModel, lean_path; LeanModel.load(lean_path(sys.argv[1]))",
+}
+
+# a benchmark more than this fraction slower than the old run counts as a regression, two runs
+# of the same commit on a busy single core machine differ by up to ~40% on the millisecond paths
+REGRESSION_TOLERANCE = 0.5
+
+
+def synthetic_trades(n_trades: int, n_tickers: int, seed: int = 0):
+    """ Trade Calculator style sheet plus the minute bars of every ticker in it. """
+    rng = np.random.default_rng(seed)
+    bars = {f"SYN{i}.NS": synthetic_minute_bars(seed + i, price=rng.uniform(50, 2000)) for i in range(n_tickers)}
+    tickers = rng.choice(list(bars), n_trades)
+    long = rng.random(n_trades) < 0.5
+    # entry price near the open so a good share of trades get executed
+    price = np.array([bars[t]["Close"].iloc[rng.integers(0, 5)] for t in tickers]) * (1 + rng.normal(0, 0.001, n_trades))
+    move = rng.uniform(0.003, 0.02, n_trades)
+    side = np.where(long, 1, -1)
+    trades = pd.DataFrame({
+        "Ticker": tickers,
+        "Type": np.where(long, "Long", "Short"),
+        "Current Price": price,
+        "Target Price": price * (1 + side * move),
+        "SL Price": price * (1 - side * move),
+    })
+    return trades, bars
+
+
+def benchmark_trade_simulation(n_trades: int = 5000, n_tickers: int = 100, n_legacy: int = 200):
+    """
+        times simulate_trades over n_trades synthetic trades against the row by row
+        trade_performance_calculator (run on the first n_legacy rows and scaled), and checks
+        both return the same records.
+    """
+    trades, bars = synthetic_trades(n_trades, n_tickers)
+
+    start = time.perf_counter()
+    records = simulate_trades(trades, bars=bars)
+    vectorized = time.perf_counter() - start
+
+    legacy_rows = trades.head(n_legacy)
+    start = time.perf_counter()
+    legacy = [
+        trade_performance_calculator(
+            ticker=row["Ticker"], last_price=row["Current Price"], stop_loss=row["SL Price"],
+            target_price=row["Target Price"], long=row["Type"].lower() == "long",
+            executing_interval=5, executing_interval_price=0.2, bars=bars[row["Ticker"]],
+        )
+        for _, row in legacy_rows.iterrows()
+    ]
+    legacy_time = (time.perf_counter() - start) / len(legacy_rows) * n_trades
+
+    result = {
+        "n_trades": n_trades,
+        "vectorized_seconds": vectorized,
+        "legacy_seconds_estimated": legacy_time,
+        "speedup": legacy_time / vectorized,
+        "records_match": legacy == records[:n_legacy],
+    }
+    print(result)
+    return result
+
+
+def load_test(url: str, payloads: list, concurrency: int = 8):
+    """
+        posts every payload to url from concurrency client threads (one pooled session each)
+        and reports throughput and latency percentiles.
+    """
+    def client(chunk):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            for payload in chunk:
+                start = time.perf_counter()
+                try:
+                    response = session.post(url, json=payload, timeout=600)
+                    if response.status_code != 200 or "Error" in response.json():
+                        errors += 1
+                except requests.exceptions.RequestException:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    chunks = [payloads[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, chunks))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([l for chunk, _ in results for l in chunk])
+    return {
+        "url": url,
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "errors": sum(e for _, e in results),
+        "requests_per_second": len(payloads) / elapsed,
+        "p50_seconds": float(np.percentile(latencies, 50)),
+        "p95_seconds": float(np.percentile(latencies, 95)),
+    }
+
+
+PREDICT_PATHS = {"sync": "/predict", "async": "/predict/async"}
+
+
+def compare_predict_modes(tickers: list, base_url: str = "http://127.0.0.1:5000", concurrency: int = 8,
+                          threshold: float = 0.5, modes=("sync", "async")):
+    """
+        load tests /predict and /predict/async of a running api_app with the same tickers.
+        run each mode against a fresh server (or distinct tickers) so caches do not favour the second one,
+        modes picks the endpoints to hit.
+    """
+    payloads = [{"ticker": t, "threshold": threshold} for t in tickers]
+    results = [load_test(f"{base_url}{PREDICT_PATHS[mode]}", payloads, concurrency) for mode in modes]
+    for result in results:
+        print(result)
+    return results
+
+
+def benchmark_panel_features(n_tickers: int = 500, n_bars: int = 1250, max_workers: int = 50):
+    """
+        times the training feature step on synthetic daily bars: add_features per ticker on
+        max_workers threads (the model_data path) against one panel_features call, and reports
+        the largest relative difference between the two outputs.
+    """
+    bars = {f"SYN{i}.NS": synthetic_daily_bars(i, n_bars=n_bars) for i in range(n_tickers)}
+    sectors = {ticker: "Synthetic" for ticker in bars}
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        threaded = list(executor.map(lambda t: add_features(bars[t].copy(), sectors[t], t), sorted(bars)))
+    threaded_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    long = pd.concat([df.assign(ticker=ticker) for ticker, df in bars.items()])
+    X, y = panel_features(long, sectors)
+    panel_seconds = time.perf_counter() - start
+
+    X_threaded = pd.concat([x for _, x, _ in threaded])
+    y_threaded = pd.concat([t for _, _, t in threaded])
+    numeric = X_threaded.select_dtypes("number").columns
+    a, b = X_threaded[numeric].to_numpy(float), X[numeric].to_numpy(float)
+    with np.errstate(invalid="ignore"):
+        rel = np.abs(a - b) / np.maximum(np.abs(a), 1e-12)
+    result = {
+        "tickers": n_tickers,
+        "rows": len(X),
+        "threaded_seconds": threaded_seconds,
+        "panel_seconds": panel_seconds,
+        "speedup": threaded_seconds / panel_seconds,
+        "same_rows": bool(len(X) == len(X_threaded) and (X.index == X_threaded.index).all()),
+        "same_target": bool((y.to_numpy() == y_threaded.to_numpy()).all()),
+        "max_relative_diff": {c: float(np.nanmax(rel[:, i])) for i, c in enumerate(numeric)},
+    }
+    print(result)
+    return result
+
+
+def benchmark_dataset_memory(tickers: list, variant: str = "spooled", store=None,
+                             folder: str = "data/dataset_benchmark"):
+    """
+        peak resident memory (MB) of building the training set, variant is "model_data" (all in
+        memory), "spooled" (build_dataset + load_dataset) or "spooled_float32". run each variant in
+        a fresh process, memory the allocator keeps from an earlier run skews the next one.
+        pass a BarStore as store so every variant reads the same bars from disk.
+    """
+    def spooled(float32):
+        build_dataset(tickers, folder=folder, store=store, float32=float32)
+        return load_dataset(folder)
+
+    if variant == "model_data":
+        (X, _, _, _), peak = peak_memory(model_data, tickers, store=store)
+    else:
+        (X, _, _, _), peak = peak_memory(spooled, variant == "spooled_float32")
+    result = {"variant": variant, "tickers": len(tickers), "rows": len(X), "peak_mb": peak,
+              "frame_mb": float(X.memory_usage(deep=True).sum() / 2 ** 20)}
+    print(result)
+    return result
+
+
+def git_commit():
+    """ short hash of HEAD, with "-dirty" when the tree has changes, None outside a git checkout. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def time_call(fn, repeat: int = 5, warmup: int = 1):
+    """ median and best wall time of repeat calls of fn after warmup untimed ones, and fn's last result. """
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return {"median_seconds": float(np.median(times)), "min_seconds": float(min(times)), "runs": repeat}, result
+
+
+@contextmanager
+def synthetic_market(provider):
+    """
+        serves ticker info (the sector feature) from provider instead of yahoo while the block runs,
+        bars come from passing the provider as store. the metadata index is an in-memory one, the
+        real data/ticker_metadata.json is left alone.
+    """
+    saved = model_data_fetch.ticker_metadata
+    model_data_fetch.ticker_metadata = TickerMetadataIndex(None, provider=provider)
+    try:
+        yield model_data_fetch.ticker_metadata
+    finally:
+        model_data_fetch.ticker_metadata = saved
+
+
+def run_suite(history_lengths=HISTORY_LENGTHS, ticker_counts=TICKER_COUNTS, n_bars: int = 1250,
+              repeat: int = 20, slow_repeat: int = 3, model_path: str = BENCHMARK_MODEL, out: str = None):
+    """
+        times every hot path of the prediction and training code in isolation on a SyntheticProvider
+        market, no network involved:
+        - over history_lengths (daily bars of one ticker): add_features, ticker_data_fetch (the bars
+          served by the provider plus features) and volatility_predict.
+        - over ticker_counts (with n_bars each): model_data, panel_features, predict_with_threshold
+          on the pickled pipeline and on the lean artifact, make_json_serializable of a batch
+          response, and trade_performance_calculator (row by row) against simulate_trades.
+        - load_model: the pickle against the lean artifact, in this process and in a fresh
+          interpreter (the api's start, library imports included).
+        fast paths are timed repeat times, the slow ones (model_data, panel_features,
+        volatility_predict, the row by row trade loop, the model loads) slow_repeat times, median
+        and best are kept.
+        writes {commit, machine, settings, results} to out (default RESULTS_FOLDER/<commit>.json)
+        for compare_results and returns it.
+    """
+    results = []
+
+    def record(name, params, timing):
+        results.append({"name": name, "params": params, **timing})
+        print(f"{name:<28} {json.dumps(params):<40} {timing['median_seconds']:.5f}s")
+
+    pipeline = joblib.load(model_path)
+    lean = load_model(model_path)
+    models = {"pipeline": pipeline}
+    if isinstance(lean, LeanModel):
+        models["lean"] = lean
+    else:
+        print(f"[WARN] No lean artifact for {model_path}, only the pipeline is timed")
+
+    loaders = {"pipeline": lambda: joblib.load(model_path), "lean": lambda: LeanModel.load(lean_path(model_path))}
+    for kind in models:
+        timing, _ = time_call(loaders[kind], slow_repeat)
+        record("load_model", {"model": kind, "process": "warm"}, timing)
+        command = [sys.executable, "-c", COLD_LOAD[kind], model_path]
+        timing, _ = time_call(lambda: subprocess.run(command, check=True), slow_repeat, warmup=0)
+        record("load_model", {"model": kind, "process": "cold"}, timing)
+
+    # the garch grid search warns about every spec that does not converge
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        garch_reply = None
+        ticker = "SYN0.NS"
+        for n in history_lengths:
+            provider = SyntheticProvider(n_bars=n)
+            with synthetic_market(provider) as index:
+                index.refresh([ticker])
+                sector = index.sector(ticker)
+                bars = provider.history(ticker, interval="1d")
+                params = {"bars": n}
+                timing, _ = time_call(lambda: add_features(bars.copy(), sector, ticker), repeat)
+                record("add_features", params, timing)
+                timing, _ = time_call(lambda: safe_fetch(ticker, "1d", "max", True, provider), repeat)
+                record("ticker_data_fetch", params, timing)
+                timing, garch_reply = time_call(lambda: volatility_predict(bars), slow_repeat, warmup=0)
+                record("volatility_predict", params, timing)
+        if garch_reply is None:
+            garch_reply = volatility_predict(SyntheticProvider(n_bars=n_bars).history(ticker, interval="1d"))
+
+        provider = SyntheticProvider(n_bars=n_bars)
+        for n in ticker_counts:
+            tickers = [f"SYN{i}.NS" for i in range(n)]
+            params = {"tickers": n, "bars": n_bars}
+            with synthetic_market(provider) as index:
+                index.refresh(tickers)
+                # model_data prints a line per ticker
+                with redirect_stdout(io.StringIO()):
+                    timing, (X, _, _, _) = time_call(
+                        lambda: model_data(tickers, period="max", store=provider), slow_repeat, warmup=0
+                    )
+                record("model_data", params, timing)
+
+                long = pd.concat([provider.history(t, interval="1d").assign(ticker=t) for t in tickers])
+                sectors = {t: index.sector(t) for t in tickers}
+                timing, _ = time_call(lambda: panel_features(long.copy(), sectors), slow_repeat, warmup=0)
+                record("panel_features", params, timing)
+
+            rows = X.groupby("ticker", observed=True).tail(1)[FEATURE_COLUMNS]
+            for kind, model in models.items():
+                timing, _ = time_call(lambda: predict_with_threshold(model, rows, 0.5), repeat)
+                record("predict_with_threshold", {"rows": n, "model": kind}, timing)
+
+            response = {
+                t: {
+                    "Last Date": pd.Timestamp(provider.end, tz="Asia/Kolkata"),
+                    "Direction Prediction": {"Direction": "Up", "Probability": np.float64(0.6)},
+                    "Volatility Prediction": garch_reply,
+                }
+                for t in tickers
+            }
+            timing, _ = time_call(lambda: make_json_serializable(response), repeat)
+            record("make_json_serializable", {"tickers": n}, timing)
+
+            trades, minute_bars = synthetic_trades(n, min(n, 20))
+            timing, _ = time_call(lambda: [
+                trade_performance_calculator(
+                    ticker=row["Ticker"], last_price=row["Current Price"], stop_loss=row["SL Price"],
+                    target_price=row["Target Price"], long=row["Type"].lower() == "long",
+                    executing_interval=5, executing_interval_price=0.2, bars=minute_bars[row["Ticker"]],
+                )
+                for _, row in trades.iterrows()
+            ], slow_repeat, warmup=0)
+            record("trade_performance_calculator", {"trades": n}, timing)
+            timing, _ = time_call(lambda: simulate_trades(trades, bars=minute_bars), repeat)
+            record("simulate_trades", {"trades": n}, timing)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {"history_lengths": list(history_lengths), "ticker_counts": list(ticker_counts),
+                     "n_bars": n_bars, "repeat": repeat, "slow_repeat": slow_repeat, "model": model_path,
+                     "lean": "lean" in models},
+        "results": results,
+    }
+    out = out or os.path.join(RESULTS_FOLDER, f"{commit or 'worktree'}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Benchmark results written to {out}")
+    return report
+
+
+def compare_results(old_path: str, new_path: str, tolerance: float = REGRESSION_TOLERANCE,
+                    stat: str = "min_seconds"):
+    """
+        lines up two run_suite result files by benchmark and parameters and prints stat (the best
+        run by default, it moves less between runs than the median) of each side and new / old. returns the rows, those more than tolerance slower are marked
+        "slower". only compare runs from the same machine.
+    """
+    def load(path):
+        with open(path) as f:
+            report = json.load(f)
+        return report, {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in report["results"]}
+
+    old, old_results = load(old_path)
+    new, new_results = load(new_path)
+    if old["machine"] != new["machine"]:
+        print(f"[WARN] Results come from different machines: {old['machine']} / {new['machine']}")
+
+    print(f"{'benchmark':<28} {'params':<40} {old['commit'] or old_path:>12} {new['commit'] or new_path:>12}  ratio")
+    rows = []
+    for key, result in new_results.items():
+        if key not in old_results:
+            continue
+        name, params = key
+        before, after = old_results[key][stat], result[stat]
+        ratio = after / before if before > 0 else float("inf")
+        status = "slower" if ratio > 1 + tolerance else "faster" if ratio < 1 / (1 + tolerance) else "same"
+        rows.append({"name": name, "params": json.loads(params), "old_seconds": before, "new_seconds": after,
+                     "ratio": ratio, "status": status})
+        print(f"{name:<28} {params:<40} {before:>12.5f} {after:>12.5f}  {ratio:.2f}x {status}")
+    return rows
+
+
+if __name__ == "__main__":
+    # python -m script.benchmark [suite [--out FILE] | compare OLD.json NEW.json | trades | panel | predict-modes TICKER...]
+    parser = argparse.ArgumentParser(description="offline benchmarks of the hot paths")
+    commands = parser.add_subparsers(dest="command")
+    suite = commands.add_parser("suite", help="time every hot path on synthetic data and save the results")
+    suite.add_argument("--history", type=int, nargs="+", default=list(HISTORY_LENGTHS), help="daily bars per ticker")
+    suite.add_argument("--tickers", type=int, nargs="+", default=list(TICKER_COUNTS), help="tickers per call")
+    suite.add_argument("--bars", type=int, default=1250, help="daily bars per ticker of the ticker scaling runs")
+    suite.add_argument("--repeat", type=int, default=20)
+    suite.add_argument("--slow-repeat", type=int, default=3)
+    suite.add_argument("--model", default=BENCHMARK_MODEL)
+    suite.add_argument("--out", default=None, help=f"result file (default {RESULTS_FOLDER}/<commit>.json)")
+    compare = commands.add_parser("compare", help="compare two result files, exits 1 on a regression")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    compare.add_argument("--stat", choices=["min_seconds", "median_seconds"], default="min_seconds")
+    commands.add_parser("trades", help="vectorized against row by row trade simulation")
+    panel = commands.add_parser("panel", help="panel_features against threaded per ticker add_features")
+    panel.add_argument("--tickers", type=int, default=500)
+    panel.add_argument("--bars", type=int, default=1250, help="daily bars per ticker")
+    panel.add_argument("--workers", type=int, default=50, help="threads of the per ticker path")
+    modes = commands.add_parser("predict-modes", help="load test /predict and /predict/async of a running server")
+    modes.add_argument("tickers", nargs="+")
+    modes.add_argument("--url", default="http://127.0.0.1:5000")
+    modes.add_argument("--concurrency", type=int, default=8)
+    modes.add_argument("--threshold", type=float, default=0.5)
+    modes.add_argument("--mode", choices=["both", *PREDICT_PATHS], default="both",
+                       help="one endpoint per fresh server keeps the caches out of the comparison")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        run_suite(args.history, args.tickers, args.bars, args.repeat, args.slow_repeat, args.model, args.out)
+    elif args.command == "compare":
+        rows = compare_results(args.old, args.new, args.tolerance, args.stat)
+        sys.exit(1 if any(row["status"] == "slower" for row in rows) else 0)
+    elif args.command == "panel":
+        benchmark_panel_features(args.tickers, args.bars, args.workers)
+    elif args.command == "predict-modes":
+        compare_predict_modes(args.tickers, args.url, args.concurrency, args.threshold,
+                              list(PREDICT_PATHS) if args.mode == "both" else [args.mode])
+    else:
+        benchmark_trade_simulation()
@@ -1,4 +1,9 @@
+import os
+import json
+import concurrent.futures
 import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.model_selection import StratifiedKFold
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import StackingClassifier
 from sklearn.compose import ColumnTransformer
@@ -6,21 +11,11 @@ from sklearn.preprocessing import StandardScaler, OrdinalEncoder
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier
 from catboost import CatBoostClassifier
-from lightgbm import LGBMClassifier
-
-
-def predict_with_threshold(model, features, threshold):
-    """ 
-        this function it for predicting on custom thershold limit.
-    """
-    
-    # Get probabilities for class 1
-    proba = model.predict_proba(features)[:, 1]
-
-    # Apply threshold
-    y_pred = np.where(proba >= threshold, 1, 0)
-    return y_pred, proba
+from lightgbm import LGBMClassifier, early_stopping
+# kept importable from here, it lives with the lean model so serving skips the training imports
+from script.lean_model import predict_with_threshold
 
+BASE_LEARNERS = ("xgb", "lgbm", "cat")
 
 
 def stack_models(X, y, num_cols, cat_cols):
@@ -66,4 +61,202 @@ def stack_models(X, y, num_cols, cat_cols):
 
     clf.fit(X, y)
     return clf
-    
\ No newline at end of file
+    
+
+# fast training mode (stack_models_fast): boosting rounds are capped at MAX_ROUNDS and stopped once
+# the validation logloss has not improved for EARLY_STOPPING_ROUNDS
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 50
+# share of each training fold held back for early stopping, the out-of-fold rows stay unseen
+VALIDATION_SHARE = 0.1
+# learning rate multiplier of the rounds added by update_stack
+UPDATE_SHRINKAGE = 0.1
+
+
+class PrefitStack(ClassifierMixin, BaseEstimator):
+    """
+        stacking classifier over base learners that are already fitted, used as the "stack" step
+        of the pipelines built by stack_models_fast. predict_proba is the same as a fitted
+        StackingClassifier with stack_method predict_proba: the class 1 probability of every base
+        learner goes into the final estimator.
+    """
+
+    def __init__(self, estimators, final_estimator):
+        self.estimators = estimators
+        self.final_estimator = final_estimator
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+    @property
+    def classes_(self):
+        return self.final_estimator.classes_
+
+    def transform(self, X):
+        return np.column_stack([estimator.predict_proba(X)[:, 1] for _, estimator in self.estimators])
+
+    def fit(self, X, y):
+        """ refits only the final estimator on the base learner probabilities of X. """
+        self.final_estimator.fit(self.transform(X), y)
+        return self
+
+    def predict_proba(self, X):
+        return self.final_estimator.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _base_learner(name, rounds, threads, early_stopping=True):
+    stopping = EARLY_STOPPING_ROUNDS if early_stopping else None
+    if name == "xgb":
+        return XGBClassifier(n_estimators=rounds, eval_metric="logloss", early_stopping_rounds=stopping,
+                             n_jobs=threads)
+    if name == "lgbm":
+        return LGBMClassifier(n_estimators=rounds, n_jobs=threads, verbose=-1)
+    return CatBoostClassifier(iterations=rounds, thread_count=threads, early_stopping_rounds=stopping, verbose=0)
+
+
+def _fit_learner(name, X, y, rounds, threads, eval_set=None):
+    """ fits one base learner, with eval_set it early stops. returns (model, rounds used). """
+    model = _base_learner(name, rounds, threads, early_stopping=eval_set is not None)
+    if eval_set is None:
+        model.fit(X, y)
+        return model, rounds
+    if name == "xgb":
+        model.fit(X, y, eval_set=[eval_set], verbose=False)
+        return model, model.best_iteration + 1
+    if name == "lgbm":
+        model.fit(X, y, eval_set=[eval_set], callbacks=[early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        return model, model.best_iteration_ or rounds
+    model.fit(X, y, eval_set=eval_set)
+    return model, model.get_best_iteration() + 1
+
+
+def _fit_fold(name, X, y, train_idx, test_idx, threads):
+    # early stopping on a slice of the training folds, the held-out fold only gets predicted
+    stop_split = StratifiedKFold(n_splits=int(round(1 / VALIDATION_SHARE)))
+    fit_idx, stop_idx = next(stop_split.split(train_idx, y[train_idx]))
+    fit_idx, stop_idx = train_idx[fit_idx], train_idx[stop_idx]
+    model, rounds = _fit_learner(name, X[fit_idx], y[fit_idx], MAX_ROUNDS, threads, (X[stop_idx], y[stop_idx]))
+    return model.predict_proba(X[test_idx])[:, 1], rounds
+
+
+def stack_models_fast(X, y, num_cols, cat_cols, n_jobs: int = None, cv: int = 5, oof_path: str = None):
+    """
+        same pipeline shape as stack_models (preprocessor + stacking of xgb, lgbm and catboost under
+        a logistic regression) trained for speed:
+
+        - the cv folds of the three learners run in parallel, each fit gets its share of n_jobs
+          cores as the library's own thread count so the libraries do not oversubscribe
+        - every fold fit early stops, the full data refits use the mean of the fold stopping rounds
+        - with oof_path the out-of-fold probabilities are saved (npz) for retune_meta
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    # handling values
+    X = X.replace([np.inf, -np.inf], np.nan)
+    X = X.dropna()
+    y = y.loc[X.index]
+
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), num_cols),
+            ("cat", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1), cat_cols)
+        ]
+    )
+    Xt = preprocessor.fit_transform(X)
+    yt = y.to_numpy()
+    folds = list(StratifiedKFold(n_splits=cv).split(Xt, yt))
+
+    tasks = [(name, k) for name in BASE_LEARNERS for k in range(cv)]
+    workers = min(len(tasks), n_jobs)
+    threads = max(1, n_jobs // workers)
+    print(f"[INFO] Fitting {len(tasks)} fold models, {workers} at a time with {threads} thread(s) each")
+    oof = np.zeros((len(yt), len(BASE_LEARNERS)))
+    rounds = {name: [] for name in BASE_LEARNERS}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_fit_fold, name, Xt, yt, folds[k][0], folds[k][1], threads): (name, k)
+            for name, k in tasks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            name, k = futures[future]
+            proba, used = future.result()
+            oof[folds[k][1], BASE_LEARNERS.index(name)] = proba
+            rounds[name].append(used)
+
+    if oof_path is not None:
+        np.savez_compressed(oof_path, oof=oof, y=yt, learners=np.array(BASE_LEARNERS),
+                            rounds=np.array([rounds[name] for name in BASE_LEARNERS]))
+
+    final_rounds = {name: max(1, int(round(np.mean(rounds[name])))) for name in BASE_LEARNERS}
+    print(f"[INFO] Refitting on all rows with rounds {final_rounds}")
+    workers = len(BASE_LEARNERS)
+    threads = max(1, n_jobs // workers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        fitted = list(executor.map(
+            lambda name: _fit_learner(name, Xt, yt, final_rounds[name], threads)[0], BASE_LEARNERS
+        ))
+
+    meta_model = LogisticRegression(max_iter=2000).fit(oof, yt)
+    return Pipeline(steps=[
+        ("preprocessor", preprocessor),
+        ("stack", PrefitStack(list(zip(BASE_LEARNERS, fitted)), meta_model)),
+    ])
+
+
+def retune_meta(model, oof_path: str, final_estimator=None):
+    """
+        refits the final estimator of a stack_models_fast pipeline on the saved out-of-fold
+        probabilities, no booster is refitted. returns the model.
+    """
+    saved = np.load(oof_path)
+    final_estimator = final_estimator if final_estimator is not None else LogisticRegression(max_iter=2000)
+    model.named_steps["stack"].final_estimator = final_estimator.fit(saved["oof"], saved["y"])
+    return model
+
+
+def update_stack(model, X_new, y_new, rounds: int = 20, n_jobs: int = None, shrinkage: float = UPDATE_SHRINKAGE):
+    """
+        incremental daily update of a stack_models_fast pipeline: every booster continues from its
+        current trees with rounds more boosting rounds on the new rows only, at shrinkage times its
+        learning rate so a few days of rows nudge the model instead of overwriting it. the
+        preprocessor and the final estimator are kept as they are. returns a new pipeline, model is
+        left untouched.
+    """
+    stack = model.named_steps["stack"]
+    if not isinstance(stack, PrefitStack):
+        raise ValueError("Incremental updates need a model trained by stack_models_fast")
+    n_jobs = n_jobs or os.cpu_count() or 1
+    threads = max(1, n_jobs // len(stack.estimators))
+
+    X_new = X_new.replace([np.inf, -np.inf], np.nan).dropna()
+    y_new = y_new.loc[X_new.index].to_numpy()
+    Xt = model.named_steps["preprocessor"].transform(X_new)
+
+    def update(item):
+        name, previous = item
+        learner = _base_learner(name, rounds, threads, early_stopping=False)
+        if name == "xgb":
+            learning_rate = float(json.loads(previous.get_booster().save_config())["learner"]["gradient_booster"]
+                                  ["tree_train_param"]["eta"])
+        elif name == "lgbm":
+            learning_rate = previous.learning_rate
+        else:
+            learning_rate = previous.get_all_params()["learning_rate"]
+        learner.set_params(learning_rate=learning_rate * shrinkage)
+        if name == "xgb":
+            learner.fit(Xt, y_new, xgb_model=previous.get_booster())
+        elif name == "lgbm":
+            learner.fit(Xt, y_new, init_model=previous.booster_)
+        else:
+            learner.fit(Xt, y_new, init_model=previous)
+        return name, learner
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(stack.estimators)) as executor:
+        estimators = list(executor.map(update, stack.estimators))
+    return Pipeline(steps=[
+        ("preprocessor", model.named_steps["preprocessor"]),
+        ("stack", PrefitStack(estimators, stack.final_estimator)),
+    ])
@@ -0,0 +1,200 @@
+import os
+import shutil
+import threading
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import psutil
+import pyarrow.parquet as pq
+from script.model_data_fetch import safe_fetch, ticker_metadata, ticker_sector
+from script.panel_features import panel_features, CHUNK_SIZE
+
+DATASET_FOLDER = os.path.join("data", "dataset")
+# rows a --update trains on, built next to the full dataset so it is left as it is
+UPDATE_FOLDER = os.path.join("data", "dataset_update")
+CATEGORY_COLUMNS = ["sector", "day_of_week", "ticker"]
+
+
+def _cutoff(dates: pd.Series, since):
+    cutoff = pd.Timestamp(since)
+    if dates.dt.tz is not None and cutoff.tz is None:
+        cutoff = cutoff.tz_localize(dates.dt.tz)
+    return cutoff
+
+
+def _write_partition(folder: str, ticker: str, X, y, float32: bool, since=None):
+    if since is not None:
+        # only the tail from since on, the features were still computed over the full history
+        keep = (X.index >= _cutoff(X.index.to_series(), since))
+        X, y = X[keep], y[keep]
+        if X.empty:
+            return
+    part = X.copy()
+    if float32:
+        floats = part.select_dtypes("float64").columns
+        part[floats] = part[floats].astype("float32")
+    for column in CATEGORY_COLUMNS:
+        part[column] = part[column].astype("category")
+    part["target"] = y.astype("int8")
+    # bar dates ride along (not a feature) so later updates can select the rows after a date
+    part["Date"] = X.index
+    path = os.path.join(folder, f"{ticker}.parquet")
+    part.reset_index(drop=True).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def build_dataset(ticker_list, folder: str = DATASET_FOLDER, interval: str = "1d", period: str = "5y",
+                  store=None, float32: bool = False, max_workers: int = 8, panel: bool = False, since=None):
+    """
+        fetches and builds the features of every ticker and writes each one to its own parquet
+        partition (<folder>/<ticker>.parquet, features + target) as soon as it is done, so only
+        the tickers in flight are held in memory (max_workers matches the fetch scheduler's cap).
+        with panel the bars of CHUNK_SIZE tickers are fetched first and their features computed
+        together by panel_features instead of one add_features call per ticker.
+        with since only the rows of that bar and later are written (the tail an update trains on).
+        returns the tickers that failed.
+    """
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    # the sector column must be real for training, look up every ticker not indexed yet first
+    ticker_metadata.refresh_missing(ticker_list)
+
+    if panel:
+        return _build_panel(ticker_list, folder, interval, period, store, float32, max_workers, since)
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(safe_fetch, ticker, interval, period, True, store): ticker for ticker in ticker_list
+        }
+        for i, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            ticker = futures.pop(future)
+            result = future.result()
+            if result is None or result[1] is None or result[1].empty:
+                print(f"{i}/{len(ticker_list)} skipped/failed to fetch: {ticker}")
+                failed.append(ticker)
+                continue
+            _, X, y = result
+            _write_partition(folder, ticker, X, y, float32, since)
+            print(f"{i}/{len(ticker_list)} done: {ticker}")
+    return failed
+
+
+def _build_panel(ticker_list, folder, interval, period, store, float32, max_workers, since=None):
+    failed = []
+    for first in range(0, len(ticker_list), CHUNK_SIZE):
+        chunk = ticker_list[first:first + CHUNK_SIZE]
+        # only the bars are fetched on threads (network / disk), the features are one numpy pass
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda t: safe_fetch(t, interval, period, False, store), chunk))
+        bars = {}
+        for ticker, result in zip(chunk, results):
+            if result is None or result[0] is None:
+                failed.append(ticker)
+            else:
+                bars[ticker] = result[0]
+        if not bars:
+            continue
+
+        long = pd.concat([df.assign(ticker=ticker) for ticker, df in bars.items()]).rename_axis("Date")
+        del results, bars
+        X, y = panel_features(long, {ticker: ticker_sector(ticker) for ticker in long["ticker"].unique()})
+        del long
+        built = X.groupby("ticker", observed=True).indices
+        for ticker in chunk:
+            if ticker in built:
+                rows = built[ticker]
+                _write_partition(folder, ticker, X.iloc[rows], y.iloc[rows], float32, since)
+            elif ticker not in failed:
+                failed.append(ticker)  # not enough history for a full feature row
+        print(f"{min(first + CHUNK_SIZE, len(ticker_list))}/{len(ticker_list)} done")
+    return failed
+
+
+def dataset_last_date(folder: str = DATASET_FOLDER):
+    """ latest bar date in the dataset (reads only the Date columns). """
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet")]
+    return max(pq.read_table(f, columns=["Date"]).column("Date").to_pandas().max() for f in files)
+
+
+def load_dataset(folder: str = DATASET_FOLDER, since=None):
+    """
+        reads the partitions written by build_dataset back as (X, y, cat_cols, num_cols), the same
+        shape model_data returns. sector, day_of_week and ticker come back as category columns.
+        the final columns are allocated once from the parquet footers and filled one partition at a
+        time, so the peak stays close to the size of the result. since keeps only the bars from it on.
+        each ticker's newest bar is left out, its next close (the target) is not known yet.
+    """
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet"))
+    if not files:
+        raise ValueError(f"No dataset partitions in {folder}")
+    counts = [pq.ParquetFile(f).metadata.num_rows for f in files]
+    schemas = [pq.read_schema(f) for f in files]
+    names = [n for n in schemas[0].names if not n.startswith("__") and n != "Date"]
+
+    columns, categories = {}, {}
+    for name in names:
+        if name in CATEGORY_COLUMNS:
+            columns[name] = np.empty(sum(counts), dtype=np.int32)
+            categories[name] = {}
+        else:
+            dtype = np.result_type(*[s.field(name).type.to_pandas_dtype() for s in schemas])
+            columns[name] = np.empty(sum(counts), dtype=dtype)
+
+    start = 0
+    for path in files:
+        part = pq.read_table(path, columns=names + ["Date"]).to_pandas()
+        dates = part.pop("Date")
+        keep = (dates < dates.max()).to_numpy()
+        if since is not None:
+            keep &= (dates >= _cutoff(dates, since)).to_numpy()
+        part = part[keep]
+        count = len(part)
+        for name in names:
+            values = part[name]
+            if name in CATEGORY_COLUMNS:
+                # codes against one category list shared by every partition
+                codes = categories[name]
+                values = values.astype(str)
+                for value in values.unique():
+                    codes.setdefault(value, len(codes))
+                columns[name][start:start + count] = values.map(codes).to_numpy()
+            else:
+                columns[name][start:start + count] = values.to_numpy()
+        start += count
+
+    df = pd.DataFrame({
+        name: pd.Categorical.from_codes(columns[name][:start], categories=list(categories[name]))
+        if name in CATEGORY_COLUMNS else columns[name][:start]
+        for name in names
+    }, copy=False)
+    y = df.pop("target")
+    cat_cols = [c for c in df.columns if c in CATEGORY_COLUMNS]
+    num_cols = [c for c in df.columns if c not in CATEGORY_COLUMNS]
+    return df, y, cat_cols, num_cols
+
+
+def peak_memory(fn, *args, **kwargs):
+    """
+        runs fn and returns (result, peak resident memory above the starting level in MB).
+        rss is sampled every 5ms so arrow and numpy buffers count too, not only python objects.
+    """
+    process = psutil.Process()
+    start = process.memory_info().rss
+    peak = [start]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        done.set()
+        sampler.join()
+    peak[0] = max(peak[0], process.memory_info().rss)
+    return result, (peak[0] - start) / 2 ** 20
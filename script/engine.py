@@ -0,0 +1,309 @@
+import os
+import concurrent.futures
+from dataclasses import dataclass, asdict
+from script.bar_store import BarStore
+from script.model_data_fetch import fetch_scheduler, ticker_sector, FEATURE_COLUMNS
+from script.garch_registry import GarchSpecRegistry
+from script.model_registry import ModelRegistry
+from script.prediction import predict_ticker, predict_batch
+from script.prediction_cache import PredictionCache, with_threshold
+from script.trade_calculator import trade_setup
+from script.metrics import span, in_trace
+from script.shared_panel import SharedPanel, PANEL_FOLDER
+
+MODEL_FOLDER = "model"
+# served on the first start, afterwards model/manifest.json says which version is active
+MODEL_FILE_NAME = "stock_prediction26-09-2025_21-59-07.pkl"
+
+# same files as api_app and script.precompute, so every process reads and warms the same stores
+BAR_STORE_FOLDER = os.path.join("data", "bars")
+GARCH_REGISTRY_PATH = os.path.join("data", "garch_specs.json")
+PREDICTION_CACHE_PATH = os.path.join("data", "prediction_cache.sqlite")
+
+# tickers predicted at the same time by stream(), twice as many are queued at most
+STREAM_WORKERS = 8
+
+
+def check_features(model):
+    # a model trained on other feature columns would fail every request, it is never swapped in
+    missing = set(getattr(model, "feature_names_in_", [])) - set(FEATURE_COLUMNS)
+    if missing:
+        raise ValueError(f"model needs features the api does not build: {sorted(missing)}")
+
+
+def versioned(reply: dict, version: str, last_close: float = None):
+    # every response names the model version that produced it and the close it was made after
+    reply = dict(reply, **{"Model Version": version})
+    if last_close is not None:
+        reply["Last Close"] = last_close
+    return reply
+
+
+@dataclass
+class Prediction:
+    """ one ticker's /predict response as a record, error is set (and the rest None) when it failed. """
+    ticker: str
+    model_version: str = None
+    last_date: str = None
+    direction: str = None
+    probability: float = None
+    predicted_change: float = None
+    predicted_variance: float = None
+    qlike: float = None
+    aic: float = None
+    best_params: list = None
+    last_close: float = None
+    error: str = None
+
+    @classmethod
+    def from_reply(cls, ticker: str, reply: dict, version: str = None):
+        if "Error" in reply:
+            return cls(ticker, model_version=version, error=reply["Error"])
+        direction = reply.get("Direction Prediction", {})
+        volatility = reply.get("Volatility Prediction")
+        # volatility_predict answers with a message instead of a dict when the fit failed
+        volatility = volatility if isinstance(volatility, dict) else {}
+        forecast = volatility.get("Prediction", {})
+        description = volatility.get("Model Description", {})
+        return cls(
+            ticker=ticker,
+            model_version=reply.get("Model Version", version),
+            last_date=reply.get("Last Date"),
+            direction=direction.get("Direction"),
+            probability=direction.get("Probability"),
+            predicted_change=forecast.get("Predicted Change/Volume"),
+            predicted_variance=forecast.get("Predicted Variance"),
+            qlike=description.get("QLIKE Score"),
+            aic=description.get("Model AIC"),
+            best_params=description.get("Best Params"),
+            last_close=reply.get("Last Close"),
+        )
+
+    def as_reply(self):
+        """ the record back in the /predict response layout, what trade_setup reads. """
+        if self.error is not None:
+            return {"Error": self.error}
+        return {
+            "Last Date": self.last_date,
+            "Direction Prediction": {"Direction": self.direction, "Probability": self.probability},
+            "Volatility Prediction": {
+                "Prediction": {"Predicted Change/Volume": self.predicted_change,
+                               "Predicted Variance": self.predicted_variance},
+                "Model Description": {"QLIKE Score": self.qlike, "Model AIC": self.aic, "Best Params": self.best_params},
+            },
+            "Model Version": self.model_version,
+            "Last Close": self.last_close,
+        }
+
+
+@dataclass
+class TradeSetup:
+    """ one Trade Calculator row (the tuple script.trade_calculator.trade_setup returns). """
+    ticker: str
+    type: str = None
+    probability: float = None
+    predicted_change: float = None
+    predicted_variance: float = None
+    confidence: str = None
+    current_price: float = None
+    target_price: float = None
+    sl_price: float = None
+    aic: float = None
+
+    @classmethod
+    def from_row(cls, row: tuple):
+        return cls(*row)
+
+    @classmethod
+    def from_prediction(cls, prediction: Prediction, risk: float):
+        """ the row of a Prediction (a streamed record), only the ticker when it failed. """
+        if prediction.error is not None:
+            print(f"Prediction failed for {prediction.ticker}: {prediction.error}")
+            return cls(prediction.ticker)
+        return cls.from_row(trade_setup(prediction.ticker, prediction.as_reply(), risk,
+                                        current_price=prediction.last_close))
+
+    def as_row(self):
+        return tuple(asdict(self).values())
+
+    def display(self):
+        """ the row with the column names of the Trade Calculator sheet. """
+        return {
+            "Ticker": self.ticker,
+            "Type": self.type,
+            "Probability": self.probability,
+            "Predicted Change": self.predicted_change,
+            "Predicted Variance": self.predicted_variance,
+            "Confidence": self.confidence,
+            "Current Price": self.current_price,
+            "Target Price": self.target_price,
+            "SL Price": self.sl_price,
+            "AIC Score": self.aic,
+        }
+
+
+class PredictionEngine:
+    """
+        the /predict and /predict/batch logic without the http layer: the served model of a
+        ModelRegistry, the bar store, the prediction cache, the garch options and the streaming
+        feature engines. api_app answers its endpoints with one, app.py calls one in process and
+        gets Prediction / TradeSetup records instead of json.
+        the last close comes from the same bar store read as the cache key, no second fetch.
+        with a SharedPanel the tickers it holds are read from it (bars and features), the bar store
+        and the feature engines only serve the others.
+    """
+
+    def __init__(self, model_registry, bar_store, prediction_cache, garch_options=None, feature_engines=None,
+                 panel=None):
+        self.model_registry = model_registry
+        self.bar_store = bar_store
+        self.prediction_cache = prediction_cache
+        self.garch_options = garch_options
+        self.feature_engines = feature_engines if feature_engines is not None else {}
+        self.panel = panel
+
+    def lookup(self, ticker: str, threshold: float, version: str):
+        """
+            (cache key, last close), the last bar read refreshes the store's tail. the key holds the
+            sector the features will be built with, so a reply made before the ticker's metadata was
+            indexed ("Unknown") is predicted again once it is.
+        """
+        # timed on its own as the "cache" stage
+        with span("cache"):
+            sector = ticker_sector(ticker)
+            last_bar = self.panel.last_bar(ticker) if self.panel is not None else None
+            if last_bar is not None:
+                return self.prediction_cache.make_key(ticker, last_bar[0], version, threshold, sector), last_bar[1]
+            df = self.bar_store.history(ticker, interval="1d", period="5d")
+            if df is None or df.empty:
+                raise ValueError(f"No data for {ticker}")
+            key = self.prediction_cache.make_key(ticker, df.index[-1], version, threshold, sector)
+            return key, float(df["Close"].iloc[-1])
+
+    def reply(self, ticker: str, threshold: float):
+        """ the /predict response of one ticker. """
+        served = self.model_registry.current()
+        key, last_close = self.lookup(ticker, threshold, served.version)
+        reply = self.prediction_cache.get(key)
+        if reply is None:
+            reply = predict_ticker(
+                served.model, ticker, threshold, store=self.bar_store, garch_options=self.garch_options,
+                engines=self.feature_engines, panel=self.panel,
+            )
+            self.prediction_cache.put(key, reply)
+        return versioned(with_threshold(reply, threshold), served.version, last_close)
+
+    def replies(self, tickers: list, threshold: float):
+        """
+            (model version, {ticker: response}) with one classifier call for the tickers not cached,
+            failed tickers carry their own Error.
+        """
+        served = self.model_registry.current()
+        keys, closes, replies = {}, {}, {}
+        for ticker in dict.fromkeys(tickers):
+            try:
+                keys[ticker], closes[ticker] = self.lookup(ticker, threshold, served.version)
+                replies[ticker] = self.prediction_cache.get(keys[ticker])
+            except Exception:
+                replies[ticker] = None  # predict_batch reports the error for it
+        misses = [t for t, reply in replies.items() if reply is None]
+        if misses:
+            fresh = predict_batch(
+                served.model, misses, threshold, store=self.bar_store, garch_options=self.garch_options,
+                engines=self.feature_engines, panel=self.panel,
+            )
+            for ticker, reply in fresh.items():
+                if "Error" not in reply and ticker in keys:
+                    self.prediction_cache.put(keys[ticker], reply)
+            replies.update(fresh)
+        for ticker, reply in replies.items():
+            if "Error" not in reply:
+                replies[ticker] = with_threshold(reply, threshold)
+                if ticker in closes:
+                    replies[ticker]["Last Close"] = closes[ticker]
+        return served.version, replies
+
+    def predict(self, ticker: str, threshold: float = 0.5):
+        try:
+            return Prediction.from_reply(ticker, self.reply(ticker, threshold))
+        except Exception as e:
+            return Prediction(ticker, error=str(e))
+
+    def predict_many(self, tickers: list, threshold: float = 0.5):
+        """ {ticker: Prediction}, see replies(). """
+        version, replies = self.replies(tickers, threshold)
+        return {t: Prediction.from_reply(t, reply, version) for t, reply in replies.items()}
+
+    def stream(self, tickers: list, threshold: float = 0.5, max_workers: int = STREAM_WORKERS):
+        """
+            yields lists of Prediction as the tickers finish, the ones done at the same moment come
+            as one list. only 2 * max_workers tickers are queued at a time and nothing is kept once
+            yielded, so memory does not grow with the ticker list. cached tickers cost no model work.
+            closing the generator (a client gone) cancels the tickers not started yet.
+        """
+        todo = iter(dict.fromkeys(tickers))
+        predict = in_trace(self.predict)
+        pending = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while True:
+                    for ticker in todo:
+                        pending.add(executor.submit(predict, ticker, threshold))
+                        if len(pending) >= 2 * max_workers:
+                            break
+                    if not pending:
+                        return
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    yield [future.result() for future in done]
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def trade_setups(self, tickers: list, risk: float, threshold: float = 0.5):
+        """ {ticker: TradeSetup} for the Trade Calculator, priced at the last close of the store. """
+        _, replies = self.replies(tickers, threshold)
+        setups = {}
+        for ticker, reply in replies.items():
+            if "Error" in reply:
+                print(f"Prediction failed for {ticker}: {reply['Error']}")
+                setups[ticker] = TradeSetup(ticker)
+                continue
+            setups[ticker] = TradeSetup.from_row(trade_setup(ticker, reply, risk, current_price=reply.get("Last Close")))
+        return setups
+
+
+def default_engine(watch: bool = True):
+    """
+        the engine over the default model folder and data files, as api_app serves them. the
+        model registry polls the manifest on a daemon thread unless watch is False.
+    """
+    # versions are the sha256 of the model files. a version activated through /models/activate or by
+    # script/train.py is loaded in the background and swapped in when ready, each request keeps the
+    # model it started with. the numpy-only artifact next to a pickle (python -m script.lean_model
+    # MODEL.pkl) is loaded instead of it, without sklearn / xgboost / lightgbm / catboost
+    model_registry = ModelRegistry(MODEL_FOLDER, default=MODEL_FILE_NAME, validate=check_features)
+    if watch:
+        model_registry.start_watching()
+
+    # local OHLCV store, only the bars after the last stored one are fetched per request.
+    # its misses go through the shared fetch scheduler (rate limit, retries, coalescing)
+    bar_store = BarStore(BAR_STORE_FOLDER, provider=fetch_scheduler)
+
+    # garch grid runs on a process pool sized to the cores, "prune" skips distributions that do not pay off.
+    # the registry keeps each ticker's winning spec so daily requests fit one spec instead of the grid
+    garch_options = {
+        "n_jobs": os.cpu_count() or 1,
+        "fit_timeout": 30,
+        "prune": False,
+        "registry": GarchSpecRegistry(GARCH_REGISTRY_PATH, reselect_days=7),
+    }
+
+    # responses are cached per (ticker, last bar, model version, threshold bucket), a new daily bar
+    # or a new model version changes the key. the sqlite tier keeps the cache across restarts
+    prediction_cache = PredictionCache(maxsize=4096, ttl=6 * 3600, disk_path=PREDICTION_CACHE_PATH)
+
+    # bars and features of the universe written by python -m script.shared_panel, mapped read only and
+    # shared by every worker. tickers it does not hold (or all of them when no writer ran recently) go
+    # through the bar store and the streaming feature engines, which after warm up only compute new bars
+    return PredictionEngine(model_registry, bar_store, prediction_cache, garch_options=garch_options,
+                            feature_engines={}, panel=SharedPanel(PANEL_FOLDER))
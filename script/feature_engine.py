@@ -0,0 +1,240 @@
+import math
+from collections import deque
+import pandas as pd
+from script.model_data_fetch import FEATURE_COLUMNS
+
+# longest lookback any feature needs (return_365d needs the close 365 bars back)
+MAX_LOOKBACK = 366
+RSI_WINDOW = 14
+MACD_FAST, MACD_SLOW = 12, 26
+STOCH_WINDOW = 14
+ROC_WINDOW = 12
+WILLIAMS_WINDOW = 14
+SMA_WINDOWS = (5, 10, 20, 50, 100, 200)
+RETURN_WINDOWS = (1, 7, 30, 180, 365)
+
+
+def _ema(prev, value, alpha):
+    # same recursion as pandas ewm(adjust=False)
+    return value if prev is None else (1 - alpha) * prev + alpha * value
+
+
+def _div(a, b):
+    # float division with numpy semantics for a zero denominator
+    if b == 0:
+        return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a)
+    return a / b
+
+
+def _pct(new, old):
+    return math.nan if old is None else _div(new, old) - 1
+
+
+def _moments(values):
+    # mean and central moments of a small window in plain python (numpy call overhead dominates here)
+    n = len(values)
+    mean = sum(values) / n
+    devs = [v - mean for v in values]
+    m2 = sum(d * d for d in devs) / n
+    m3 = sum(d * d * d for d in devs) / n
+    m4 = sum(d * d * d * d for d in devs) / n
+    return n, m2, m3, m4
+
+
+def _std(values):
+    n, m2, _, _ = _moments(values)
+    return math.sqrt(m2 * n / (n - 1))
+
+
+def _skew(values):
+    # bias corrected sample skewness, same as pandas rolling().skew()
+    n, m2, m3, _ = _moments(values)
+    if m2 <= 1e-14:
+        return math.nan
+    return math.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5
+
+
+def _kurt(values):
+    # bias corrected excess kurtosis, same as pandas rolling().kurt()
+    n, m2, _, m4 = _moments(values)
+    if m2 <= 1e-14:
+        return math.nan
+    g2 = m4 / m2 ** 2 - 3
+    return ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+
+
+class StreamingFeatureEngine:
+    """
+        incremental version of model_data_fetch.add_features for one ticker.
+
+        keeps ring buffers of the last MAX_LOOKBACK bars, the ema states behind rsi and macd
+        and running sums for the cumulative vwap, so each new bar costs the same whatever the
+        history length. features() gives the same 26 columns as the pandas/ta path for the
+        latest bar (None until enough bars have been seen).
+
+        warm it up once with from_history() on the full history (the emas and the vwap depend
+        on every bar), then feed new bars with update() / update_frame(). a bar with the same
+        timestamp as the last one replaces it, so a still forming daily bar can be refreshed.
+    """
+
+    def __init__(self, ticker: str, sector: str):
+        self.ticker = ticker
+        self.sector = sector
+        self._state = {
+            "timestamp": None,
+            "count": 0,
+            "close": deque(maxlen=MAX_LOOKBACK),
+            "high": deque(maxlen=STOCH_WINDOW),
+            "low": deque(maxlen=STOCH_WINDOW),
+            "returns": deque(maxlen=5),
+            "volume": None,
+            "ema_up": None,
+            "ema_down": None,
+            "ema_fast": None,
+            "ema_slow": None,
+            "sma_sums": {window: 0.0 for window in SMA_WINDOWS},
+            "cum_pv": 0.0,
+            "cum_volume": 0.0,
+            "row": None,
+        }
+        self._previous = None  # state before the last bar, used when it gets replaced
+        self.first_valid = None  # timestamp of the first bar with every feature available
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, ticker: str, sector: str):
+        """ builds an engine and feeds it the whole OHLCV history. """
+        engine = cls(ticker, sector)
+        engine.update_frame(df)
+        return engine
+
+    @property
+    def last_timestamp(self):
+        return self._state["timestamp"]
+
+    def is_consistent(self, df: pd.DataFrame):
+        """
+            false when the bar before the last one seen no longer matches df, e.g. after the
+            provider re-adjusted history for a split or dividend. the engine must then be rebuilt.
+        """
+        previous = self._previous
+        if previous is None or previous["timestamp"] is None:
+            return True
+        timestamp = previous["timestamp"]
+        if timestamp not in df.index:
+            return False
+        close = float(df.loc[timestamp, "Close"])
+        return abs(close - previous["close"][-1]) <= 1e-9 * max(abs(close), 1.0)
+
+    def update_frame(self, df: pd.DataFrame):
+        """ feeds every bar of df from the last seen timestamp on (that one included). """
+        if self.last_timestamp is not None:
+            df = df[df.index >= self.last_timestamp]
+        for timestamp, high, low, close, volume in zip(
+                df.index, df["High"].values, df["Low"].values, df["Close"].values, df["Volume"].values):
+            self.update(timestamp, high, low, close, volume)
+        return self.features()
+
+    def update(self, timestamp, high: float, low: float, close: float, volume: float):
+        """ feeds one bar and returns its feature values as a dict (None while warming up). """
+        if self._state["timestamp"] is not None and timestamp == self._state["timestamp"]:
+            self._state = self._previous
+        elif self._state["timestamp"] is not None and timestamp < self._state["timestamp"]:
+            raise ValueError(f"Bar at {timestamp} is older than the last one seen ({self._state['timestamp']})")
+        self._previous = {k: v.copy() if isinstance(v, (deque, dict)) else v for k, v in self._state.items()}
+        state = self._state
+        closes = state["close"]
+
+        prev_close = closes[-1] if closes else None
+        close, high, low, volume = float(close), float(high), float(low), float(volume)
+        diff = close - prev_close if prev_close is not None else math.nan
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else 0.0
+
+        closes.append(close)
+        state["high"].append(high)
+        state["low"].append(low)
+        state["count"] += 1
+        count = state["count"]
+
+        returns = {}
+        for window in RETURN_WINDOWS:
+            returns[window] = _pct(close, closes[-window - 1]) if len(closes) > window else math.nan
+        if not math.isnan(returns[1]):
+            state["returns"].append(returns[1])
+        else:
+            state["returns"].clear()
+
+        state["ema_up"] = _ema(state["ema_up"], up, 1 / RSI_WINDOW)
+        state["ema_down"] = _ema(state["ema_down"], down, 1 / RSI_WINDOW)
+        state["ema_fast"] = _ema(state["ema_fast"], close, 2 / (MACD_FAST + 1))
+        state["ema_slow"] = _ema(state["ema_slow"], close, 2 / (MACD_SLOW + 1))
+
+        rsi = math.nan
+        if count >= RSI_WINDOW:
+            if state["ema_down"] == 0:
+                rsi = 100.0
+            else:
+                rsi = 100 - (100 / (1 + state["ema_up"] / state["ema_down"]))
+        macd = state["ema_fast"] - state["ema_slow"] if count >= MACD_SLOW else math.nan
+
+        stoch = williams_r = math.nan
+        if count >= STOCH_WINDOW:
+            lowest, highest = min(state["low"]), max(state["high"])
+            stoch = _div(100 * (close - lowest), highest - lowest)
+            williams_r = _div(-100 * (highest - close), highest - lowest)
+
+        roc = math.nan
+        if len(closes) > ROC_WINDOW:
+            old = closes[-ROC_WINDOW - 1]
+            roc = _div(close - old, old) * 100
+
+        rolling = [math.nan] * 3
+        if len(closes) >= 5:
+            last5 = [closes[-5], closes[-4], closes[-3], closes[-2], closes[-1]]
+            rolling = [_std(last5), _skew(last5), _kurt(last5)]
+        realized_vol = _std(state["returns"]) if len(state["returns"]) == 5 else math.nan
+
+        # running sums, the close leaving each window is still inside the MAX_LOOKBACK buffer
+        smas = {}
+        sums = state["sma_sums"]
+        for window in SMA_WINDOWS:
+            sums[window] += close
+            if len(closes) > window:
+                sums[window] -= closes[-window - 1]
+            smas[window] = sums[window] / window if len(closes) >= window else math.nan
+
+        state["cum_pv"] += volume * (high + low + close) / 3
+        state["cum_volume"] += volume
+        vwap = _div(state["cum_pv"], state["cum_volume"])
+        volume_change = _pct(volume, state["volume"])
+        state["volume"] = volume
+        state["timestamp"] = timestamp
+
+        row = {
+            "return_1d": returns[1], "return_7d": returns[7], "return_30d": returns[30],
+            "return_180d": returns[180], "return_365d": returns[365],
+            "stoch": stoch, "roc": roc, "williams_r": williams_r,
+            "realized_vol_5": realized_vol, "rolling_std_5": rolling[0],
+            "rolling_skew_5": rolling[1], "rolling_kurt_5": rolling[2],
+            "rsi": rsi, "macd": macd,
+            "sma5": smas[5], "Volume": volume, "sma10": smas[10], "sma20": smas[20],
+            "sma50": smas[50], "sma100": smas[100], "sma200": smas[200],
+            "sector": self.sector, "vwap": vwap, "volume_change": volume_change,
+            "day_of_week": pd.Timestamp(timestamp).day_name(), "ticker": self.ticker,
+        }
+        # same rule as the dropna in add_features
+        valid = not any(isinstance(v, float) and math.isnan(v) for v in row.values())
+        state["row"] = row if valid else None
+        if valid and self.first_valid is None:
+            self.first_valid = timestamp
+        return state["row"]
+
+    def features(self):
+        """ one row frame (FEATURE_COLUMNS) for the latest bar, None while warming up. """
+        row = self._state["row"]
+        if row is None:
+            return None
+        return pd.DataFrame(
+            {column: [row[column]] for column in FEATURE_COLUMNS},
+            index=pd.DatetimeIndex([self._state["timestamp"]], name="Date"),
+        )
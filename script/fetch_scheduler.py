@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+import concurrent.futures
+
+
+class TokenBucket:
+    """ blocking token bucket, rate tokens per second with room for burst at once. """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchScheduler:
+    """
+        provider wrapper that every upstream request goes through.
+
+        - at most max_concurrency requests in flight across all threads
+        - token bucket rate limiting (rate per second, burst)
+        - failed requests are retried with jittered exponential backoff
+          (sleep uniform(0, min(backoff_max, backoff_base * 2**attempt)))
+        - single-flight: concurrent callers asking for the same (ticker, interval, period, ...)
+          share one in-flight request, each caller gets its own copy of the result
+
+        it exposes the same history()/info() as the providers in script.providers, so it can be
+        handed to a BarStore or used directly by model_data_fetch.
+    """
+
+    def __init__(self, provider, max_concurrency: int = 8, rate: float = 4.0, burst: int = 8, retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, seed: int = None):
+        self.provider = provider
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._counters = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0}
+
+    def history(self, ticker: str, interval: str, period: str = None, start=None, end=None):
+        key = ("history", ticker, interval, period, str(start), str(end))
+        return self._single_flight(
+            key, lambda: self.provider.history(ticker, interval=interval, period=period, start=start, end=end)
+        )
+
+    def info(self, ticker: str):
+        return self._single_flight(("info", ticker), lambda: self.provider.info(ticker))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._inflight))
+
+    def _single_flight(self, key, request):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+            else:
+                self._counters["coalesced"] += 1
+
+        if leader:
+            try:
+                future.set_result(self._call(request))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+        return _copy(future.result())
+
+    def _call(self, request):
+        for attempt in range(self.retries + 1):
+            self._bucket.acquire()
+            with self._slots:
+                with self._lock:
+                    self._counters["requests"] += 1
+                try:
+                    return request()
+                except Exception as e:
+                    error = e
+            with self._lock:
+                self._counters["failures"] += 1
+                if attempt < self.retries:
+                    self._counters["retries"] += 1
+                    delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if attempt < self.retries:
+                time.sleep(delay)
+        raise error
+
+
+def _copy(result):
+    # callers mutate frames (features are added in place), never hand out the shared object
+    return result.copy() if hasattr(result, "copy") else result
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+from datetime import datetime
+from script.atomic_file import merge_json
+
+
+class GarchSpecRegistry:
+    """
+        persistent per ticker record of the garch spec picked by the full grid search.
+        each entry keeps the spec [vol, dist, p, q], its latest aic and qlike, the aic per
+        observation at selection time, the fitted parameters and when the grid last ran.
+
+        volatility_predict uses it to fit only the stored spec (warm started from the stored
+        parameters) and goes back to the full grid when the entry is older than reselect_days
+        or the fit quality degrades.
+    """
+
+    def __init__(self, path: str, reselect_days: int = 7, degrade_tolerance: float = 0.05, max_qlike: float = None):
+        self.path = path
+        self.reselect_days = reselect_days
+        # allowed rise of aic per observation over the stored one before re-running the grid
+        self.degrade_tolerance = degrade_tolerance
+        # optional upper bound on the qlike score of the stored spec fit
+        self.max_qlike = max_qlike
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def snapshot(self, ticker: str):
+        """
+            in-memory copy holding only ticker's entry, for fitting in another process.
+            hand it back to merge() once the fit is done.
+        """
+        copy = GarchSpecRegistry(None, self.reselect_days, self.degrade_tolerance, self.max_qlike)
+        entry = self.get(ticker)
+        if entry is not None:
+            copy._entries[ticker] = entry
+        return copy
+
+    def merge(self, other):
+        """ takes over the entries of a snapshot and saves them. """
+        with self._lock:
+            self._entries.update(other._entries)
+            self._save(other._entries)
+
+    def get(self, ticker: str):
+        with self._lock:
+            entry = self._entries.get(ticker)
+            return None if entry is None else dict(entry)
+
+    def needs_reselection(self, entry: dict):
+        """ true when the grid for this entry was last run more than reselect_days ago. """
+        selected_at = datetime.fromisoformat(entry["selected_at"])
+        return (datetime.now() - selected_at).days >= self.reselect_days
+
+    def degraded(self, entry: dict, aic: float, qlike: float, nobs: int):
+        """ true when a stored spec fit is clearly worse than the one recorded. """
+        if aic / nobs - entry["aic_per_obs"] > self.degrade_tolerance:
+            return True
+        return self.max_qlike is not None and qlike > self.max_qlike
+
+    def update(self, ticker: str, spec: list, aic: float, qlike: float, params: list, nobs: int, reselected: bool):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            previous = self._entries.get(ticker, {})
+            self._entries[ticker] = {
+                "spec": list(spec),
+                "aic": float(aic),
+                # baseline from the last grid run, daily refits are compared against it
+                "aic_per_obs": float(aic) / nobs if reselected else previous["aic_per_obs"],
+                "qlike": float(qlike),
+                "params": [float(v) for v in params],
+                "selected_at": now if reselected else previous.get("selected_at", now),
+                "updated_at": now,
+            }
+            self._save([ticker])
+
+    def _save(self, tickers):
+        # other api workers write the same file, only the tickers changed here are written over
+        # theirs and the entries they saved meanwhile are picked up
+        if self.path is None:
+            return
+        self._entries = merge_json(self.path, {ticker: self._entries[ticker] for ticker in tickers})
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+import concurrent.futures
+import pandas as pd
+from script.providers import YahooProvider
+
+INTRADAY_STORE_FOLDER = os.path.join("data", "intraday")
+
+# nse cash session, a session read before its close is checked again after refresh_interval
+SESSION_TZ = "Asia/Kolkata"
+SESSION_CLOSE = "15:30"
+
+# yahoo serves 1 minute bars for the last 30 days and at most 8 days per request
+MAX_REQUEST_DAYS = 7
+
+# calendar days searched back for the latest session when no date is given
+LATEST_LOOKBACK_DAYS = 7
+
+
+def session_days(first, last):
+    """ the business days from first to last (inclusive) as "YYYY-MM-DD" strings. """
+    return [day.strftime("%Y-%m-%d") for day in pd.bdate_range(first, last)]
+
+
+def today():
+    return pd.Timestamp.now(tz=SESSION_TZ).strftime("%Y-%m-%d")
+
+
+def _session_date(index: pd.DatetimeIndex):
+    if index.tz is not None:
+        index = index.tz_convert(SESSION_TZ)
+    return index.strftime("%Y-%m-%d")
+
+
+def _spans(days):
+    """ sorted days grouped into (first, last) spans of at most MAX_REQUEST_DAYS calendar days. """
+    spans = []
+    for day in sorted(days):
+        if spans and (pd.Timestamp(day) - pd.Timestamp(spans[-1][0])).days < MAX_REQUEST_DAYS:
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return spans
+
+
+class IntradayStore:
+    """
+        on-disk 1 minute bars, one parquet file per (ticker, session date) under folder/<ticker>/
+        with a sessions.json index per ticker: {date: {"bars", "complete", "checked_at"}}.
+
+        fill() asks the provider once per ticker for every missing session (a request covers up
+        to MAX_REQUEST_DAYS days), later reads of those sessions are disk reads. finished
+        sessions are never fetched again, a holiday is stored as a session without bars. today's
+        session before the close is fetched again once it is refresh_interval seconds old.
+    """
+
+    def __init__(self, folder: str = INTRADAY_STORE_FOLDER, provider=None, refresh_interval: float = 300,
+                 max_workers: int = 20):
+        self.folder = folder
+        self.provider = provider if provider is not None else YahooProvider()
+        self.refresh_interval = refresh_interval
+        self.max_workers = max_workers  # tickers filled at the same time by fill_many()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _ticker_folder(self, ticker: str):
+        return os.path.join(self.folder, ticker.replace(os.sep, "_"))
+
+    def _lock(self, ticker: str):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _load_index(self, ticker: str):
+        path = os.path.join(self._ticker_folder(ticker), "sessions.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_index(self, ticker: str, index: dict):
+        path = os.path.join(self._ticker_folder(ticker), "sessions.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def _save_session(self, ticker: str, day: str, df: pd.DataFrame):
+        path = os.path.join(self._ticker_folder(ticker), f"{day}.parquet")
+        # temp file first so readers never see a half written session
+        df.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _complete(self, day: str):
+        now = pd.Timestamp.now(tz=SESSION_TZ)
+        current = now.strftime("%Y-%m-%d")
+        return day < current or (day == current and now.strftime("%H:%M") >= SESSION_CLOSE)
+
+    def _missing(self, index: dict, days):
+        now = time.time()
+        current = today()
+        return [
+            day for day in days
+            if day <= current and (
+                day not in index
+                or not index[day]["complete"] and now - index[day]["checked_at"] >= self.refresh_interval
+            )
+        ]
+
+    def _fetch(self, ticker: str, days, index: dict):
+        for first, last in _spans(days):
+            end = (pd.Timestamp(last) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+            try:
+                df = self.provider.history(ticker, interval="1m", start=first, end=end)
+            except Exception as e:
+                print(f"[ERROR] Minute bars of {ticker} {first}..{last}: {e}")
+                continue
+            if df is None or df.empty:
+                # nothing at all for the span is more likely a provider gap than holidays, not stored
+                print(f"[WARN] No minute bars for {ticker} {first}..{last}")
+                continue
+            sessions = dict(tuple(df.groupby(_session_date(df.index))))
+            for day in days:
+                if not first <= day <= last:
+                    continue
+                bars = sessions.get(day)
+                if bars is not None:
+                    self._save_session(ticker, day, bars)
+                index[day] = {
+                    "bars": 0 if bars is None else len(bars),
+                    "complete": self._complete(day),
+                    "checked_at": time.time(),
+                }
+
+    def fill(self, ticker: str, days):
+        """ fetches the sessions of ticker among days that are not stored yet, returns its index. """
+        with self._lock(ticker):
+            index = self._load_index(ticker)
+            missing = self._missing(index, days)
+            if missing:
+                os.makedirs(self._ticker_folder(ticker), exist_ok=True)
+                self._fetch(ticker, missing, index)
+                self._save_index(ticker, index)
+            return index
+
+    def fill_many(self, tickers, days):
+        """ fill() for every ticker, max_workers tickers at a time. returns {ticker: index}. """
+        tickers = list(dict.fromkeys(tickers))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(tickers, executor.map(lambda t: self.fill(t, days), tickers)))
+
+    def _read(self, ticker: str, day: str, index: dict):
+        if index.get(day, {}).get("bars", 0) == 0:
+            return pd.DataFrame()
+        return pd.read_parquet(os.path.join(self._ticker_folder(ticker), f"{day}.parquet"))
+
+    def _latest(self, index: dict):
+        # a session still trading is not the latest one, its trades have not played out yet
+        days = [day for day, entry in index.items() if entry["bars"] > 0 and entry["complete"]]
+        return max(days) if days else None
+
+    def session(self, ticker: str, day: str = None):
+        """
+            the 1 minute bars of ticker on day ("YYYY-MM-DD"), by default the latest completed session.
+            an empty frame when there were no bars (holiday, unknown ticker, provider down).
+        """
+        return self.sessions([ticker], day)[ticker]
+
+    def sessions(self, tickers, day: str = None):
+        """ {ticker: 1 minute bars of day}, the missing sessions are filled first in one go. """
+        if day is None:
+            current = pd.Timestamp(today())
+            indexes = self.fill_many(tickers, session_days(current - pd.Timedelta(days=LATEST_LOOKBACK_DAYS), current))
+            return {t: self._read(t, self._latest(index), index) for t, index in indexes.items()}
+        day = pd.Timestamp(day).strftime("%Y-%m-%d")
+        indexes = self.fill_many(tickers, [day])
+        return {t: self._read(t, day, index) for t, index in indexes.items()}
@@ -0,0 +1,421 @@
+import json
+import os
+import sys
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from script.prediction_cache import file_sha256
+
+FORMAT_VERSION = 1
+
+# rows scored per pass over the trees, bounds the (rows x trees x depth) work arrays
+ROW_CHUNK = 1024
+
+# lightgbm missing value handling per split node, xgboost nodes all behave like NAN
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+LGBM_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+LGBM_ZERO = 1e-35
+
+
+def predict_with_threshold(model, features, threshold):
+    """
+        this function it for predicting on custom thershold limit.
+    """
+
+    # Get probabilities for class 1
+    proba = model.predict_proba(features)[:, 1]
+
+    # Apply threshold
+    y_pred = np.where(proba >= threshold, 1, 0)
+    return y_pred, proba
+
+
+def lean_path(model_path: str):
+    """ where the lean artifact of a pickled model lives, next to it. """
+    return os.path.splitext(model_path)[0] + ".lean.npz"
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+# ---------------------------------------------------------------- export
+
+
+def _flatten(trees):
+    """
+        concatenates the trees (node lists, child -1 on leaves) into one node table in breadth first
+        order, so a node's right child always sits right after its left one ("child" is the left).
+        leaves point at themselves with a nan split value that sends nothing right, so walking every
+        tree for the deepest tree's depth lands each row on its leaf without checking which are done.
+    """
+    columns = {name: [] for name in ("feature", "threshold", "child", "default_left", "missing", "value")}
+    roots, depth = [], 0
+    for tree in trees:
+        left, right = tree["left"], tree["right"]
+        offset = len(columns["child"])
+        order, levels = [0], {0: 0}
+        for node in order:
+            if left[node] >= 0:
+                order += [left[node], right[node]]
+                levels[left[node]] = levels[right[node]] = levels[node] + 1
+        position = {node: offset + i for i, node in enumerate(order)}
+        for node in order:
+            leaf = left[node] < 0
+            columns["child"].append(position[node] if leaf else position[left[node]])
+            columns["feature"].append(0 if leaf else tree["feature"][node])
+            columns["threshold"].append(np.nan if leaf else tree["threshold"][node])
+            columns["default_left"].append(True if leaf else tree["default_left"][node])
+            columns["missing"].append(MISSING_NONE if leaf else tree["missing"][node])
+            columns["value"].append(tree["value"][node] if leaf else 0.0)
+        roots.append(offset)
+        depth = max(depth, max(levels.values()))
+
+    dtypes = {"feature": np.int32, "threshold": np.float64, "child": np.int32,
+              "default_left": bool, "missing": np.int8, "value": np.float64}
+    flat = {name: np.asarray(values, dtype=dtypes[name]) for name, values in columns.items()}
+    flat["roots"] = np.asarray(roots, dtype=np.int32)
+    flat["depth"] = np.asarray(depth)
+    return flat
+
+
+def _export_xgb(model):
+    learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        raise ValueError(f"Unsupported xgboost objective {learner['objective']['name']}")
+    trees = learner["gradient_booster"]["model"]["trees"]
+    try:
+        # the sklearn wrapper predicts with the early stopping round when there is one
+        trees = trees[:model.best_iteration + 1]
+    except AttributeError:
+        pass
+
+    nodes = []
+    for tree in trees:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical xgboost splits are not supported")
+        left = tree["left_children"]
+        nodes.append({
+            "left": left,
+            "right": tree["right_children"],
+            "feature": tree["split_indices"],
+            # leaves keep their value in split_conditions. the splits are float32, the json decimals
+            # are rounded back to them so a feature equal to its split value goes the same way
+            "threshold": np.asarray(tree["split_conditions"], dtype=np.float32),
+            "value": [c if l < 0 else 0.0 for l, c in zip(left, tree["split_conditions"])],
+            "default_left": tree["default_left"],
+            "missing": [MISSING_NAN] * len(left),
+        })
+    flat = _flatten(nodes)
+    # base_score is kept as a probability for binary:logistic, the trees add to its margin
+    base_score = float(learner["learner_model_param"]["base_score"])
+    flat["bias"] = np.asarray(np.log(base_score / (1 - base_score)))
+    return "xgb", flat
+
+
+def _export_lgbm(model):
+    booster = model.booster_
+    dump = booster.dump_model(num_iteration=booster.best_iteration or None)
+    objective = dump["objective"].split()
+    if objective[0] != "binary" or dump["num_tree_per_iteration"] != 1 or dump["average_output"]:
+        raise ValueError(f"Unsupported lightgbm model {dump['objective']}")
+    sigmoid = dict(p.split(":") for p in objective[1:] if ":" in p).get("sigmoid", "1")
+
+    nodes = []
+    for info in dump["tree_info"]:
+        tree = {name: [] for name in ("left", "right", "feature", "threshold", "value", "default_left", "missing")}
+
+        def add(node):
+            index = len(tree["left"])
+            for name in tree:
+                tree[name].append(0)
+            if "leaf_value" in node:
+                tree["left"][index] = tree["right"][index] = -1
+                tree["value"][index] = node["leaf_value"]
+                return index
+            if node["decision_type"] != "<=":
+                raise ValueError("Categorical lightgbm splits are not supported")
+            tree["feature"][index] = node["split_feature"]
+            tree["threshold"][index] = node["threshold"]
+            tree["default_left"][index] = node["default_left"]
+            tree["missing"][index] = LGBM_MISSING_TYPES[node["missing_type"]]
+            tree["left"][index] = add(node["left_child"])
+            tree["right"][index] = add(node["right_child"])
+            return index
+
+        add(info["tree_structure"])
+        nodes.append(tree)
+    flat = _flatten(nodes)
+    flat["bias"] = np.asarray(0.0)
+    flat["sigmoid"] = np.asarray(float(sigmoid))
+    return "lgbm", flat
+
+
+def _export_catboost(model):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "model.json")
+        model.save_model(path, format="json")
+        with open(path) as f:
+            dump = json.load(f)
+
+    floats = dump["features_info"]["float_features"]
+    flat_index = {f["feature_index"]: f["flat_feature_index"] for f in floats}
+    n_features = max(f["flat_feature_index"] for f in floats) + 1
+    nan_fill = np.full(n_features, -np.inf, dtype=np.float32)
+    for f in floats:
+        if f.get("nan_value_treatment") == "AsTrue":
+            nan_fill[f["flat_feature_index"]] = np.inf
+
+    trees = dump["oblivious_trees"]
+    depth = max(len(tree["splits"]) for tree in trees)
+    # shallower trees get splits no value passes (border +inf), their extra leaves are never reached
+    feature = np.zeros((len(trees), depth), dtype=np.int32)
+    border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+    leaf = np.zeros((len(trees), 2 ** depth))
+    for i, tree in enumerate(trees):
+        for j, split in enumerate(tree["splits"]):
+            if split["split_type"] != "FloatFeature":
+                raise ValueError(f"Unsupported catboost split {split['split_type']}")
+            feature[i, j] = flat_index[split["float_feature_index"]]
+            border[i, j] = split["border"]
+        leaf[i, :len(tree["leaf_values"])] = tree["leaf_values"]
+
+    scale, bias = dump["scale_and_bias"]
+    return "cat", {
+        "feature": feature,
+        "border": border,
+        "leaf": leaf * scale,
+        "bias": np.asarray(float(np.sum(bias))),
+        "nan_fill": nan_fill,
+    }
+
+
+BASE_EXPORTERS = {
+    "XGBClassifier": _export_xgb,
+    "LGBMClassifier": _export_lgbm,
+    "CatBoostClassifier": _export_catboost,
+}
+
+
+def _stack_parts(stack):
+    # fitted StackingClassifier, or the PrefitStack of stack_models_fast
+    if hasattr(stack, "estimators_"):
+        if getattr(stack, "passthrough", False) or any(m != "predict_proba" for m in stack.stack_method_):
+            raise ValueError("Only predict_proba stacking without passthrough is supported")
+        return list(stack.estimators_), stack.final_estimator_
+    return [estimator for _, estimator in stack.estimators], stack.final_estimator
+
+
+def export_lean_model(model, path: str, source_path: str = None):
+    """
+        writes a trained pipeline (preprocessor + stack of xgboost / lightgbm / catboost under a
+        logistic regression) as one npz of plain arrays: the scaler and encoder parameters, every
+        booster's trees as node tables and the logistic weights. LeanModel loads it with numpy
+        only. source_path is the pickle it came from, its hash is kept so cache keys stay the same.
+    """
+    preprocessor, stack = model.named_steps["preprocessor"], model.named_steps["stack"]
+    if preprocessor.remainder != "drop":
+        raise ValueError("Only a preprocessor that drops the other columns is supported")
+
+    arrays, transformers = {}, []
+    for i, (name, transformer, columns) in enumerate(preprocessor.transformers_):
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        kind = type(transformer).__name__
+        if kind == "StandardScaler":
+            n = len(columns)
+            arrays[f"t{i}_mean"] = transformer.mean_ if transformer.mean_ is not None else np.zeros(n)
+            arrays[f"t{i}_scale"] = transformer.scale_ if transformer.scale_ is not None else np.ones(n)
+            transformers.append({"kind": "scale", "key": f"t{i}", "columns": list(columns)})
+        elif kind == "OrdinalEncoder":
+            if transformer.handle_unknown != "use_encoded_value":
+                raise ValueError("The ordinal encoder must use handle_unknown='use_encoded_value'")
+            transformers.append({
+                "kind": "ordinal", "columns": list(columns), "unknown_value": float(transformer.unknown_value),
+                "categories": [[str(c) for c in categories] for categories in transformer.categories_],
+            })
+        else:
+            raise ValueError(f"Unsupported transformer {kind}")
+
+    estimators, final = _stack_parts(stack)
+    learners = []
+    for i, estimator in enumerate(estimators):
+        exporter = BASE_EXPORTERS.get(type(estimator).__name__)
+        if exporter is None:
+            raise ValueError(f"Unsupported base learner {type(estimator).__name__}")
+        kind, learner_arrays = exporter(estimator)
+        learners.append(kind)
+        arrays.update({f"b{i}_{key}": value for key, value in learner_arrays.items()})
+
+    if type(final).__name__ != "LogisticRegression" or final.coef_.shape[0] != 1:
+        raise ValueError("The final estimator must be a binary LogisticRegression")
+    arrays["meta_coef"] = final.coef_[0]
+    arrays["meta_intercept"] = np.asarray(final.intercept_[0])
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "source_sha256": file_sha256(source_path) if source_path else None,
+        "classes": [int(c) for c in final.classes_],
+        "transformers": transformers,
+        "learners": learners,
+    }
+    arrays["meta"] = np.asarray(json.dumps(meta))
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# ---------------------------------------------------------------- inference
+
+
+def _missing_right(trees, node, values, right, kind):
+    # rows with a missing value take the side the split learned for them
+    nan = np.isnan(values)
+    default_right = ~trees["default_left"].take(node)
+    if kind == "xgb":
+        return np.where(nan, default_right, right)
+    # lightgbm: nan counts as 0 unless the split learned a nan direction, "Zero" splits send 0 there too
+    missing = trees["missing"].take(node)
+    values = np.where(nan & (missing != MISSING_NAN), 0.0, values)
+    default = ((missing == MISSING_ZERO) & (np.abs(values) <= LGBM_ZERO)) | ((missing == MISSING_NAN) & nan)
+    return np.where(default, default_right, values > trees["threshold"].take(node))
+
+
+def _tree_margin(trees, X, kind):
+    """
+        sum of the leaf values every row reaches, all trees stepped down one level at a time.
+        a row goes right (child + 1) when its value is not below the split (xgboost) or above it
+        (lightgbm). without nans and lightgbm "Zero" splits a step is only four gathers.
+    """
+    n_rows, n_features = X.shape
+    node = np.repeat(trees["roots"][None, :], n_rows, axis=0)
+    cells = np.ascontiguousarray(X).ravel()
+    row_start = (np.arange(n_rows) * n_features)[:, None]
+    feature, threshold, child = trees["feature"], trees["threshold"], trees["child"]
+    missing = np.isnan(cells).any() or (kind == "lgbm" and (trees["missing"] == MISSING_ZERO).any())
+    for _ in range(int(trees["depth"])):
+        values = cells.take(row_start + feature.take(node))
+        split = threshold.take(node)
+        right = values >= split if kind == "xgb" else values > split
+        if missing:
+            right = _missing_right(trees, node, values, right, kind)
+        node = child.take(node) + right
+    return trees["value"].take(node).sum(axis=1) + trees["bias"]
+
+
+def _oblivious_margin(trees, X):
+    """
+        catboost trees use one split per level, the leaf index is the bits of the split results.
+        works on (trees x rows) arrays, gathering whole feature rows of X.T is the cheap direction.
+    """
+    if np.isnan(X).any():
+        X = np.where(np.isnan(X), trees["nan_fill"][:X.shape[1]], X)
+    feature, border, leaf = trees["feature"], trees["border"], trees["leaf"]
+    columns = np.ascontiguousarray(X.T)
+    # start from each tree's first leaf in the flattened leaf table
+    index = np.repeat((np.arange(len(leaf), dtype=np.int32) * leaf.shape[1])[:, None], len(X), axis=1)
+    for level in range(feature.shape[1]):
+        index += (columns.take(feature[:, level], axis=0) > border[:, level, None]) * np.int32(1 << level)
+    return leaf.take(index).sum(axis=0) + trees["bias"]
+
+
+class LeanModel:
+    """
+        inference-only stand-in for the pickled pipeline, loaded from export_lean_model's npz.
+        predict_proba gives the same probabilities as the pipeline using numpy and pandas only, so
+        serving does not import sklearn, xgboost, lightgbm or catboost and starts in a fraction of
+        the time joblib.load takes.
+    """
+
+    def __init__(self, arrays: dict):
+        meta = json.loads(str(arrays["meta"]))
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lean model format {meta['format_version']}")
+        self.source_sha256 = meta["source_sha256"]
+        self.classes_ = np.asarray(meta["classes"])
+        self.learners = meta["learners"]
+        self.transformers = meta["transformers"]
+        self.feature_names_in_ = np.asarray([c for t in self.transformers for c in t["columns"]], dtype=object)
+        self._arrays = arrays
+        self._scales = {t["key"]: (arrays[f"{t['key']}_mean"], arrays[f"{t['key']}_scale"])
+                        for t in self.transformers if t["kind"] == "scale"}
+        self._categories = [[pd.Index(c) for c in t["categories"]]
+                            for t in self.transformers if t["kind"] == "ordinal"]
+        self._trees = []
+        for i in range(len(self.learners)):
+            prefix = f"b{i}_"
+            self._trees.append({key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)})
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def transform(self, X: pd.DataFrame):
+        """ the preprocessor's output, numeric columns scaled and category columns as codes. """
+        blocks, ordinal = [], iter(self._categories)
+        for transformer in self.transformers:
+            values = X[transformer["columns"]]
+            if transformer["kind"] == "scale":
+                mean, scale = self._scales[transformer["key"]]
+                blocks.append((values.to_numpy(dtype=np.float64) - mean) / scale)
+            else:
+                codes = np.empty(values.shape, dtype=np.float64)
+                for j, categories in enumerate(next(ordinal)):
+                    found = categories.get_indexer(values.iloc[:, j].astype(str))
+                    codes[:, j] = np.where(found < 0, transformer["unknown_value"], found)
+                blocks.append(codes)
+        return np.hstack(blocks)
+
+    def base_probabilities(self, Xt):
+        """ class 1 probability of every base learner, the final estimator's input. """
+        columns = []
+        for kind, trees in zip(self.learners, self._trees):
+            if kind == "cat":
+                margin = _oblivious_margin(trees, Xt.astype(np.float32))
+            elif kind == "xgb":
+                # xgboost compares float32 features with float32 split values
+                margin = _tree_margin(trees, Xt.astype(np.float32), kind)
+            else:
+                margin = _tree_margin(trees, Xt, kind) * trees["sigmoid"]
+            columns.append(_sigmoid(margin))
+        return np.column_stack(columns)
+
+    def predict_proba(self, X: pd.DataFrame):
+        Xt = self.transform(X)
+        proba = np.empty(len(Xt))
+        for start in range(0, len(Xt), ROW_CHUNK):
+            stacked = self.base_probabilities(Xt[start:start + ROW_CHUNK])
+            proba[start:start + ROW_CHUNK] = _sigmoid(stacked @ self._arrays["meta_coef"] + self._arrays["meta_intercept"])
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X: pd.DataFrame):
+        return self.classes_[(self.predict_proba(X)[:, 1] >= 0.5).astype(int)]
+
+
+def load_model(model_path: str):
+    """
+        the lean artifact next to model_path when it was exported from that file (or the pickle is
+        not deployed), otherwise the pickled pipeline.
+    """
+    lean = lean_path(model_path)
+    if os.path.exists(lean):
+        model = LeanModel.load(lean)
+        if not os.path.exists(model_path) or model.source_sha256 == file_sha256(model_path):
+            return model
+        print(f"[WARN] {lean} was exported from a different model file, loading {model_path}")
+    return joblib.load(model_path)
+
+
+if __name__ == "__main__":
+    # python -m script.lean_model MODEL.pkl [OUT.npz]
+    source = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else lean_path(source)
+    export_lean_model(joblib.load(source), target, source_path=source)
+    print(f"[INFO] Lean model written to {target}")
@@ -0,0 +1,268 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, ExitStack
+from datetime import datetime
+
+# upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# seconds between two stack samples of a profiled request, and where the profiles are written
+PROFILE_INTERVAL = 0.005
+PROFILE_FOLDER = os.path.join("data", "profiles")
+
+# one [TIMING] json line per request on stdout, off unless API_TIMING_LOG=1 is set (the
+# X-Stage-Timings header and /metrics carry the same timings either way)
+TIMING_LOG = os.environ.get("API_TIMING_LOG") == "1"
+
+
+def _label(value: str):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """ cumulative latency histogram per value of one label, rendered in the prometheus text format. """
+
+    def __init__(self, name: str, description: str, label: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label_value: str, seconds: float):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_label(value)}"'
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label}}} {series['count']}")
+        return lines
+
+
+stage_seconds = Histogram("prediction_stage_seconds", "Time spent in each stage of the prediction path.", "stage")
+request_seconds = Histogram("http_request_seconds", "Time to answer a request, response encoding included.", "path")
+
+
+def render_metrics():
+    """ every histogram in the prometheus text exposition format, for GET /metrics. """
+    return "\n".join(stage_seconds.render() + request_seconds.render()) + "\n"
+
+
+class SamplingProfiler:
+    """
+        samples the python stacks of the registered threads every interval seconds on a daemon
+        thread. stacks are counted in collapsed form ("outer;inner;leaf count" per line), the
+        input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def add_thread(self, ident: int):
+        self.threads.add(ident)
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def save(self, path: str):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class Trace:
+    """ the (stage, seconds) spans of one request, with the profiler when the request asked for one. """
+
+    def __init__(self, name: str, profile: bool = False):
+        self.name = name
+        self.spans = []
+        self.seconds = None
+        self.profiler = SamplingProfiler() if profile else None
+        self.profile_path = None
+
+    def totals(self):
+        totals = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def header(self):
+        """ "stage=seconds;..." for the X-Stage-Timings response header. """
+        return ";".join(f"{stage}={seconds:.4f}" for stage, seconds in self.totals().items())
+
+    def to_json(self):
+        return json.dumps({
+            "request": self.name,
+            "seconds": None if self.seconds is None else round(self.seconds, 6),
+            "stages": {stage: round(seconds, 6) for stage, seconds in self.totals().items()},
+            "spans": len(self.spans),
+            "profile": self.profile_path,
+        })
+
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+        times a stage of the prediction path into the stage histogram and the current request's
+        trace. stages running in pool threads join the trace when the pool got an in_trace function.
+    """
+    trace = _trace.get()
+    if trace is not None and trace.profiler is not None:
+        trace.profiler.add_thread(threading.get_ident())
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(stage, seconds)
+        if trace is not None:
+            trace.spans.append((stage, seconds))
+
+
+@contextmanager
+def request_trace(name: str, profile: bool = False):
+    """
+        collects the spans of one request and times it into the request histogram. with profile
+        the threads running its spans are sampled and the stacks saved under PROFILE_FOLDER.
+        stage totals add up the spans of every thread, so parallel stages can exceed the request.
+    """
+    trace = Trace(name, profile=profile)
+    token = _trace.set(trace)
+    if trace.profiler is not None:
+        # named up front so the response header can point to it, written when the request is done
+        file_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{name.replace('/', '_')}.txt"
+        trace.profile_path = os.path.join(PROFILE_FOLDER, file_name)
+        # threads join the sampling at their first span, the event loop itself mostly waits
+        trace.profiler.start()
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        request_seconds.observe(name, trace.seconds)
+        _trace.reset(token)
+        if trace.profiler is not None:
+            trace.profiler.stop()
+            trace.profiler.save(trace.profile_path)
+
+
+async def trace_http_request(request, call_next):
+    """
+        fastapi http middleware: the stage timings of every request go to the /metrics histograms,
+        the X-Stage-Timings header and with TIMING_LOG one [TIMING] json line. ?profile=1 (or an
+        X-Profile: 1 header) also samples the stacks of the threads working on the request into
+        PROFILE_FOLDER, the file is named in the X-Profile header.
+        the trace stays open until the body is sent, so a streamed body (/predict/stream) has its
+        spans and its full latency in the histograms and the [TIMING] line. the header is sent
+        before the body and only holds the stages done by then.
+    """
+    profile = request.query_params.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+    tracing = ExitStack()
+    trace = tracing.enter_context(request_trace(request.url.path, profile=profile))
+    try:
+        response = await call_next(request)
+    except BaseException:
+        tracing.close()
+        raise
+    response.headers["X-Stage-Timings"] = trace.header()
+    if trace.profile_path is not None:
+        response.headers["X-Profile"] = trace.profile_path
+    body = response.body_iterator
+
+    async def traced_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            tracing.close()
+            if TIMING_LOG:
+                print(f"[TIMING] {trace.to_json()}")
+
+    response.body_iterator = traced_body()
+    return response
+
+
+@contextmanager
+def collect_spans():
+    """ a trace of its own for work in another process, hand its spans back to record_spans. """
+    trace = Trace("worker")
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def record_spans(spans):
+    """ takes spans timed in another process into this process' histograms and current trace. """
+    trace = _trace.get()
+    for stage, seconds in spans:
+        stage_seconds.observe(stage, seconds)
+        if trace is not None:
+            trace.spans.append((stage, seconds))
+
+
+def in_trace(fn):
+    """
+        fn wrapped for a thread pool: each call runs in a copy of the caller's context, so its
+        spans land in the caller's trace (pool threads do not inherit context variables).
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
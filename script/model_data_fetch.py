@@ -1,63 +1,91 @@
 import pandas as pd 
-import yfinance as yf
 import ta
 import concurrent.futures
+from script.providers import YahooProvider
+from script.fetch_scheduler import FetchScheduler
+from script.ticker_metadata import TickerMetadataIndex, METADATA_PATH
+from script.metrics import span
+
+# every yahoo request made here goes through one scheduler: at most 8 in flight, 4 per second,
+# retries with jittered backoff and concurrent requests for the same ticker coalesced
+fetch_scheduler = FetchScheduler(YahooProvider(), max_concurrency=8, rate=4.0, burst=8, retries=3)
+
+# sector and other static attributes, read from memory, unknown tickers are filled in the background
+ticker_metadata = TickerMetadataIndex(METADATA_PATH, provider=fetch_scheduler)
+
+FEATURE_COLUMNS = ['return_1d', 'return_7d', 'return_30d', 'return_180d', 'return_365d', 'stoch', 'roc', 'williams_r', 'realized_vol_5', 'rolling_std_5', 'rolling_skew_5', 'rolling_kurt_5', 'rsi','macd','sma5','Volume', 'sma10','sma20','sma50','sma100','sma200','sector', 'vwap', 'volume_change', 'day_of_week', 'ticker']
+
+def add_features(df: pd.DataFrame, sector: str, ticker: str):
+    """
+        computes the technical indicators, calendar columns and next day target on an OHLCV frame.
+        returns (df, X, y) with rows holding any NaN dropped.
+    """
+    # Technical indicators
+    df["return_1d"] = df["Close"].pct_change(1)
+    df["return_7d"] = df["Close"].pct_change(7)
+    df["return_30d"] = df["Close"].pct_change(30)
+    df["return_180d"] = df["Close"].pct_change(180)
+    df["return_365d"] = df["Close"].pct_change(365)
+    df['rsi'] = ta.momentum.RSIIndicator(df['Close']).rsi()
+    df['macd'] = ta.trend.MACD(df['Close']).macd()
+    df["stoch"] = ta.momentum.StochasticOscillator(df["High"], df["Low"], df["Close"]).stoch()
+    df["roc"] = ta.momentum.ROCIndicator(df["Close"]).roc()
+    df["williams_r"] = ta.momentum.WilliamsRIndicator(df["High"], df["Low"], df["Close"]).williams_r()
+    df["realized_vol_5"] = df["return_1d"].rolling(5).std()
+    df["rolling_std_5"]  = df["Close"].rolling(5).std()
+    df["rolling_skew_5"] = df["Close"].rolling(5).skew()
+    df["rolling_kurt_5"] = df["Close"].rolling(5).kurt()
+    df['sma5'] = df['Close'].rolling(5).mean()
+    df['sma10'] = df['Close'].rolling(10).mean()
+    df['sma20'] = df['Close'].rolling(20).mean()
+    df['sma50'] = df['Close'].rolling(50).mean()
+    df['sma100'] = df['Close'].rolling(100).mean()
+    df['sma200'] = df['Close'].rolling(200).mean()
+    df["vwap"] = (df["Volume"] * (df["High"]+df["Low"]+df["Close"])/3).cumsum() / df["Volume"].cumsum()
+    df["volume_change"] = df["Volume"].pct_change()
+
+    df['sector'] = sector
+
+    df['date_str'] = pd.to_datetime(df.index)
+    df['day_of_week'] = df['date_str'].dt.day_name()
+
+    df['ticker'] = ticker
+
+    # Target (next-day return direction)
+    df['target'] = (df['Close'].shift(-1) > df['Close']).astype(int)
+
+    # dropping null values
+    df.dropna(inplace=True)
+
+    # Features & labels
+    X = df[FEATURE_COLUMNS]
+    y = df['target']
+    return df, X, y
+
+def ticker_sector(ticker: str):
+    """ sector of the ticker from the metadata index, 'Unknown' until it has been looked up. """
+    return ticker_metadata.sector(ticker)
 
 # this function can be used when updating the model and in production model updating
-def ticker_data_fetch(ticker: str, interval: str, period: str, feature_cal: bool):
+# pass a script.bar_store.BarStore as store to serve history from disk and only fetch the missing tail
+def ticker_data_fetch(ticker: str, interval: str, period: str, feature_cal: bool, store=None):
     try:
-        t = yf.Ticker(ticker)
-
         # Fetch price history
-        df = t.history(interval=interval, period=period)
+        with span("fetch"):
+            if store is not None:
+                df = store.history(ticker, interval=interval, period=period)
+            else:
+                df = fetch_scheduler.history(ticker, interval=interval, period=period)
         if df.empty:
             print(f"[WARN] No data for {ticker}")
             return None, None, None       
 
         if feature_cal:
-            # Technical indicators
-            df["return_1d"] = df["Close"].pct_change(1)
-            df["return_7d"] = df["Close"].pct_change(7)
-            df["return_30d"] = df["Close"].pct_change(30)
-            df["return_180d"] = df["Close"].pct_change(180)
-            df["return_365d"] = df["Close"].pct_change(365)
-            df['rsi'] = ta.momentum.RSIIndicator(df['Close']).rsi()
-            df['macd'] = ta.trend.MACD(df['Close']).macd()
-            df["stoch"] = ta.momentum.StochasticOscillator(df["High"], df["Low"], df["Close"]).stoch()
-            df["roc"] = ta.momentum.ROCIndicator(df["Close"]).roc()
-            df["williams_r"] = ta.momentum.WilliamsRIndicator(df["High"], df["Low"], df["Close"]).williams_r()
-            df["realized_vol_5"] = df["return_1d"].rolling(5).std()
-            df["rolling_std_5"]  = df["Close"].rolling(5).std()
-            df["rolling_skew_5"] = df["Close"].rolling(5).skew()
-            df["rolling_kurt_5"] = df["Close"].rolling(5).kurt()
-            df['sma5'] = df['Close'].rolling(5).mean()
-            df['sma10'] = df['Close'].rolling(10).mean()
-            df['sma20'] = df['Close'].rolling(20).mean()
-            df['sma50'] = df['Close'].rolling(50).mean()
-            df['sma100'] = df['Close'].rolling(100).mean()
-            df['sma200'] = df['Close'].rolling(200).mean()
-            df["vwap"] = (df["Volume"] * (df["High"]+df["Low"]+df["Close"])/3).cumsum() / df["Volume"].cumsum()
-            df["volume_change"] = df["Volume"].pct_change()
-
             # Safe sector info
-            sector = t.info.get('sector', 'Unknown')
-            df['sector'] = sector
-
-            df['date_str'] = pd.to_datetime(df.index)
-            df['day_of_week'] = df['date_str'].dt.day_name()
-            
-            df['ticker'] = ticker
-
-            # Target (next-day return direction)
-            df['target'] = (df['Close'].shift(-1) > df['Close']).astype(int)
-            
-            # dropping null values
-            df.dropna(inplace=True)
-            
-            # Features & labels
-            X = df[['return_1d', 'return_7d', 'return_30d', 'return_180d', 'return_365d', 'stoch', 'roc', 'williams_r', 'realized_vol_5', 'rolling_std_5', 'rolling_skew_5', 'rolling_kurt_5', 'rsi','macd','sma5','Volume', 'sma10','sma20','sma50','sma100','sma200','sector', 'vwap', 'volume_change', 'day_of_week', 'ticker']]
-            y = df['target']
-            return df, X, y
+            with span("info"):
+                sector = ticker_sector(ticker)
+            with span("features"):
+                return add_features(df, sector, ticker)
         else:
             return df, None, None
 
@@ -66,20 +94,23 @@ def ticker_data_fetch(ticker: str, interval: str, period: str, feature_cal: bool
         return None, None, None
     
 # Worker wrapper for safe execution
-def safe_fetch(ticker: str, interval: str, period: str, feature_cal: bool):
+def safe_fetch(ticker: str, interval: str, period: str, feature_cal: bool, store=None):
     try:
-        return ticker_data_fetch(ticker, interval, period, feature_cal)
+        return ticker_data_fetch(ticker, interval, period, feature_cal, store=store)
     except Exception as e:
         print(f"[ERROR] {ticker}: {e}")
         return None
 
-def model_data(ticker_list, interval="1d", period="5y", feature_cal=True):
+def model_data(ticker_list, interval="1d", period="5y", feature_cal=True, store=None):
     print("Initializing the data structure....")
-    main_base_df_list = []
     X_list = []
     y_list = []
 
-    args = [(ticker, interval, period, feature_cal) for ticker in ticker_list]
+    if feature_cal:
+        # the sector column must be real for training, look up every ticker not indexed yet first
+        ticker_metadata.refresh_missing(ticker_list)
+
+    args = [(ticker, interval, period, feature_cal, store) for ticker in ticker_list]
     # Run in parallel
 
     print("Starting the fetching process...")
@@ -93,22 +124,22 @@ def model_data(ticker_list, interval="1d", period="5y", feature_cal=True):
             print(f"{i}/{len(ticker_list)} skipped/failed to fetch: {ticker}")
             failded_fetch.append(ticker)
             continue
-        df_fetch, X_fetch, y_fetch = result
-        main_base_df_list.append(df_fetch)
+        _, X_fetch, y_fetch = result
         X_list.append(X_fetch)
         y_list.append(y_fetch)
+        results[i - 1] = None  # let the enriched frame go
         print(f"{i}/{len(ticker_list)} done: {ticker}")
 
-    main_base_df = pd.concat(main_base_df_list, axis=0).reset_index(drop=True)
     X = pd.concat(X_list, axis=0).reset_index(drop=True)
     y = pd.concat(y_list, axis=0).reset_index(drop=True)
 
     cat_cols = []
     num_cols = []
     for i in X.columns:
-        if X[i].dtype == "O":
+        if X[i].dtype == "O" or isinstance(X[i].dtype, pd.CategoricalDtype):
             cat_cols.append(i)
         else:
             num_cols.append(i)
-    print("Failded to fetch tickers")
+    if failded_fetch:
+        print(f"[WARN] Failed to fetch {len(failded_fetch)} tickers: {', '.join(failded_fetch)}")
     return X, y, cat_cols, num_cols
\ No newline at end of file
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import concurrent.futures
+from datetime import datetime
+from script.atomic_file import atomic_path, file_lock
+from script.lean_model import load_model, lean_path
+from script.prediction_cache import file_sha256
+
+MODEL_FOLDER = "model"
+MANIFEST_NAME = "manifest.json"
+
+# seconds between checks of the manifest (and the folder) for a new active version
+POLL_INTERVAL = 30
+
+
+def manifest_path(folder: str = MODEL_FOLDER):
+    return os.path.join(folder, MANIFEST_NAME)
+
+
+def read_manifest(folder: str = MODEL_FOLDER):
+    """ {"active": version or None, "versions": {version: entry}}, empty when there is no manifest yet. """
+    path = manifest_path(folder)
+    if not os.path.exists(path):
+        return {"active": None, "versions": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(folder: str, manifest: dict):
+    # callers hold the manifest lock from their read on, so no other process writes in between
+    with atomic_path(manifest_path(folder)) as tmp, open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _manifest_lock(folder: str):
+    # training runs and every api worker change the manifest, one read-modify-write at a time
+    return file_lock(manifest_path(folder))
+
+
+def _entry(folder: str, file_name: str):
+    path = os.path.join(folder, file_name)
+    stat = os.stat(path)
+    entry = {
+        "file": file_name,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "lean": os.path.exists(lean_path(path)),
+        "registered_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    # training date, metrics and origin written by script/train.py next to the model
+    if os.path.exists(path + ".json"):
+        with open(path + ".json") as f:
+            info = json.load(f)
+        entry.update({key: info[key] for key in ("trained_until", "metrics", "updated_from") if key in info})
+    return entry
+
+
+def register_model(path: str, activate: bool = False):
+    """
+        adds a model file of the registry folder to the manifest under its sha256 (the version)
+        and with activate makes it the version the api serves. returns the version.
+    """
+    folder, file_name = os.path.split(path)
+    folder = folder or "."
+    version = file_sha256(path)
+    with _manifest_lock(folder):
+        manifest = read_manifest(folder)
+        manifest["versions"][version] = _entry(folder, file_name)
+        if activate:
+            manifest["active"] = version
+        _write_manifest(folder, manifest)
+    return version
+
+
+def scan_folder(folder: str = MODEL_FOLDER):
+    """
+        registers the .pkl files of folder that are new or changed since the manifest saw them.
+        a file is only hashed again when its size or mtime moved. returns the manifest.
+    """
+    with _manifest_lock(folder):
+        manifest = read_manifest(folder)
+        known = {entry["file"]: (version, entry) for version, entry in manifest["versions"].items()}
+        changed = False
+        for file_name in sorted(os.listdir(folder)):
+            if not file_name.endswith(".pkl"):
+                continue
+            stat = os.stat(os.path.join(folder, file_name))
+            version, entry = known.get(file_name, (None, None))
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                lean = os.path.exists(lean_path(os.path.join(folder, file_name)))
+                if entry.get("lean") != lean:
+                    entry["lean"], changed = lean, True
+                continue
+            if version is not None:
+                manifest["versions"].pop(version)
+            manifest["versions"][file_sha256(os.path.join(folder, file_name))] = _entry(folder, file_name)
+            changed = True
+        if changed:
+            _write_manifest(folder, manifest)
+    return manifest
+
+
+class ServedModel:
+    """ one loaded version, requests hold on to the one they started with. """
+
+    def __init__(self, version: str, path: str, model):
+        self.version = version
+        self.path = path
+        self.model = model
+
+
+class ModelRegistry:
+    """
+        the model versions of a folder (manifest.json: sha256 -> file, size, training date, metrics)
+        and the one being served.
+
+        current() is a single attribute read, a request takes it once and keeps using that model,
+        so a swap never changes the model under a request in flight. a new active version (set by
+        activate() or written to the manifest by script/train.py) is loaded on a background thread
+        first and swapped in once it is ready, the old one serves until then and is released when
+        its last request is done. the folder is scanned for new .pkl files on every poll too.
+    """
+
+    def __init__(self, folder: str = MODEL_FOLDER, default: str = None, poll_interval: float = POLL_INTERVAL,
+                 validate=None):
+        self.folder = folder
+        self.poll_interval = poll_interval
+        # called with every loaded model before it can be served, raises to refuse it
+        self.validate = validate
+        self._lock = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._loading = {}
+        self._watcher = None
+        self._manifest_mtime = None
+
+        manifest = scan_folder(folder)
+        version = manifest["active"]
+        if version not in manifest["versions"]:
+            # first start: the configured file, else the newest model in the folder
+            by_file = {entry["file"]: v for v, entry in manifest["versions"].items()}
+            if default in by_file:
+                version = by_file[default]
+            elif manifest["versions"]:
+                version = max(manifest["versions"], key=lambda v: manifest["versions"][v]["mtime"])
+            else:
+                raise ValueError(f"No model files in {folder}")
+        self._active = self._load(version, manifest)
+        self._set_active(version)
+
+    def current(self):
+        return self._active
+
+    def versions(self):
+        manifest = read_manifest(self.folder)
+        manifest["serving"] = self._active.version
+        return manifest
+
+    def resolve(self, name: str):
+        """ version of a full sha256, a unique prefix of one, or a model file name. """
+        versions = read_manifest(self.folder)["versions"]
+        matches = [v for v, entry in versions.items() if v.startswith(name) or entry["file"] == name]
+        if len(matches) != 1:
+            raise ValueError(f"{name} matches {len(matches)} model versions")
+        return matches[0]
+
+    def preload(self, version: str):
+        """ loads a version on the background thread, returns its future (shared by repeated calls). """
+        with self._lock:
+            future = self._loading.get(version)
+            if future is None:
+                future = self._loading[version] = self._pool.submit(self._load, version)
+        return future
+
+    def activate(self, version: str, wait: bool = True):
+        """
+            makes version the active one in the manifest and swaps it in once it is loaded.
+            with wait a failed load raises, without it the swap happens on the loading thread.
+            either way a version that fails to load is rolled back in the manifest.
+        """
+        version = self.resolve(version)
+        self._set_active(version)
+        future = self.preload(version)
+        if wait:
+            self._swap(version, future, raise_errors=True)
+        else:
+            future.add_done_callback(lambda f: self._swap(version, f))
+        return future
+
+    def poll(self, wait: bool = False):
+        """ picks up new model files and an active version changed in the manifest by another process. """
+        scan_folder(self.folder)
+        mtime = os.path.getmtime(manifest_path(self.folder))
+        if mtime == self._manifest_mtime:
+            return
+        self._manifest_mtime = mtime
+        active = read_manifest(self.folder)["active"]
+        if active is not None and active != self._active.version:
+            print(f"[INFO] Model version {active[:12]} activated in the manifest, loading it")
+            self.activate(active, wait=wait)
+
+    def start_watching(self):
+        """ polls every poll_interval seconds on a daemon thread. """
+        if self._watcher is not None:
+            return
+        stop = threading.Event()
+
+        def watch():
+            while not stop.wait(self.poll_interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"[WARN] Model registry poll failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, daemon=True)
+        self._watcher.start()
+
+    def _load(self, version: str, manifest: dict = None):
+        manifest = manifest or read_manifest(self.folder)
+        path = os.path.join(self.folder, manifest["versions"][version]["file"])
+        model = load_model(path)
+        if self.validate is not None:
+            self.validate(model)
+        if file_sha256(path) != version:
+            raise ValueError(f"{path} changed after it was registered as {version[:12]}")
+        return ServedModel(version, path, model)
+
+    def _swap(self, version: str, future, raise_errors: bool = False):
+        try:
+            served = future.result()
+        except Exception as e:
+            print(f"[ERROR] Model version {version[:12]} failed to load, still serving "
+                  f"{self._active.version[:12]}: {e}")
+            self._set_active(self._active.version)
+            if raise_errors:
+                raise
+            return
+        finally:
+            with self._lock:
+                self._loading.pop(version, None)
+        # the latest activation wins when several loads finish out of order
+        if read_manifest(self.folder)["active"] == version:
+            self._active = served
+            print(f"[INFO] Now serving model version {version[:12]} ({os.path.basename(served.path)})")
+
+    def _set_active(self, version: str):
+        with self._lock, _manifest_lock(self.folder):
+            manifest = read_manifest(self.folder)
+            if manifest["active"] != version:
+                manifest["active"] = version
+                _write_manifest(self.folder, manifest)
+            self._manifest_mtime = os.path.getmtime(manifest_path(self.folder))
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from script.model_data_fetch import FEATURE_COLUMNS
+
+# tickers computed together, bounds the (bars x tickers) work arrays
+CHUNK_SIZE = 256
+
+RETURN_WINDOWS = (1, 7, 30, 180, 365)
+SMA_WINDOWS = (5, 10, 20, 50, 100, 200)
+
+
+def _shift(a, k):
+    # a[i - k] along the bar axis, nan before the first bar of each ticker
+    out = np.full_like(a, np.nan)
+    out[k:] = a[:-k]
+    return out
+
+
+def _pct_change(a, k):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return a / _shift(a, k) - 1
+
+
+def _ema(a, alpha, min_periods):
+    # pandas ewm(adjust=False) recursion, one vectorized step per bar across all tickers
+    out = np.empty_like(a)
+    out[0] = a[0]
+    for i in range(1, len(a)):
+        out[i] = (1 - alpha) * out[i - 1] + alpha * a[i]
+    out[:min_periods - 1] = np.nan
+    return out
+
+
+def _rolling_mean(a, window):
+    # cumulative sums along the bar axis, nan until window bars are in
+    out = np.full_like(a, np.nan)
+    if len(a) < window:
+        return out
+    sums = np.cumsum(a, axis=0)
+    out[window - 1] = sums[window - 1]
+    out[window:] = sums[window:] - sums[:-window]
+    return out / window
+
+
+def _windows(a, window):
+    # (bars - window + 1, tickers, window) view, any nan in a window gives nan like min_periods=window
+    return sliding_window_view(a, window, axis=0)
+
+
+def _rolling(a, window, fn):
+    out = np.full_like(a, np.nan)
+    if len(a) >= window:
+        out[window - 1:] = fn(_windows(a, window))
+    return out
+
+
+def _window_moments(a, window):
+    """
+        central moments m2, m3, m4 of the trailing window at every bar (nan until window bars are
+        in). built from window lagged 2d slices, contiguous arrays are much faster than reducing a
+        strided sliding_window_view.
+    """
+    n = len(a)
+    m2, m3, m4 = (np.full_like(a, np.nan) for _ in range(3))
+    if n < window:
+        return m2, m3, m4
+    lags = [a[window - 1 - k:n - k] for k in range(window)]
+    mean = sum(lags) / window
+    s2 = s3 = s4 = 0.0
+    for lag in lags:
+        d = lag - mean
+        d2 = d * d
+        s2, s3, s4 = s2 + d2, s3 + d2 * d, s4 + d2 * d2
+    m2[window - 1:], m3[window - 1:], m4[window - 1:] = s2 / window, s3 / window, s4 / window
+    return m2, m3, m4
+
+
+def _std(m2, n):
+    return np.sqrt(m2 * n / (n - 1))
+
+
+def _skew(m2, m3, n):
+    # bias corrected sample skewness, same as pandas rolling().skew()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        skew = np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5
+    return np.where(m2 <= 1e-14, np.nan, skew)
+
+
+def _kurt(m2, m4, n):
+    # bias corrected excess kurtosis, same as pandas rolling().kurt()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g2 = m4 / (m2 * m2) - 3
+    return np.where(m2 <= 1e-14, np.nan, ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)))
+
+
+def wide_features(high, low, close, volume):
+    """ every numeric feature on (bars x tickers) arrays, columns are tickers aligned on their first bar. """
+    f = {}
+    for k in RETURN_WINDOWS:
+        f[f"return_{k}d" if k > 1 else "return_1d"] = _pct_change(close, k)
+
+    # rsi (ta): wilder emas of the gains and losses, first diff counts as no move
+    diff = close - _shift(close, 1)
+    diff[0] = 0.0
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    ema_up, ema_down = _ema(up, 1 / 14, 14), _ema(down, 1 / 14, 14)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f["rsi"] = np.where(ema_down == 0, 100.0, 100 - (100 / (1 + ema_up / ema_down)))
+    f["rsi"][np.isnan(ema_down)] = np.nan
+
+    f["macd"] = _ema(close, 2 / 13, 12) - _ema(close, 2 / 27, 26)
+
+    lowest = _rolling(low, 14, lambda w: w.min(axis=-1))
+    highest = _rolling(high, 14, lambda w: w.max(axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f["stoch"] = 100 * (close - lowest) / (highest - lowest)
+        f["williams_r"] = -100 * (highest - close) / (highest - lowest)
+        old = _shift(close, 12)
+        f["roc"] = (close - old) / old * 100
+
+    f["realized_vol_5"] = _std(_window_moments(f["return_1d"], 5)[0], 5)
+    m2, m3, m4 = _window_moments(close, 5)
+    f["rolling_std_5"] = _std(m2, 5)
+    f["rolling_skew_5"] = _skew(m2, m3, 5)
+    f["rolling_kurt_5"] = _kurt(m2, m4, 5)
+    for window in SMA_WINDOWS:
+        f[f"sma{window}"] = _rolling_mean(close, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f["vwap"] = np.cumsum(volume * (high + low + close) / 3, axis=0) / np.cumsum(volume, axis=0)
+        f["volume_change"] = volume / _shift(volume, 1) - 1
+    f["Volume"] = volume
+
+    # next bar up, the last bar of a ticker compares against the padding and gets 0 like add_features
+    following = np.full_like(close, np.nan)
+    following[:-1] = close[1:]
+    with np.errstate(invalid="ignore"):
+        f["target"] = following > close
+    return f
+
+
+def panel_features(panel: pd.DataFrame, sectors: dict, chunk_size: int = CHUNK_SIZE):
+    """
+        add_features over a whole universe at once. panel is a long OHLCV table with a ticker
+        column and a Date column (or index), sectors is {ticker: sector}.
+
+        each chunk of tickers is laid out as a (bars x tickers) array with every ticker starting at
+        row 0, so every window and shift stays inside its own ticker and all tickers advance in the
+        same numpy pass. returns (X, y) with the rows add_features would keep, ordered by ticker
+        then date and indexed by Date; sector, day_of_week and ticker are category columns.
+        bars are assumed complete (no missing closes), as yfinance returns daily history.
+    """
+    panel = panel.reset_index() if "Date" not in panel.columns else panel
+    panel = panel.sort_values(["ticker", "Date"], kind="stable")
+    tickers = panel["ticker"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1]])
+    ends = np.r_[starts[1:], len(panel)]
+    required = [c for c in ("Open", "High", "Low", "Close", "Volume") if c in panel.columns]
+    raw = {c: panel[c].to_numpy(dtype=np.float64) for c in required}
+    dates = pd.DatetimeIndex(panel["Date"])
+
+    X_parts, y_parts = [], []
+    for first in range(0, len(starts), chunk_size):
+        group_starts, group_ends = starts[first:first + chunk_size], ends[first:first + chunk_size]
+        lengths = group_ends - group_starts
+        code = np.repeat(np.arange(len(lengths)), lengths)
+        rows = np.concatenate([np.arange(s, e) for s, e in zip(group_starts, group_ends)])
+        pos = rows - np.repeat(group_starts, lengths)
+
+        wide = {}
+        for column, values in raw.items():
+            wide[column] = np.full((lengths.max(), len(lengths)), np.nan)
+            wide[column][pos, code] = values[rows]
+        f = wide_features(wide["High"], wide["Low"], wide["Close"], wide["Volume"])
+
+        # add_features drops a row when any column (ohlcv included) is nan
+        valid = np.ones(len(rows), dtype=bool)
+        for values in list(f.values()) + list(wide.values()):
+            valid &= ~np.isnan(values[pos, code])
+        keep_pos, keep_code, keep_rows = pos[valid], code[valid], rows[valid]
+
+        X = pd.DataFrame({
+            name: f[name][keep_pos, keep_code] for name in FEATURE_COLUMNS if name in f
+        })
+        names = tickers[group_starts]
+        X["ticker"] = names[keep_code]
+        X["sector"] = np.array([sectors.get(t, "Unknown") for t in names], dtype=object)[keep_code]
+        X["day_of_week"] = dates[keep_rows].day_name()
+        X.index = dates[keep_rows].rename("Date")
+        X_parts.append(X[FEATURE_COLUMNS])
+        y_parts.append(pd.Series(f["target"][keep_pos, keep_code].astype(int), index=X.index, name="target"))
+
+    X = pd.concat(X_parts, axis=0)
+    for column in ("sector", "day_of_week", "ticker"):
+        X[column] = X[column].astype("category")
+    return X, pd.concat(y_parts, axis=0)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from script.bar_store import BarStore
+from script.model_registry import ModelRegistry
+from script.garch_registry import GarchSpecRegistry
+from script.model_data_fetch import fetch_scheduler, ticker_metadata
+from script.prediction import predict_batch
+from script.precompute_store import PrecomputeStore, PRECOMPUTE_PATH
+from script.tickers import get_ticker_nse
+
+MODEL_FOLDER = "model"
+# used when the model folder has no manifest yet, same default as api_app
+MODEL_FILE_NAME = "stock_prediction26-09-2025_21-59-07.pkl"
+
+BAR_STORE_FOLDER = os.path.join("data", "bars")
+GARCH_REGISTRY_PATH = os.path.join("data", "garch_specs.json")
+
+# tickers per predict_batch call, bounds memory and lets a crash lose at most one chunk
+CHUNK_SIZE = 100
+
+
+def run_precompute(model, model_version: str, tickers: list, store: PrecomputeStore, bar_store=None,
+                   garch_options=None, run_date: str = None, chunk_size: int = CHUNK_SIZE):
+    """
+        predicts every ticker once (threshold 0.5, the stored probability serves any threshold)
+        and writes the responses with the last close into store under (run_date, model_version).
+        tickers already stored for that run are skipped, so an interrupted run can be restarted.
+    """
+    run_date = run_date or date.today().isoformat()
+    done = store.done_tickers(run_date, model_version)
+    todo = [t for t in dict.fromkeys(tickers) if t not in done]
+    print(f"[INFO] Precompute {run_date}: {len(todo)} tickers to run, {len(done)} already stored")
+
+    for start in range(0, len(todo), chunk_size):
+        chunk = todo[start:start + chunk_size]
+        replies = predict_batch(model, chunk, 0.5, store=bar_store, garch_options=garch_options)
+        rows = {}
+        for ticker, reply in replies.items():
+            last_close = None
+            if "Error" not in reply and bar_store is not None:
+                # the bars were just stored by predict_batch, this is a disk read
+                last_close = float(bar_store.history(ticker, interval="1d", period="5d")["Close"].iloc[-1])
+            rows[ticker] = (reply, last_close)
+        store.put_many(run_date, model_version, rows)
+        print(f"[INFO] {min(start + chunk_size, len(todo))}/{len(todo)} tickers precomputed")
+    return run_date
+
+
+def _seconds_until(at: str):
+    now = datetime.now()
+    hour, minute = (int(v) for v in at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def main(daily_at: str = None):
+    """
+        runs the pre-market job over the whole NSE list, once or every day at daily_at ("HH:MM").
+        uses the same bar store and garch registry files as api_app so both stay warm, and the
+        model version active in the model manifest at the start of each run.
+    """
+    model_registry = ModelRegistry(MODEL_FOLDER, default=MODEL_FILE_NAME)
+    store = PrecomputeStore(PRECOMPUTE_PATH)
+    bar_store = BarStore(BAR_STORE_FOLDER, provider=fetch_scheduler)
+    garch_options = {
+        "n_jobs": os.cpu_count() or 1,
+        "fit_timeout": 30,
+        "registry": GarchSpecRegistry(GARCH_REGISTRY_PATH, reselect_days=7),
+    }
+    while True:
+        if daily_at is not None:
+            time.sleep(_seconds_until(daily_at))
+        tickers = get_ticker_nse()
+        # the scheduled bulk refresh of the metadata index, only new or old entries are fetched
+        ticker_metadata.refresh_stale(tickers)
+        model_registry.poll(wait=True)
+        served = model_registry.current()
+        run_precompute(served.model, served.version, tickers, store, bar_store=bar_store, garch_options=garch_options)
+        if daily_at is None:
+            break
+
+
+if __name__ == "__main__":
+    # python -m script.precompute [HH:MM]
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PRECOMPUTE_PATH = os.path.join("data", "precomputed.sqlite")
+
+
+class PrecomputeStore:
+    """
+        sqlite table of pre-market predictions, one row per (run_date, model_version, ticker).
+        each row keeps the full /predict response (threshold 0.5) plus the columns the trade
+        calculator needs, so the morning scan is an indexed lookup instead of a model run.
+        tickers that failed are stored too with their error, a rerun of the job retries them.
+    """
+
+    def __init__(self, path: str = PRECOMPUTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS precomputed (
+                    run_date TEXT, model_version TEXT, ticker TEXT,
+                    direction TEXT, probability REAL, predicted_change REAL, predicted_variance REAL,
+                    qlike REAL, aic REAL, last_date TEXT, last_close REAL, reply TEXT, error TEXT,
+                    created REAL,
+                    PRIMARY KEY (run_date, model_version, ticker))"""
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put_many(self, run_date: str, model_version: str, rows: dict):
+        """ rows is {ticker: (reply, last_close)}, a reply holding "Error" is stored as a failure. """
+        created = time.time()
+        records = []
+        for ticker, (reply, last_close) in rows.items():
+            if "Error" in reply:
+                records.append((run_date, model_version, ticker, None, None, None, None, None, None, None, None,
+                                None, reply["Error"], created))
+                continue
+            direction = reply.get("Direction Prediction", {})
+            volatility = reply.get("Volatility Prediction")
+            # volatility_predict answers with a message instead of a dict when the fit failed
+            volatility = volatility if isinstance(volatility, dict) else {}
+            prediction = volatility.get("Prediction", {})
+            description = volatility.get("Model Description", {})
+            records.append((
+                run_date, model_version, ticker, direction.get("Direction"), direction.get("Probability"),
+                prediction.get("Predicted Change/Volume"), prediction.get("Predicted Variance"),
+                description.get("QLIKE Score"), description.get("Model AIC"), reply.get("Last Date"),
+                last_close, json.dumps(reply), None, created,
+            ))
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO precomputed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             records)
+
+    def latest_run(self, run_date: str = None, model_version: str = None):
+        """ (run_date, model_version) of the newest run matching the filters, None when there is none. """
+        query, args = "SELECT run_date, model_version FROM precomputed WHERE 1 = 1", []
+        if run_date is not None:
+            query, args = query + " AND run_date = ?", args + [run_date]
+        if model_version is not None:
+            query, args = query + " AND model_version = ?", args + [model_version]
+        with self._connect() as conn:
+            row = conn.execute(query + " ORDER BY run_date DESC, created DESC LIMIT 1", args).fetchone()
+        return None if row is None else tuple(row)
+
+    def get_many(self, tickers: list, run_date: str, model_version: str):
+        """ {ticker: {"reply": ..., "last_close": ..., "error": ...}} for the tickers found in the run. """
+        found = {}
+        tickers = list(dict.fromkeys(tickers))
+        with self._connect() as conn:
+            # sqlite caps the number of bound parameters, look up in slices
+            for i in range(0, len(tickers), 500):
+                part = tickers[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT ticker, reply, last_close, error FROM precomputed "
+                    f"WHERE run_date = ? AND model_version = ? AND ticker IN ({', '.join('?' * len(part))})",
+                    [run_date, model_version] + part,
+                ).fetchall()
+                for ticker, reply, last_close, error in rows:
+                    found[ticker] = {
+                        "reply": None if reply is None else json.loads(reply),
+                        "last_close": last_close,
+                        "error": error,
+                    }
+        return found
+
+    def done_tickers(self, run_date: str, model_version: str):
+        """ tickers stored without error for the run. """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT ticker FROM precomputed WHERE run_date = ? AND model_version = ? "
+                                "AND error IS NULL",
+                                (run_date, model_version)).fetchall()
+        return {row[0] for row in rows}
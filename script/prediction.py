@@ -0,0 +1,237 @@
+import math
+import threading
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from script.model_data_fetch import safe_fetch, ticker_sector
+from script.feature_engine import StreamingFeatureEngine
+from script.lean_model import predict_with_threshold, load_model
+from script.train_volatility_prediction import volatility_predict, VolatilityForecaster
+from script.metrics import span, collect_spans, in_trace
+
+_forecaster_lock = threading.Lock()
+_engine_lock = threading.Lock()
+
+# model loaded once per process pool worker by init_worker (reloaded when a request names another file)
+_worker_model = None
+_worker_model_path = None
+
+
+def make_json_serializable(obj):
+    """
+    Recursively convert objects into JSON-serializable formats.
+    Also converts NaN and infinite values to None.
+    """
+    if isinstance(obj, dict):
+        return {str(k): make_json_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [make_json_serializable(v) for v in obj]
+    elif hasattr(obj, "item"):
+        try:
+            value = obj.item()
+            if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+                return None
+            return value
+        except Exception:
+            return str(obj)
+    elif isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+        return str(obj)
+    elif isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    elif isinstance(obj, np.generic):
+        value = obj.item()
+        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+            return None
+        return value
+    else:
+        return obj
+
+
+def fetch_latest(ticker: str, store=None, engines=None, panel=None):
+    """
+        fetches 5y of daily bars with features and returns (df, last feature row).
+        with engines ({ticker: StreamingFeatureEngine}) only the new bars go through the feature
+        code, the first call for a ticker warms its engine up on the whole history.
+        a script.shared_panel.SharedPanel holding the ticker answers first, bars and features
+        are then read from the mapped panel file without fetching or computing anything.
+        raises ValueError when nothing usable came back for the ticker.
+    """
+    if panel is not None:
+        with span("fetch"):
+            latest = panel.latest(ticker)
+        if latest is not None:
+            return latest
+
+    if engines is None:
+        result = safe_fetch(ticker, interval="1d", period="5y", feature_cal=True, store=store)
+        if result is None or result[0] is None or result[1] is None or result[1].empty:
+            raise ValueError(f"No data for {ticker}")
+        df, X, _ = result
+        return df, X.tail(1)  # getting on which prediction is to be made
+
+    result = safe_fetch(ticker, interval="1d", period="5y", feature_cal=False, store=store)
+    if result is None or result[0] is None:
+        raise ValueError(f"No data for {ticker}")
+    df = result[0]
+    with span("info"):
+        sector = ticker_sector(ticker)
+    with _engine_lock, span("features"):
+        engine = engines.get(ticker)
+        # also rebuilt once the sector of a new ticker has been filled in the index
+        if engine is None or not engine.is_consistent(df) or engine.sector != sector:
+            engine = StreamingFeatureEngine(ticker, sector)
+            engines[ticker] = engine
+        features = engine.update_frame(df)
+        first_valid = engine.first_valid
+    if features is None:
+        raise ValueError(f"Not enough history for {ticker}")
+    # same rows the garch model saw on the full recompute path
+    return df.loc[first_valid:], features
+
+
+def build_response(last_date, direction_pred, direction_proba, garch_reply):
+    """
+        shapes one ticker's output in the /predict response format.
+    """
+    direction = "Up" if direction_pred == 1 else "Down"
+    with span("serialization"):
+        return {
+            "Last Date": str(last_date),
+            "Direction Prediction": {
+                "Direction": direction,
+                "Probability": float(direction_proba),
+            },
+            # Make sure garch_reply is fully serializable
+            "Volatility Prediction": make_json_serializable(garch_reply),
+        }
+
+
+def predict_ticker(model, ticker: str, threshold: float, store=None, garch_options=None, engines=None,
+                   panel=None):
+    """
+        full single ticker prediction: fetch, features, classifier and garch volatility.
+        garch_options are passed on to volatility_predict (n_jobs, fit_timeout, prune, registry),
+        engines turns on incremental features and panel reads from the shared panel (see fetch_latest).
+    """
+    df, features = fetch_latest(ticker, store=store, engines=engines, panel=panel)
+
+    with span("classifier"):
+        direction_pred, direction_proba = predict_with_threshold(
+            model, features, threshold # trigger model for direction prediction
+        )
+
+    # garch model prediton for the volatility
+    with span("garch"):
+        garch_reply = volatility_predict(df, ticker=ticker, **(garch_options or {}))
+
+    return build_response(df.index[-1], direction_pred[0], direction_proba[0], garch_reply)
+
+
+def init_worker(model_path: str):
+    """ process pool initializer, loads the model once per worker (the lean artifact when there is one). """
+    global _worker_model, _worker_model_path
+    _worker_model, _worker_model_path = load_model(model_path), model_path
+
+
+def predict_in_worker(ticker: str, features: pd.DataFrame, closes: pd.DataFrame, threshold: float,
+                      garch_options=None, model_path: str = None):
+    """
+        cpu part of predict_ticker (classifier and garch) for a process pool started with init_worker.
+        closes is the Close column of the bars fetch_latest returned. a registry in garch_options
+        should be a GarchSpecRegistry.snapshot(), the updated snapshot comes back with the response.
+        model_path is the model the request started with, the worker switches to it if it differs.
+        returns (response, registry, stage spans), the spans go to metrics.record_spans.
+    """
+    with collect_spans() as trace:
+        if model_path is not None and model_path != _worker_model_path:
+            init_worker(model_path)
+        with span("classifier"):
+            direction_pred, direction_proba = predict_with_threshold(_worker_model, features, threshold)
+        with span("garch"):
+            garch_reply = volatility_predict(closes, ticker=ticker, **(garch_options or {}))
+        reply = build_response(closes.index[-1], direction_pred[0], direction_proba[0], garch_reply)
+    registry = (garch_options or {}).get("registry")
+    return reply, registry, trace.spans
+
+
+def predict_batch(model, tickers: list, threshold: float, store=None, garch_options=None, engines=None,
+                  max_workers: int = 20, panel=None):
+    """
+        predicts many tickers with a single classifier call over all their latest rows.
+        returns {ticker: response} where failed tickers get {"Error": message} instead.
+    """
+    def fetch(ticker):
+        try:
+            return fetch_latest(ticker, store=store, engines=engines, panel=panel)
+        except Exception as e:
+            return e
+
+    tickers = list(dict.fromkeys(tickers))  # drop duplicates but keep order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = dict(zip(tickers, executor.map(in_trace(fetch), tickers)))
+
+    replies = {t: {"Error": str(r)} for t, r in fetched.items() if isinstance(r, Exception)}
+    ok = [t for t in tickers if t not in replies]
+    if not ok:
+        return replies
+
+    # one feature matrix, one predict_proba call for the whole batch
+    features = pd.concat([fetched[t][1] for t in ok], axis=0)
+    try:
+        with span("classifier"):
+            direction_pred, direction_proba = predict_with_threshold(model, features, threshold)
+    except Exception as e:
+        replies.update({t: {"Error": str(e)} for t in ok})
+        return {t: replies[t] for t in tickers}
+
+    def volatility(ticker):
+        try:
+            with span("garch"):
+                return volatility_predict(fetched[ticker][0], ticker=ticker, **(garch_options or {}))
+        except Exception as e:
+            return e
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        garch_replies = list(executor.map(in_trace(volatility), ok))
+
+    for i, ticker in enumerate(ok):
+        if isinstance(garch_replies[i], Exception):
+            replies[ticker] = {"Error": str(garch_replies[i])}
+            continue
+        df = fetched[ticker][0]
+        replies[ticker] = build_response(df.index[-1], direction_pred[i], direction_proba[i], garch_replies[i])
+    return {t: replies[t] for t in tickers}
+
+
+def forecast_volatility(forecasters: dict, ticker: str, store=None, refit: bool = False, garch_options=None):
+    """
+        next day volatility from a kept VolatilityForecaster (forecasters is {ticker: forecaster}).
+        only the returns from the forecaster's last date on are fed in (the last one again when that
+        bar was still forming, it is re-applied), a fit happens on the first call for a ticker or
+        when refit is asked for.
+    """
+    result = safe_fetch(ticker, interval="1d", period="5y", feature_cal=False, store=store)
+    if result is None or result[0] is None:
+        raise ValueError(f"No data for {ticker}")
+    df = result[0]
+
+    with _forecaster_lock:
+        forecaster = forecasters.get(ticker)
+    if refit or forecaster is None:
+        with span("garch"):
+            forecaster = VolatilityForecaster.fit(df, ticker=ticker, **(garch_options or {}))
+        if forecaster is None:
+            raise ValueError("failed to build model.")
+    else:
+        returns = 100 * df['Close'].pct_change().dropna()
+        with _forecaster_lock:
+            forecaster.update_many(returns[returns.index >= forecaster.last_date])
+    with _forecaster_lock:
+        forecasters[ticker] = forecaster
+
+    return {
+        "Last Date": str(forecaster.last_date),
+        "Volatility Prediction": make_json_serializable(forecaster.predict()),
+    }
@@ -0,0 +1,121 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_sha256(path: str):
+    """ hex sha256 of a file, used to tie cached predictions to the model that made them. """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def with_threshold(reply: dict, threshold: float):
+    """
+        copy of a cached /predict response with the direction recomputed for threshold, the
+        probability does not depend on it so one entry can serve a whole threshold bucket.
+    """
+    reply = copy.deepcopy(reply)
+    direction = reply.get("Direction Prediction")
+    if direction and direction.get("Probability") is not None:
+        direction["Direction"] = "Up" if direction["Probability"] >= threshold else "Down"
+    return reply
+
+
+class PredictionCache:
+    """
+        LRU + TTL cache of prediction responses keyed by
+        (ticker, last bar timestamp, model file hash, threshold bucket, sector).
+
+        the in-memory tier holds up to maxsize entries. with disk_path an sqlite file keeps
+        every entry too so a restarted server starts warm. entries older than ttl seconds
+        are dropped from both tiers. hit/miss counters are exposed by stats().
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 6 * 3600, disk_path: str = None,
+                 threshold_bucket: float = 0.01):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.threshold_bucket = threshold_bucket
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_path is not None:
+            folder = os.path.dirname(disk_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=30)
+
+    def make_key(self, ticker: str, last_bar, model_hash: str, threshold: float, sector: str = None):
+        # the sector is a model feature, a reply built while it was still "Unknown" must not be
+        # served once the metadata index knows it
+        bucket = round(round(threshold / self.threshold_bucket) * self.threshold_bucket, 6)
+        return f"{ticker}|{last_bar}|{model_hash}|{bucket}|{sector}"
+
+    def get(self, key: str):
+        """ cached value or None, a disk hit is promoted back to memory. """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["memory_hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.disk_path is not None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, created FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, value, row[1])
+                    self._counters["hits"] += 1
+                    self._counters["disk_hits"] += 1
+                return value
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: dict):
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+        if self.disk_path is not None:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO predictions (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), created),
+                )
+                conn.execute("DELETE FROM predictions WHERE created < ?", (created - self.ttl,))
+
+    def _remember(self, key: str, value: dict, created: float):
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, size=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,239 @@
+import json
+import os
+import random
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+
+def period_to_offset(period: str):
+    """
+        converts a yfinance style period ("5d", "1mo", "5y", "ytd", "max") into a pandas offset.
+        returns None for "max" which means keep everything.
+    """
+    period = period.lower()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return "ytd"
+    for suffix, unit in (("mo", "months"), ("y", "years"), ("d", "days"), ("wk", "weeks")):
+        if period.endswith(suffix):
+            return pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unknown period: {period}")
+
+
+def period_start(anchor, period: str):
+    """
+        returns the first timestamp covered by period counted back from anchor, None for "max".
+    """
+    offset = period_to_offset(period)
+    if offset is None:
+        return None
+    if offset == "ytd":
+        return anchor.normalize().replace(month=1, day=1)
+    return anchor - offset
+
+
+def slice_period(df: pd.DataFrame, period: str, anchor=None):
+    """
+        keeps only the rows of df that fall inside period counted back from anchor (default last bar).
+    """
+    if df.empty or period is None:
+        return df
+    cutoff = period_start(df.index[-1] if anchor is None else anchor, period)
+    if cutoff is None:
+        return df
+    return df[df.index > cutoff]
+
+
+def _localize(ts, tz):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(tz) if ts.tzinfo is None else ts.tz_convert(tz)
+
+
+class YahooProvider:
+    """
+        default data source, pulls bars and ticker info from yahoo finance through yfinance.
+    """
+
+    def history(self, ticker: str, interval: str, period: str = None, start=None, end=None):
+        t = yf.Ticker(ticker)
+        if start is not None:
+            return t.history(interval=interval, start=start, end=end)
+        return t.history(interval=interval, period=period)
+
+    def info(self, ticker: str):
+        return yf.Ticker(ticker).info
+
+
+class FixtureProvider:
+    """
+        offline data source that serves bars from local csv files named "<ticker>_<interval>.csv"
+        and ticker info from an optional "info.json" ({ticker: {...}}) in the same folder.
+        period is counted back from the last bar of the fixture so results do not depend on today.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def history(self, ticker: str, interval: str, period: str = None, start=None, end=None):
+        path = os.path.join(self.folder, f"{ticker}_{interval}.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True).tz_convert("Asia/Kolkata")
+        if start is not None:
+            df = df[df.index >= _localize(start, df.index.tz)]
+            if end is not None:
+                df = df[df.index < _localize(end, df.index.tz)]
+            return df
+        return slice_period(df, period or "max")
+
+    def info(self, ticker: str):
+        path = os.path.join(self.folder, "info.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f).get(ticker, {})
+
+
+class FakeProvider:
+    """
+        wraps another provider (usually a FixtureProvider) and injects latency and random failures,
+        used to exercise the fetch scheduler offline. calls counts the requests that reached it.
+    """
+
+    def __init__(self, provider, latency: float = 0.05, failure_rate: float = 0.0, seed: int = 0):
+        self.provider = provider
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+        time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("injected failure")
+
+    def history(self, ticker: str, interval: str, period: str = None, start=None, end=None):
+        self._request()
+        return self.provider.history(ticker, interval=interval, period=period, start=start, end=end)
+
+    def info(self, ticker: str):
+        self._request()
+        return self.provider.info(ticker)
+
+
+def synthetic_minute_bars(seed: int, price: float = 100.0, n_bars: int = 375, date: str = "2025-09-26"):
+    """ deterministic random walk of 1-minute bars for one NSE session (09:15 onwards). """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(f"{date} 09:15", periods=n_bars, freq="1min", tz="Asia/Kolkata")
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.0008, n_bars)))
+    return pd.DataFrame({
+        "Open": close, "High": close * 1.0005, "Low": close * 0.9995, "Close": close,
+        "Volume": rng.integers(1_000, 50_000, n_bars),
+    }, index=index)
+
+
+def synthetic_daily_bars(seed: int, price: float = 500.0, n_bars: int = 1250, end: str = "2025-09-26"):
+    """ deterministic random walk of daily OHLCV bars (business days) ending at end. """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end, periods=n_bars, tz="Asia/Kolkata", name="Date")
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.015, n_bars)))
+    spread = np.abs(rng.normal(0, 0.01, n_bars))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, n_bars)), "High": close * (1 + spread),
+        "Low": close * (1 - spread), "Close": close, "Volume": rng.integers(10_000, 5_000_000, n_bars),
+    }, index=index)
+
+
+# minute sessions served for a period request, like yahoo's 30 days of 1 minute bars
+MINUTE_SESSIONS = 22
+
+
+class SyntheticProvider:
+    """
+        offline data source that makes up deterministic bars and info for any ticker: n_bars daily
+        bars ending at end ("1d") or one minute sessions on the business days up to end ("1m", the
+        last MINUTE_SESSIONS of them unless start is given), seeded by the ticker name (and the
+        session date) so every run and every commit sees the same market. frames are generated once
+        per ticker (and session) and handed out as copies (add_features writes into the frame it gets).
+        usable as a provider (BarStore, FetchScheduler, TickerMetadataIndex) or directly as the
+        store argument of safe_fetch / model_data.
+    """
+
+    def __init__(self, n_bars: int = 1250, end: str = "2025-09-26", seed: int = 0,
+                 sectors=("Technology", "Financial Services", "Energy", "Healthcare")):
+        self.n_bars = n_bars
+        self.end = end
+        self.seed = seed
+        self.sectors = sectors
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, ticker: str):
+        return self.seed + zlib.crc32(ticker.encode())
+
+    def _generate(self, ticker: str, interval: str, day: pd.Timestamp = None):
+        seed = self._seed(ticker)
+        price = np.random.default_rng(seed).uniform(50, 2000)
+        if interval == "1d":
+            return synthetic_daily_bars(seed, price=price, n_bars=self.n_bars, end=self.end)
+        if interval == "1m":
+            # the end date keeps the ticker's own seed, earlier sessions are offset by their distance
+            offset = (pd.Timestamp(self.end) - day).days
+            return synthetic_minute_bars(seed + offset, price=price, date=day.strftime("%Y-%m-%d"))
+        raise ValueError(f"SyntheticProvider has no {interval} bars")
+
+    def _cached(self, ticker: str, interval: str, day: pd.Timestamp = None):
+        with self._lock:
+            df = self._bars.get((ticker, interval, day))
+            if df is None:
+                df = self._bars[(ticker, interval, day)] = self._generate(ticker, interval, day)
+        return df
+
+    def _minute_sessions(self, ticker: str, period: str = None, start=None, end=None):
+        last = pd.Timestamp(self.end)
+        if start is not None:
+            days = pd.bdate_range(pd.Timestamp(start).tz_localize(None).normalize(), last)
+            if end is not None:
+                days = days[days < pd.Timestamp(end).tz_localize(None)]
+        else:
+            days = pd.bdate_range(end=last, periods=MINUTE_SESSIONS)
+            cutoff = period_start(last, period or "max")
+            if cutoff is not None:
+                days = days[days > cutoff]
+        if len(days) == 0:
+            return pd.DataFrame()
+        return pd.concat([self._cached(ticker, "1m", day) for day in days])
+
+    def history(self, ticker: str, interval: str, period: str = None, start=None, end=None):
+        if interval == "1m":
+            df = self._minute_sessions(ticker, period, start, end)
+            if df.empty:
+                return df
+        else:
+            df = self._cached(ticker, interval)
+        if start is not None:
+            df = df[df.index >= _localize(start, df.index.tz)]
+            if end is not None:
+                df = df[df.index < _localize(end, df.index.tz)]
+            return df.copy()
+        return slice_period(df, period or "max").copy()
+
+    def info(self, ticker: str):
+        return {
+            "sector": self.sectors[self._seed(ticker) % len(self.sectors)],
+            "industry": "Synthetic",
+            "longName": ticker,
+            "exchange": "NSI",
+            "currency": "INR",
+            "quoteType": "EQUITY",
+        }
@@ -0,0 +1,112 @@
+import argparse
+import concurrent.futures
+import glob
+import os
+from datetime import datetime
+import pandas as pd
+from script.intraday_store import session_days
+from script.trade_performance import simulate_trades, intraday_store
+
+# file name the Trade Calculator tab gives its download, the time says which session a sheet is for
+TRADE_SHEET_FORMAT = "trades-%d-%m-%Y_%H-%M-%S.csv"
+
+# a sheet made before the open trades that day, a later one the next business day
+SESSION_OPEN = "09:15"
+
+REPLAY_FOLDER = os.path.join("data", "replay")
+
+
+def sheet_session(created: datetime):
+    """ session date ("YYYY-MM-DD") a trade sheet created at created is meant for. """
+    day = pd.Timestamp(created.date())
+    if created.strftime("%H:%M") >= SESSION_OPEN or day.dayofweek >= 5:
+        day = day + pd.offsets.BDay(1)
+    return day.strftime("%Y-%m-%d")
+
+
+def load_trade_sheets(folder: str, first: str = None, last: str = None):
+    """
+        {session date: trades} from the Trade Calculator csv files in folder, sheets for the same
+        session are concatenated. a "Session" column in a sheet overrides the date of its name,
+        files with another name need it. only sessions from first to last (inclusive) are kept.
+    """
+    sheets = {}
+    for path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        df = pd.read_csv(path)
+        if "Session" not in df.columns:
+            try:
+                created = datetime.strptime(os.path.basename(path), TRADE_SHEET_FORMAT)
+            except ValueError:
+                print(f"[WARN] {path} has no Session column and no trade sheet name, skipped")
+                continue
+            df["Session"] = sheet_session(created)
+        df["Session"] = pd.to_datetime(df["Session"]).dt.strftime("%Y-%m-%d")
+        for day, group in df.groupby("Session"):
+            sheets.setdefault(day, []).append(group)
+    return {
+        day: pd.concat(groups, ignore_index=True) for day, groups in sorted(sheets.items())
+        if (first is None or day >= first) and (last is None or day <= last)
+    }
+
+
+def replay(sheets: dict, store=None, executing_interval: int = 5, executing_interval_price: float = 0.2):
+    """
+        evaluates {session date: trades} against the 1 minute bars of each session. every
+        (ticker, session) not stored yet is fetched first, one request per ticker for all its
+        sessions, the simulation itself runs on the stored bars.
+        returns the trades with the simulate_trades columns added, one row per trade.
+    """
+    store = store or intraday_store
+    days = {}
+    for day, trades in sheets.items():
+        for ticker in trades["Ticker"].dropna().unique():
+            days.setdefault(ticker, set()).add(day)
+    print(f"[INFO] Replay of {len(sheets)} sessions, {len(days)} tickers")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=store.max_workers) as executor:
+        list(executor.map(lambda t: store.fill(t, sorted(days[t])), days))
+
+    results = []
+    for day, trades in sheets.items():
+        trades = trades.dropna(subset=["Ticker", "Type", "Current Price", "SL Price", "Target Price"])
+        trades = trades.reset_index(drop=True)
+        if trades.empty:
+            continue
+        bars = store.sessions(trades["Ticker"].unique(), day)  # all on disk by now
+        records = pd.DataFrame(simulate_trades(trades, executing_interval, executing_interval_price, bars=bars))
+        results.append(pd.concat([trades, records.drop(columns="ticker")], axis=1))
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def summary(results: pd.DataFrame):
+    """ per session: trades, how they ended (target / stop_loss / timeout / not executed) and pnl. """
+    if results.empty:
+        return pd.DataFrame()
+    table = pd.crosstab(results["Session"], results["result"])
+    table.insert(0, "trades", table.sum(axis=1))
+    table["pnl"] = pd.to_numeric(results["pnl"]).groupby(results["Session"]).sum()
+    table.loc["total"] = table.sum()
+    return table
+
+
+if __name__ == "__main__":
+    # python -m script.replay FOLDER [--from DATE] [--to DATE] [--out FOLDER]
+    parser = argparse.ArgumentParser(description="replay Trade Calculator sheets over past sessions")
+    parser.add_argument("folder", help="folder with the trade sheet csv files")
+    parser.add_argument("--from", dest="first", default=None, help="first session date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="last", default=None, help="last session date (YYYY-MM-DD)")
+    parser.add_argument("--executing-interval", type=int, default=5, help="minutes after the open to enter")
+    parser.add_argument("--executing-interval-price", type=float, default=0.2, help="allowed entry deviation in %%")
+    parser.add_argument("--out", default=REPLAY_FOLDER, help="folder for the result csv files")
+    args = parser.parse_args()
+
+    sheets = load_trade_sheets(args.folder, args.first, args.last)
+    if sheets:
+        print(f"[INFO] Sessions {min(sheets)} to {max(sheets)}, "
+              f"{len(set(session_days(min(sheets), max(sheets))) - set(sheets))} business days without a sheet")
+    results = replay(sheets, executing_interval=args.executing_interval,
+                     executing_interval_price=args.executing_interval_price)
+    table = summary(results)
+    os.makedirs(args.out, exist_ok=True)
+    results.to_csv(os.path.join(args.out, "trades.csv"), index=False)
+    table.to_csv(os.path.join(args.out, "summary.csv"))
+    print(table)
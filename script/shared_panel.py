@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import threading
+import time
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from script.model_data_fetch import FEATURE_COLUMNS, ticker_sector
+from script.panel_features import wide_features, CHUNK_SIZE
+
+PANEL_FOLDER = os.path.join("data", "panel")
+
+# float64 values kept per (ticker, bar): the ohlcv bar, then every numeric model feature
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+PANEL_FIELDS = OHLCV + [c for c in FEATURE_COLUMNS if c not in OHLCV + ["sector", "day_of_week", "ticker"]]
+
+# history the writer puts in the panel, the same period fetch_latest reads from the bar store
+PANEL_PERIOD = "5y"
+
+# seconds between two writes of the writer loop, the bar store's refresh interval
+WRITE_INTERVAL = 300
+
+# a panel not rewritten for this many seconds is ignored, readers go back to their own bar store
+MAX_AGE = 3 * WRITE_INTERVAL
+
+# array files kept on disk, a reader still mapping the previous one keeps reading it until it switches
+KEEP_GENERATIONS = 2
+
+
+def _manifest_path(folder: str, interval: str):
+    return os.path.join(folder, f"{interval}.json")
+
+
+def write_panel(frames: dict, folder: str = PANEL_FOLDER, interval: str = "1d", chunk_size: int = CHUNK_SIZE):
+    """
+        writes {ticker: OHLCV frame} as the next generation of the interval's panel and returns its
+        manifest. the array file "<interval>.<generation>.npy" is a (fields x tickers x bars) float64
+        array on the union of the tickers' dates, nan where a ticker has no bar. features are
+        computed per ticker from its own first bar (as add_features does), then put on the dates.
+        readers switch once "<interval>.json" names the new file, it is replaced after the array is
+        flushed so a reader never maps a half written generation.
+    """
+    os.makedirs(folder, exist_ok=True)
+    frames = {t: df for t, df in frames.items() if df is not None and not df.empty}
+    tickers = sorted(frames)
+    dates = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values())))) if frames \
+        else pd.DatetimeIndex([])
+
+    manifest_path = _manifest_path(folder, interval)
+    generation = 1
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            generation = json.load(f)["generation"] + 1
+    file_name = f"{interval}.{generation}.npy"
+    path = os.path.join(folder, file_name)
+
+    panel = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float64,
+                                      shape=(len(PANEL_FIELDS), len(tickers), len(dates)))
+    panel[:] = np.nan
+    last = []
+    for first in range(0, len(tickers), chunk_size):
+        names = tickers[first:first + chunk_size]
+        lengths = [len(frames[t]) for t in names]
+        wide = {c: np.full((max(lengths), len(names)), np.nan) for c in OHLCV}
+        position = np.full((max(lengths), len(names)), -1)
+        for j, ticker in enumerate(names):
+            df = frames[ticker]
+            for column in OHLCV:
+                wide[column][:len(df), j] = df[column].to_numpy(dtype=np.float64)
+            position[:len(df), j] = dates.get_indexer(df.index)
+            last.append(int(position[len(df) - 1, j]))
+        values = dict(wide, **wide_features(wide["High"], wide["Low"], wide["Close"], wide["Volume"]))
+        bar, code = np.nonzero(position >= 0)
+        for i, field in enumerate(PANEL_FIELDS):
+            panel[i, first + code, position[bar, code]] = values[field][bar, code]
+    panel.flush()
+    del panel
+    os.replace(path + ".tmp", path)
+
+    manifest = {
+        "generation": generation,
+        "file": file_name,
+        "fields": PANEL_FIELDS,
+        "tickers": tickers,
+        "dates": [str(d) for d in dates],
+        "tz": None if dates.tz is None else str(dates.tz),
+        "last": last,  # position of each ticker's last bar
+        "written_at": time.time(),
+    }
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # older generations, nobody maps them any more once every reader has checked the manifest again
+    for old in range(1, generation - KEEP_GENERATIONS + 1):
+        old_path = os.path.join(folder, f"{interval}.{old}.npy")
+        if os.path.exists(old_path):
+            os.remove(old_path)
+    return manifest
+
+
+class SharedPanel:
+    """
+        read side of the panel, one per api worker. the array file is mapped read only, so every
+        worker on the machine reads the same pages of the page cache instead of holding its own
+        bars and feature frames. each access checks the manifest's mtime and maps the new
+        generation when the writer replaced it, all workers see the new bars together.
+        every method returns None when the ticker is not in the panel or the panel is older than
+        max_age, the caller then uses its bar store as before.
+    """
+
+    def __init__(self, folder: str = PANEL_FOLDER, interval: str = "1d", max_age: float = MAX_AGE):
+        self.folder = folder
+        self.interval = interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._current = None  # (manifest, array, {ticker: row}, dates)
+
+    def _snapshot(self):
+        path = _manifest_path(self.folder, self.interval)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(path) as f:
+                        manifest = json.load(f)
+                    array = np.load(os.path.join(self.folder, manifest["file"]), mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Shared panel {path} not readable: {e}")
+                    return None
+                rows = {ticker: row for row, ticker in enumerate(manifest["tickers"])}
+                dates = pd.DatetimeIndex(manifest["dates"], name="Date")
+                if manifest["tz"] is not None:
+                    dates = pd.to_datetime(manifest["dates"], utc=True).tz_convert(manifest["tz"]).rename("Date")
+                self._current, self._mtime = (manifest, array, rows, dates), mtime
+            current = self._current
+        if current is None or time.time() - current[0]["written_at"] > self.max_age:
+            return None
+        return current
+
+    def last_bar(self, ticker: str):
+        """ (timestamp, close) of the ticker's last bar. """
+        snapshot = self._snapshot()
+        if snapshot is None or ticker not in snapshot[2]:
+            return None
+        manifest, array, rows, dates = snapshot
+        row = rows[ticker]
+        position = manifest["last"][row]
+        return dates[position], float(array[PANEL_FIELDS.index("Close"), row, position])
+
+    def history(self, ticker: str):
+        """ the ticker's bars with every panel field as columns, only the dates it has a bar on. """
+        snapshot = self._snapshot()
+        if snapshot is None or ticker not in snapshot[2]:
+            return None
+        _, array, rows, dates = snapshot
+        values = array[:, rows[ticker], :]  # (fields x bars) view of the mapped file
+        has_bar = ~np.isnan(values[PANEL_FIELDS.index("Close")])
+        return pd.DataFrame(values[:, has_bar].T, index=dates[has_bar], columns=PANEL_FIELDS)
+
+    def latest(self, ticker: str):
+        """
+            (bars from the first complete feature row on, last feature row) like fetch_latest with
+            engines, or None when the last bar has no complete features.
+        """
+        snapshot = self._snapshot()
+        if snapshot is None or ticker not in snapshot[2]:
+            return None
+        manifest, array, rows, dates = snapshot
+        row = rows[ticker]
+        values = array[:, row, :]  # read in place, only the rows handed out are copied
+        last = manifest["last"][row]
+        complete = ~np.isnan(values).any(axis=0)
+        if not complete[last]:
+            return None
+        has_bar = ~np.isnan(values[PANEL_FIELDS.index("Close")])
+        has_bar[:complete.argmax()] = False
+        index = dates[has_bar]
+        df = pd.DataFrame(values[:len(OHLCV), has_bar].T, index=index, columns=OHLCV)
+        bar = dict(zip(PANEL_FIELDS, values[:, last].tolist()),
+                   sector=ticker_sector(ticker), day_of_week=index[-1].day_name(), ticker=ticker)
+        features = pd.DataFrame({column: [bar[column]] for column in FEATURE_COLUMNS}, index=index[-1:])
+        return df, features
+
+
+def load_frames(store, tickers, period: str = PANEL_PERIOD, interval: str = "1d", max_workers: int = 20):
+    """ {ticker: bars} from the bar store (only the missing tails are fetched), empty ones left out. """
+    def history(ticker):
+        try:
+            return store.history(ticker, interval=interval, period=period)
+        except Exception as e:
+            print(f"[ERROR] Failed for {ticker}: {e}")
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = dict(zip(tickers, executor.map(history, tickers)))
+    return {t: df for t, df in frames.items() if df is not None and not df.empty}
+
+
+if __name__ == "__main__":
+    # python -m script.shared_panel [--limit N] [--once]
+    # the single writer: refreshes the bar store for the universe and rewrites the panel every
+    # WRITE_INTERVAL seconds. the api workers only read it, none of them fetches bars on its own
+    from script.bar_store import BarStore
+    from script.model_data_fetch import fetch_scheduler
+    from script.tickers import get_ticker_nse
+    from script.engine import BAR_STORE_FOLDER
+
+    parser = argparse.ArgumentParser(description="writer of the shared memory-mapped bar and feature panel")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N tickers of the NSE list")
+    parser.add_argument("--once", action="store_true", help="write one generation and exit")
+    parser.add_argument("--folder", default=PANEL_FOLDER)
+    args = parser.parse_args()
+
+    bar_store = BarStore(BAR_STORE_FOLDER, provider=fetch_scheduler)
+    while True:
+        start = time.time()
+        tickers = get_ticker_nse()[:args.limit]
+        manifest = write_panel(load_frames(bar_store, tickers), folder=args.folder)
+        print(f"[INFO] Panel generation {manifest['generation']}: {len(manifest['tickers'])} tickers, "
+              f"{len(manifest['dates'])} bars, {time.time() - start:.1f}s")
+        if args.once:
+            break
+        time.sleep(max(0.0, WRITE_INTERVAL - (time.time() - start)))
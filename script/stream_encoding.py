@@ -0,0 +1,89 @@
+import io
+import json
+import math
+import pyarrow as pa
+
+# rows per arrow record batch at most, a batch is also cut whenever the tickers done so far are sent
+ARROW_BATCH_ROWS = 256
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _float(value):
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _str_list(value):
+    return None if value is None else [str(v) for v in value]
+
+
+# every streamed record, one row per ticker with the fields of script.engine.Prediction. each
+# field has its arrow type and the converter for its json value, no recursive walk of a response
+PREDICTION_FIELDS = [
+    ("ticker", pa.string(), _str),
+    ("model_version", pa.string(), _str),
+    ("last_date", pa.string(), _str),
+    ("direction", pa.string(), _str),
+    ("probability", pa.float64(), _float),
+    ("predicted_change", pa.float64(), _float),
+    ("predicted_variance", pa.float64(), _float),
+    ("qlike", pa.float64(), _float),
+    ("aic", pa.float64(), _float),
+    ("best_params", pa.list_(pa.string()), _str_list),
+    ("last_close", pa.float64(), _float),
+    ("error", pa.string(), _str),
+]
+PREDICTION_SCHEMA = pa.schema([(name, type_) for name, type_, _ in PREDICTION_FIELDS])
+
+
+def _values(record):
+    return [convert(getattr(record, name)) for name, _, convert in PREDICTION_FIELDS]
+
+
+def encode_ndjson(batches):
+    """ one json line per Prediction, batches is an iterable of lists of records (engine.stream). """
+    names = [name for name, _, _ in PREDICTION_FIELDS]
+    for batch in batches:
+        yield "".join(json.dumps(dict(zip(names, _values(record)))) + "\n" for record in batch).encode()
+
+
+def encode_arrow(batches, batch_rows: int = ARROW_BATCH_ROWS):
+    """
+        arrow ipc stream of PREDICTION_SCHEMA: the schema first, then a record batch (of at most
+        batch_rows rows) for every list of records, then the end of stream marker. the bytes of
+        each message are sent as soon as it is written.
+    """
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, PREDICTION_SCHEMA) as writer:
+        yield drain()
+        for batch in batches:
+            for first in range(0, len(batch), batch_rows):
+                rows = [_values(record) for record in batch[first:first + batch_rows]]
+                columns = [
+                    pa.array([row[i] for row in rows], type=type_) for i, (_, type_, _) in enumerate(PREDICTION_FIELDS)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=PREDICTION_SCHEMA))
+                yield drain()
+    yield drain()
+
+
+def decode_ndjson(lines):
+    """ the records of an ndjson stream as dicts, lines as iter_lines() gives them. """
+    for line in lines:
+        if line:
+            yield json.loads(line)
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+import concurrent.futures
+from datetime import datetime
+from script.atomic_file import merge_json
+
+METADATA_PATH = os.path.join("data", "ticker_metadata.json")
+
+# static attributes kept from the provider info, sector is the one the features use
+METADATA_FIELDS = ("sector", "industry", "longName", "exchange", "currency", "quoteType")
+
+# seconds before a ticker whose info lookup failed is tried again in the background
+RETRY_AFTER = 3600
+
+
+class TickerMetadataIndex:
+    """
+        local ticker -> static attributes index (sector, industry, name, ...) kept in a json file.
+
+        lookups are in memory only. a ticker that is not indexed yet answers "Unknown" and gets
+        its info fetched on a small background pool, so feature building never waits on the
+        network. refresh() fetches a whole list at once (training, the pre-market job), entries
+        older than max_age_days are refreshed again by refresh_stale().
+    """
+
+    def __init__(self, path: str = METADATA_PATH, provider=None, max_age_days: int = 30, background_workers: int = 2):
+        self.path = path
+        self.provider = provider
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+        self._failed_at = {}
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=background_workers)
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def get(self, ticker: str):
+        with self._lock:
+            entry = self._entries.get(ticker)
+            return None if entry is None else dict(entry)
+
+    def sector(self, ticker: str):
+        """ sector from memory, 'Unknown' (and a background fill) when the ticker is not indexed. """
+        entry = self.get(ticker)
+        if entry is None:
+            self.fill_async(ticker)
+            return "Unknown"
+        return entry.get("sector") or "Unknown"
+
+    def fill_async(self, ticker: str):
+        with self._lock:
+            if ticker in self._entries or ticker in self._pending:
+                return None
+            if time.time() - self._failed_at.get(ticker, 0) < RETRY_AFTER:
+                return None
+            future = self._pending[ticker] = self._pool.submit(self._fill, ticker)
+        return future
+
+    def wait(self):
+        """ blocks until the background fills queued so far are done. """
+        with self._lock:
+            futures = list(self._pending.values())
+        concurrent.futures.wait(futures)
+
+    def refresh(self, tickers: list, max_workers: int = 8):
+        """
+            fetches the info of every ticker and saves the index once at the end.
+            returns the tickers whose lookup failed, their previous entry (if any) is kept.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self._lookup, tickers))
+        failed, found = [], {}
+        with self._lock:
+            for ticker, entry in zip(tickers, results):
+                if entry is None:
+                    failed.append(ticker)
+                    self._failed_at[ticker] = time.time()
+                else:
+                    self._entries[ticker] = found[ticker] = entry
+            self._save(found)
+        print(f"[INFO] Ticker metadata refreshed for {len(tickers) - len(failed)}/{len(tickers)} tickers")
+        return failed
+
+    def refresh_missing(self, tickers: list, max_workers: int = 8):
+        """ refresh() limited to the tickers not indexed yet. """
+        with self._lock:
+            missing = [t for t in tickers if t not in self._entries]
+        return self.refresh(missing, max_workers=max_workers) if missing else []
+
+    def refresh_stale(self, tickers: list = None, max_workers: int = 8):
+        """ refresh() of the entries older than max_age_days (and of tickers not indexed yet). """
+        now = datetime.now()
+        with self._lock:
+            tickers = list(self._entries) if tickers is None else tickers
+            stale = [
+                t for t in tickers
+                if t not in self._entries
+                or (now - datetime.fromisoformat(self._entries[t]["updated_at"])).days >= self.max_age_days
+            ]
+        return self.refresh(stale, max_workers=max_workers) if stale else []
+
+    def _lookup(self, ticker: str):
+        try:
+            info = self.provider.info(ticker)
+        except Exception as e:
+            print(f"[WARN] Info lookup failed for {ticker}: {e}")
+            return None
+        entry = {field: info.get(field) for field in METADATA_FIELDS}
+        entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        return entry
+
+    def _fill(self, ticker: str):
+        entry = self._lookup(ticker)
+        with self._lock:
+            self._pending.pop(ticker, None)
+            if entry is None:
+                self._failed_at[ticker] = time.time()
+                return
+            self._entries[ticker] = entry
+            self._save({ticker: entry})
+
+    def _save(self, changed: dict):
+        # api workers share the file, the entries they saved meanwhile are kept and picked up
+        if self.path is None or not changed:
+            return
+        self._entries.update(merge_json(self.path, changed))
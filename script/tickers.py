@@ -1,20 +1,162 @@
 import pandas as pd
 import requests
 import io
+import json
+import os
+import threading
+from datetime import datetime
 
 # Download the list of all equity stocks from NSE
 
+URL = "https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "text/csv"
+}
 
-def get_ticker_nse():
-    URL = "https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv"
-    "This Function will only work for above link"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "text/csv"
+# dated copies of EQUITY_L.csv ("EQUITY_L_<YYYY-MM-DD>.csv") plus the validators of the latest one
+SNAPSHOT_FOLDER = os.path.join("data", "universe")
+SNAPSHOT_META = "latest.json"
+
+# seconds the in-process list is served before the server is asked (conditionally) again
+MEMO_TTL = 6 * 3600
+
+_memo = {"tickers": None, "loaded_at": 0.0, "refreshing": False}
+_memo_lock = threading.Lock()
+
+
+def _parse(text: str):
+    df = pd.read_csv(io.StringIO(text))
+    return df['SYMBOL'].apply(lambda x: f"{x}.NS").tolist()
+
+
+def _read_meta(folder: str):
+    path = os.path.join(folder, SNAPSHOT_META)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_snapshots(folder: str = SNAPSHOT_FOLDER):
+    """ snapshot dates ("YYYY-MM-DD") stored in folder, oldest first. """
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[len("EQUITY_L_"):-len(".csv")] for name in os.listdir(folder)
+                  if name.startswith("EQUITY_L_") and name.endswith(".csv"))
+
+
+def load_snapshot(snapshot_date: str = None, folder: str = SNAPSHOT_FOLDER):
+    """ tickers of a stored snapshot, the latest one when no date is given. None when there is none. """
+    dates = list_snapshots(folder)
+    if snapshot_date is None:
+        if not dates:
+            return None
+        snapshot_date = dates[-1]
+    path = os.path.join(folder, f"EQUITY_L_{snapshot_date}.csv")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return _parse(f.read())
+
+
+def refresh_snapshot(folder: str = SNAPSHOT_FOLDER, timeout: float = 30):
+    """
+        asks NSE for EQUITY_L.csv with the ETag / Last-Modified of the latest snapshot.
+        a 304 keeps the stored file, a changed list is saved as today's snapshot.
+        returns (tickers, changed), falls back to the last good snapshot when the download fails.
+    """
+    os.makedirs(folder, exist_ok=True)
+    meta = _read_meta(folder)
+    headers = dict(HEADERS)
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    if not list_snapshots(folder):
+        headers.pop("If-None-Match", None)
+        headers.pop("If-Modified-Since", None)
+
+    try:
+        response = requests.get(URL, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return load_snapshot(folder=folder), False
+        response.raise_for_status()
+        tickers = _parse(response.text)
+    except Exception as e:
+        tickers = load_snapshot(folder=folder)
+        if tickers is None:
+            raise
+        print(f"[WARN] NSE universe download failed, using the last snapshot: {e}")
+        return tickers, False
+
+    previous = load_snapshot(folder=folder)
+    changed = previous is None or set(previous) != set(tickers)
+    if changed:
+        path = os.path.join(folder, f"EQUITY_L_{datetime.now().strftime('%Y-%m-%d')}.csv")
+        with open(path + ".tmp", "w") as f:
+            f.write(response.text)
+        os.replace(path + ".tmp", path)
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "checked_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(folder, SNAPSHOT_META + ".tmp"), "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(folder, SNAPSHOT_META + ".tmp"), os.path.join(folder, SNAPSHOT_META))
+    return tickers, changed
+
+
+def universe_diff(old_date: str = None, new_date: str = None, folder: str = SNAPSHOT_FOLDER):
+    """
+        {"added": [...], "removed": [...]} between two snapshots, by default the latest one
+        against the one before it (everything counts as added when there is only one).
+    """
+    dates = list_snapshots(folder)
+    new_date = new_date or (dates[-1] if dates else None)
+    if old_date is None:
+        older = [d for d in dates if new_date is not None and d < new_date]
+        old_date = older[-1] if older else None
+    new = set(load_snapshot(new_date, folder) or []) if new_date else set()
+    old = set(load_snapshot(old_date, folder) or []) if old_date else set()
+    return {
+        "from": old_date,
+        "to": new_date,
+        "added": sorted(new - old),
+        "removed": sorted(old - new),
     }
-    response = requests.get(URL, headers=headers)
-    response.raise_for_status()
-    df = pd.read_csv(io.StringIO(response.text))
-    tickers = df['SYMBOL'].apply(lambda x: f"{x}.NS").tolist()
-    return tickers
 
+
+def _revalidate():
+    try:
+        tickers, _ = refresh_snapshot()
+        with _memo_lock:
+            _memo["tickers"] = tickers
+    except Exception as e:
+        print(f"[WARN] NSE universe refresh failed: {e}")
+    finally:
+        with _memo_lock:
+            _memo["refreshing"] = False
+
+
+def get_ticker_nse(refresh: bool = False):
+    """
+        NSE equity tickers ("<SYMBOL>.NS") served from memory or the latest local snapshot.
+        every MEMO_TTL seconds the snapshot is revalidated with NSE on a background thread, so
+        callers only wait for the download on a machine with no snapshot yet (or with refresh=True).
+    """
+    with _memo_lock:
+        if _memo["tickers"] is None:
+            _memo["tickers"] = load_snapshot()
+        expired = datetime.now().timestamp() - _memo["loaded_at"] > MEMO_TTL
+        if expired and not refresh and _memo["tickers"] is not None and not _memo["refreshing"]:
+            _memo["refreshing"] = True
+            _memo["loaded_at"] = datetime.now().timestamp()
+            threading.Thread(target=_revalidate, daemon=True).start()
+        tickers = _memo["tickers"]
+    if tickers is None or refresh:
+        tickers, _ = refresh_snapshot()
+        with _memo_lock:
+            _memo["tickers"], _memo["loaded_at"] = tickers, datetime.now().timestamp()
+    return list(tickers)
@@ -1,5 +1,29 @@
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from datetime import date
 from script.model_data_fetch import safe_fetch
+from script.precompute_store import PrecomputeStore, PRECOMPUTE_PATH
+from script.stream_encoding import decode_ndjson
+
+API_URL = "http://127.0.0.1:5000/predict"
+API_STREAM_URL = "http://127.0.0.1:5000/predict/stream"
+API_MODELS_URL = "http://127.0.0.1:5000/models"
+
+# keep-alive connections to the api shared by every call, as many as the Trade Calculator's threads
+API_POOL_SIZE = 20
+_session = None
+_session_lock = threading.Lock()
+
+def api_session():
+    """ the process wide pooled requests session for the api calls. """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=API_POOL_SIZE))
+            _session = session
+    return _session
 
 def target_calculator(price: float, percentage: float, long: bool):
     profit = price * percentage
@@ -9,16 +33,125 @@ def stop_loss_calculator(price: float, percentage: float, long: bool):
     loss = price * percentage
     return price - loss if long else price + loss
 
+def confidence_level(probability: float, qlike_score: float):
+    """ trade confidence from the direction probability and the garch qlike score. """
+    confidence = "Low"
+    if qlike_score is not None:
+        if qlike_score < 1.5:
+            if probability > 0.60 or probability < 0.40:
+                confidence = "Very High"
+            elif probability > 0.54 or probability < 0.46:
+                confidence = "High"
+            elif probability > 0.52 or probability < 0.48:
+                confidence = "Medium"
+    return confidence
+
+def trade_setup(ticker: str, fetched_data: dict, risk: float, current_price: float = None):
+    """
+        builds the trade calculator row from a /predict response:
+        (ticker, type, probability, predicted change, predicted variance, confidence,
+         current price, target price, sl price, aic). without a current price the response's
+        Last Close is used, and only when it has none the price is fetched.
+    """
+    # Defensive extraction with .get and default values
+    direction_pred = fetched_data.get("Direction Prediction", {})
+    ticker_proba = direction_pred.get("Probability", None)
+    if ticker_proba is None:
+        print(f"Probability missing for {ticker}")
+        return (ticker, None, None, None, None, None, None, None, None, None)
+
+    long = True if ticker_proba > 0.5 else False
+    type = "Long" if long else "Short"
+
+    vol_pred = fetched_data.get("Volatility Prediction")
+    # volatility_predict answers with a message instead of a dict when the fit failed
+    vol_pred = vol_pred if isinstance(vol_pred, dict) else {}
+    pred = vol_pred.get("Prediction", {})
+    ticker_predicted_change = pred.get("Predicted Change/Volume", None)
+    ticker_predicted_var = pred.get("Predicted Variance", None)
+
+    if ticker_predicted_change is None or ticker_predicted_var is None:
+        print(f"Volatility prediction missing for {ticker}")
+        return (ticker, type, ticker_proba, None, None, None, None, None, None, None)
+
+    if ticker_predicted_change < 1.5:
+        print(f"Not enough room for trade {ticker}")
+        return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, None, None, None, None, None)
+
+    model_des = vol_pred.get("Model Description", {})
+    qlike_score = model_des.get("QLIKE Score", None)
+    aic_score = model_des.get("Model AIC", None)
+
+    confidence = confidence_level(ticker_proba, qlike_score)
+
+    if current_price is None:
+        # the api sends the close its prediction was made after
+        current_price = fetched_data.get("Last Close")
+    if current_price is None:
+        df, _, _ = safe_fetch(
+            ticker, 
+            interval="1d",
+            period="1d",
+            feature_cal=False
+        )
+        if df is not None:
+            current_price = float(df['Close'].values[-1])
+    if current_price is None:
+        print(f"Could not fetch current price for {ticker}")
+        return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, confidence, None, None, None, aic_score)
+
+    # Convert predicted change to decimal
+    target_percentage = ticker_predicted_change / 100
+    sl_percentage = target_percentage * risk
+
+    sl_price = stop_loss_calculator(price=current_price, percentage=sl_percentage, long=long)
+    target_price = target_calculator(price=current_price, percentage=target_percentage, long=long)
+
+    return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, confidence, current_price, target_price, sl_price, aic_score)
+
+def served_model_version():
+    """ model version the running api serves (GET /models), None when it can not be reached. """
+    try:
+        return api_session().get(API_MODELS_URL, timeout=10).json().get("serving")
+    except Exception as e:
+        print(f"[WARN] Served model version not available: {e}")
+        return None
+
+def precomputed_trade_setups(tickers: list, risk: float, model_version: str, store=None):
+    """
+        trade calculator rows for the tickers found in today's pre-market run (script.precompute)
+        of model_version, the version the live predictions come from, so both halves of the sheet
+        are made by the same model. current price is the stored last close.
+        returns ({ticker: row}, run_date or None), tickers missing from the run (every ticker when
+        there is no run of that version today or model_version is None) have to be predicted
+        (PredictionEngine.trade_setups or request_to_api_loacal_host).
+    """
+    if model_version is None:
+        return {}, None
+    store = store if store is not None else PrecomputeStore(PRECOMPUTE_PATH)
+    run = store.latest_run(run_date=date.today().isoformat(), model_version=model_version)
+    if run is None:
+        return {}, None
+    run_date, model_version = run
+    rows = {}
+    for ticker, entry in store.get_many(tickers, run_date, model_version).items():
+        if entry["error"] is not None:
+            print(f"Precompute failed for {ticker}: {entry['error']}")
+            rows[ticker] = (ticker, None, None, None, None, None, None, None, None, None)
+            continue
+        rows[ticker] = trade_setup(ticker, entry["reply"], risk, current_price=entry["last_close"])
+    return rows, run_date
+
 def request_to_api_loacal_host(ticker: str, risk: float):
     # Setting model payload and address
-    url = "http://127.0.0.1:5000/predict"
+    url = API_URL
     payload = {
         "ticker": ticker,
         "threshold": 0.5
     }
     try:
         # sending payload using response module
-        response = requests.post(url, json=payload)
+        response = api_session().post(url, json=payload)
         print(f"POST Request with Data for ticker {ticker} | Status Code: {response.status_code}")
         if response.status_code != 200:
             print(f"API did not return 200 for {ticker}. Response: {response.text}")
@@ -29,65 +162,17 @@ def request_to_api_loacal_host(ticker: str, risk: float):
             print(f"Failed to decode JSON for {ticker}: {e}")
             return (ticker, None, None, None, None, None, None, None, None, None)
 
-        
-       # Defensive extraction with .get and default values
-        direction_pred = fetched_data.get("Direction Prediction", {})
-        ticker_proba = direction_pred.get("Probability", None)
-        if ticker_proba is None:
-            print(f"Probability missing for {ticker}")
-            return (ticker, None, None, None, None, None, None, None, None, None)
-
-        long = True if ticker_proba > 0.5 else False
-        type = "Long" if long else "Short"
-
-        vol_pred = fetched_data.get("Volatility Prediction", {})
-        pred = vol_pred.get("Prediction", {})
-        ticker_predicted_change = pred.get("Predicted Change/Volume", None)
-        ticker_predicted_var = pred.get("Predicted Variance", None)
-
-        if ticker_predicted_change is None or ticker_predicted_var is None:
-            print(f"Volatility prediction missing for {ticker}")
-            return (ticker, type, ticker_proba, None, None, None, None, None, None, None)
-
-        if ticker_predicted_change < 1.5:
-            print(f"Not enough room for trade {ticker}")
-            return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, None, None, None, None, None)
-
-        model_des = vol_pred.get("Model Description", {})
-        qlike_score = model_des.get("QLIKE Score", None)
-        aic_score = model_des.get("Model AIC", None)
-
-        # Confidence logic
-        confidence = "Low"
-        if qlike_score is not None:
-            if qlike_score < 1.5:
-                if ticker_proba > 0.60 or ticker_proba < 0.40:
-                    confidence = "Very High"
-                elif ticker_proba > 0.54 or ticker_proba < 0.46:
-                    confidence = "High"
-                elif ticker_proba > 0.52 or ticker_proba < 0.48:
-                    confidence = "Medium"
-
-        df, _, _ = safe_fetch(
-            ticker, 
-            interval="1d",
-            period="1d",
-            feature_cal=False
-        )
-
-        current_price = float(df['Close'].values[-1])
-        if current_price is None:
-            print(f"Could not fetch current price for {ticker}")
-            return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, confidence, None, None, None, aic_score)
-
-        # Convert predicted change to decimal
-        target_percentage = ticker_predicted_change / 100
-        sl_percentage = target_percentage * risk
-
-        sl_price = stop_loss_calculator(price=current_price, percentage=sl_percentage, long=long)
-        target_price = target_calculator(price=current_price, percentage=target_percentage, long=long)
-
-        return (ticker, type, ticker_proba, ticker_predicted_change, ticker_predicted_var, confidence, current_price, target_price, sl_price, aic_score)
+        return trade_setup(ticker, fetched_data, risk)
     except requests.exceptions.RequestException as e:
         print(f"Error during POST request for ticker {ticker}: {e}")
-        return (ticker, None, None, None, None, None, None, None, None, None)
\ No newline at end of file
+        return (ticker, None, None, None, None, None, None, None, None, None)
+
+def stream_predictions(tickers: list, threshold: float = 0.5):
+    """
+        posts the whole list to /predict/stream and yields each ticker's record (a dict with the
+        fields of script.engine.Prediction) as soon as the api sends it.
+    """
+    payload = {"tickers": tickers, "threshold": threshold, "format": "ndjson"}
+    with api_session().post(API_STREAM_URL, json=payload, stream=True) as response:
+        response.raise_for_status()
+        yield from decode_ndjson(response.iter_lines())
@@ -1,4 +1,12 @@
-from script.model_data_fetch import safe_fetch
+import numpy as np
+import pandas as pd
+from script.model_data_fetch import fetch_scheduler
+from script.intraday_store import IntradayStore, INTRADAY_STORE_FOLDER
+
+NOT_EXECUTED = "Trade not executed"
+
+# 1 minute bars per (ticker, session date) on disk, every trade on a ticker reads the same session
+intraday_store = IntradayStore(INTRADAY_STORE_FOLDER, provider=fetch_scheduler)
 
 def trade_performance_calculator(
         ticker: str,
@@ -7,7 +15,10 @@ def trade_performance_calculator(
         target_price: float,
         long: bool,
         executing_interval: int,
-        executing_interval_price: float
+        executing_interval_price: float,
+        bars: pd.DataFrame = None,
+        session: str = None,
+        store: IntradayStore = None
 ):
     """
     Simulates trade performance for a given ticker and trade parameters.
@@ -20,12 +31,18 @@ def trade_performance_calculator(
         long: True for long trade, False for short.
         executing_interval: Number of minutes after open to try to enter trade.
         executing_interval_price: Allowed % deviation from last_price for entry.
+        bars: 1-minute bars to use instead of reading them from the intraday store.
+        session: Session date ("YYYY-MM-DD") to evaluate, the latest completed session by default.
+        store: IntradayStore to read the bars from, the shared intraday_store by default.
 
     Returns:
         dict with trade outcome and relevant info.
     """
-    # Fetch 1-minute data for the day
-    df, _, _ = safe_fetch(ticker, interval="1m", period='1d', feature_cal=False)
+    # 1-minute data for the session, fetched once per ticker and session
+    if bars is not None:
+        df = bars
+    else:
+        df = (store or intraday_store).session(ticker, session)
     if df is None or df.empty:
         return {
             "ticker": ticker,
@@ -105,9 +122,10 @@ def trade_performance_calculator(
         result = "stop_loss"
         pnl = (exit_price - entry_price) if long else (entry_price - exit_price)
     else:
-        # Neither hit, exit at last available price
-        exit_price = df_trade['Close'].iloc[-15]
-        exit_time = df_trade.index[-15]
+        # Neither hit, exit 15 bars before the close (the entry bar on a shorter session)
+        position = max(len(df_trade) - 15, 0)
+        exit_price = df_trade['Close'].iloc[position]
+        exit_time = df_trade.index[position]
         result = "timeout"
         pnl = (exit_price - entry_price) if long else (entry_price - exit_price)
 
@@ -119,4 +137,113 @@ def trade_performance_calculator(
         "exit_time": str(exit_time),
         "result": result,
         "pnl": pnl
-    }
\ No newline at end of file
+    }
+
+def _not_executed_record(ticker: str, entry_price: str = NOT_EXECUTED):
+    return {
+        "ticker": ticker,
+        "entry_price": entry_price,
+        "entry_time": NOT_EXECUTED,
+        "exit_price": NOT_EXECUTED,
+        "exit_time": NOT_EXECUTED,
+        "result": NOT_EXECUTED,
+        "pnl": 0
+    }
+
+def _simulate_ticker(ticker: str, df: pd.DataFrame, trades: pd.DataFrame, executing_interval: int,
+                     executing_interval_price: float):
+    """
+        evaluates every trade of one ticker against its 1-minute bars at once.
+        rows are trades and columns are bars, the first entry/exit bar comes from argmax over masks.
+    """
+    closes = df["Close"].to_numpy(dtype=float)
+    n_bars = len(closes)
+    last_price = trades["Current Price"].to_numpy(dtype=float)
+    stop_loss = trades["SL Price"].to_numpy(dtype=float)
+    target_price = trades["Target Price"].to_numpy(dtype=float)
+    long = trades["Type"].str.lower().eq("long").to_numpy()
+
+    # entry: first close inside the allowed band within the first executing_interval bars
+    window = closes[:executing_interval][None, :]
+    price_upper = last_price * (1 + executing_interval_price / 100)
+    price_lower = last_price * (1 - executing_interval_price / 100)
+    in_band = (price_lower[:, None] <= window) & (window <= price_upper[:, None])
+    executed = in_band.any(axis=1)
+    entry_idx = in_band.argmax(axis=1)
+
+    # exit: first bar from entry on that touches the target (checked first) or the stop
+    bars = closes[None, :]
+    after_entry = np.arange(n_bars)[None, :] >= entry_idx[:, None]
+    hit_target = np.where(long[:, None], bars >= target_price[:, None], bars <= target_price[:, None]) & after_entry
+    hit_stop = np.where(long[:, None], bars <= stop_loss[:, None], bars >= stop_loss[:, None]) & after_entry
+    hit = hit_target | hit_stop
+    exited = hit.any(axis=1)
+    exit_idx = hit.argmax(axis=1)
+    rows = np.arange(len(trades))
+    target_first = hit_target[rows, exit_idx]
+
+    # neither hit: exit 15 bars before the close (never before the entry bar)
+    timeout_idx = np.maximum(n_bars - 15, entry_idx)
+
+    records = []
+    index = df.index
+    for i in rows:
+        if not executed[i]:
+            records.append(_not_executed_record(ticker))
+            continue
+        entry_price = closes[entry_idx[i]]
+        if exited[i]:
+            result = "target" if target_first[i] else "stop_loss"
+            exit_price = target_price[i] if target_first[i] else stop_loss[i]
+            exit_time = index[exit_idx[i]]
+        else:
+            result = "timeout"
+            exit_price = closes[timeout_idx[i]]
+            exit_time = index[timeout_idx[i]]
+        pnl = (exit_price - entry_price) if long[i] else (entry_price - exit_price)
+        records.append({
+            "ticker": ticker,
+            "entry_price": entry_price,
+            "entry_time": str(index[entry_idx[i]]),
+            "exit_price": exit_price,
+            "exit_time": str(exit_time),
+            "result": result,
+            "pnl": pnl
+        })
+    return records
+
+def simulate_trades(trades: pd.DataFrame, executing_interval: int = 5, executing_interval_price: float = 0.2,
+                    bars: dict = None, session: str = None, store: IntradayStore = None):
+    """
+    Vectorized trade_performance_calculator over a whole trades table.
+
+    Args:
+        trades: Trade Calculator sheet, needs "Ticker", "Current Price", "SL Price",
+            "Target Price" and "Type" ("Long"/"Short"), tickers and sides can be mixed.
+        executing_interval: Number of minutes after open to try to enter trade.
+        executing_interval_price: Allowed % deviation from last_price for entry.
+        bars: optional {ticker: 1-minute bars}, tickers missing from it are read from the store.
+        session: Session date ("YYYY-MM-DD") to evaluate, the latest completed session by default.
+        store: IntradayStore to read the bars from, the shared intraday_store by default.
+
+    Returns:
+        list of result dicts in the same order and format as trade_performance_calculator.
+    """
+    bars = {} if bars is None else dict(bars)
+    missing = [t for t in trades["Ticker"].unique() if t not in bars]
+    if missing:
+        # sessions not on disk yet are fetched in parallel, one request per ticker
+        bars.update((store or intraday_store).sessions(missing, session))
+
+    records = [None] * len(trades)
+    positions = np.arange(len(trades))
+    for ticker, group in trades.groupby("Ticker", sort=False):
+        df = bars.get(ticker)
+        idx = positions[trades["Ticker"].to_numpy() == ticker]
+        if df is None or df.empty:
+            for i in idx:
+                records[i] = _not_executed_record(ticker, "Unable to fetch data(error)")
+            continue
+        for i, record in zip(idx, _simulate_ticker(ticker, df, group, executing_interval, executing_interval_price)):
+            records[i] = record
+    return records
@@ -1,22 +1,97 @@
 from script.tickers import get_ticker_nse # list of the tickers
-from script.model_data_fetch import model_data
-from script.classifier_model_training import stack_models
+from script.dataset_builder import build_dataset, load_dataset, dataset_last_date, UPDATE_FOLDER
+from script.classifier_model_training import stack_models, stack_models_fast, retune_meta, update_stack
+from script.bar_store import BarStore
+from script.model_data_fetch import fetch_scheduler
+from script.lean_model import export_lean_model, lean_path
+from script.model_registry import register_model
+from sklearn.metrics import roc_auc_score
+import numpy as np
 from datetime import datetime
+import argparse
 import joblib
+import json
 import os
 
+parser = argparse.ArgumentParser(description="train the direction model")
+parser.add_argument("--fast", action="store_true",
+                    help="parallel, early stopped training that also saves the out-of-fold probabilities")
+parser.add_argument("--n-jobs", type=int, default=None, help="cores the training may use (default: all)")
+parser.add_argument("--update", metavar="MODEL",
+                    help="continue boosting a --fast MODEL on the rows after its last training date")
+parser.add_argument("--rounds", type=int, default=20, help="boosting rounds added by --update")
+parser.add_argument("--retune-meta", metavar="MODEL",
+                    help="refit only the final estimator of a --fast MODEL on its saved out-of-fold probabilities")
+parser.add_argument("--no-activate", action="store_true",
+                    help="only register the new model in model/manifest.json, the api keeps serving its version")
+args = parser.parse_args()
+
 MODEL_FOLDER = "model"
 os.makedirs(MODEL_FOLDER, exist_ok=True)
 MODEL_NAME = f"stock_prediction{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.pkl"
 MODEL_PATH = os.path.join(MODEL_FOLDER, MODEL_NAME)
 
-tickers_ns = get_ticker_nse()
+def sidecar_path(model_path):
+    # training date and out-of-fold file of a model, next to it
+    return model_path + ".json"
+
+def oof_metrics(oof_path):
+    # out-of-fold auc of every base learner, unseen rows so it is a fair score of the boosters
+    saved = np.load(oof_path)
+    return {
+        f"oof_auc_{name}": float(roc_auc_score(saved["y"], saved["oof"][:, i]))
+        for i, name in enumerate(saved["learners"])
+    }
 
-# loading/getting model data to fit in the model
-X, y, cat_cols, num_cols = model_data(ticker_list=tickers_ns)
+def save(clf, info):
+    joblib.dump(clf, MODEL_PATH)
+    # numpy-only copy for serving, api_app loads it instead of the pickle
+    export_lean_model(clf, lean_path(MODEL_PATH), source_path=MODEL_PATH)
+    with open(sidecar_path(MODEL_PATH), "w") as f:
+        json.dump(info, f, indent=2)
+    # a running api picks the active version up from the manifest and swaps to it
+    version = register_model(MODEL_PATH, activate=not args.no_activate)
+    print(f"Final model being build sucessfully and saved data, version {version[:12]}")
 
-clf = stack_models(X, y, num_cols, cat_cols) # will return fitted model
+if args.retune_meta:
+    with open(sidecar_path(args.retune_meta)) as f:
+        info = json.load(f)
+    clf = retune_meta(joblib.load(args.retune_meta), info["oof_path"])
+    save(clf, dict(info, updated_from=args.retune_meta))
+else:
+    tickers_ns = get_ticker_nse()
 
-joblib.dump(clf, MODEL_PATH)
+    # each ticker's features are spooled to data/dataset as they finish, then read back once with
+    # category columns (FLOAT32 halves the numeric columns too), panel computes the features of
+    # many tickers in one numpy pass. bars come from the local store, only new ones are downloaded
+    FLOAT32 = False
+    bar_store = BarStore(os.path.join("data", "bars"), provider=fetch_scheduler)
 
-print("Final model being build sucessfully and saved data")
\ No newline at end of file
+    if args.update:
+        with open(sidecar_path(args.update)) as f:
+            info = json.load(f)
+        # only the tail from the newest bar of the last training on, that bar has its label now and
+        # the rows before it are in the model already. data/dataset is kept for the next full training
+        build_dataset(tickers_ns, folder=UPDATE_FOLDER, float32=FLOAT32, panel=True, store=bar_store,
+                      since=info["trained_until"])
+        X, y, cat_cols, num_cols = load_dataset(UPDATE_FOLDER)
+        if X.empty:
+            raise SystemExit(f"[INFO] No new labelled rows since {info['trained_until']}, nothing to update")
+        trained_until = str(dataset_last_date(UPDATE_FOLDER))
+        print(f"Updating {args.update} with {len(X)} new rows")
+        clf = update_stack(joblib.load(args.update), X, y, rounds=args.rounds, n_jobs=args.n_jobs)
+        save(clf, dict(info, trained_until=trained_until, updated_from=args.update,
+                       metrics=dict(info.get("metrics", {}), update_rows=len(X))))
+    else:
+        build_dataset(tickers_ns, float32=FLOAT32, panel=True, store=bar_store)
+        trained_until = str(dataset_last_date())
+        X, y, cat_cols, num_cols = load_dataset()
+        if args.fast:
+            oof_path = MODEL_PATH.replace(".pkl", "_oof.npz")
+            clf = stack_models_fast(X, y, num_cols, cat_cols, n_jobs=args.n_jobs, oof_path=oof_path)
+            save(clf, {"trained_until": trained_until, "oof_path": oof_path,
+                       "metrics": dict(oof_metrics(oof_path), rows=len(X))})
+        else:
+            # loading/getting model data to fit in the model
+            clf = stack_models(X, y, num_cols, cat_cols) # will return fitted model
+            save(clf, {"trained_until": trained_until, "metrics": {"rows": len(X)}})
@@ -1,54 +1,149 @@
+import os
+import signal
+import threading
+import concurrent.futures
 import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 from arch import arch_model
 
+# search grid, distributions are ordered from simplest to most flexible (prune relies on it)
+VOL_TYPES = ["Garch", "EGARCH", "GJR-GARCH"]
+DISTRIBUTIONS = ["normal", "t", "skewt"]
+ORDERS = [(p, q) for p in range(1, 3) for q in range(1, 3)]
+
+# aic improvement a richer distribution needs over the simpler one to keep going when pruning
+PRUNE_AIC_MARGIN = 2.0
+
+# seconds the pool gets past fit_timeout before its workers are killed (a fit the alarm could not stop)
+FIT_TIMEOUT_GRACE = 5.0
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
 def qlike_loss(realized_var, predicted_var):
     return np.mean((realized_var / predicted_var) - np.log(realized_var / predicted_var) - 1)
 
-def volatility_predict(df: pd.DataFrame):
-    try:    
-        returns = 100 * df['Close'].pct_change().dropna()
-    except Exception as e:
-        return f"Model Failed while computing. {e}"
-    
-    best_aic, best_model, best_params, best_qlike = 1e10, None, None, None
-
-    for vol in ["Garch", "EGARCH", "GJR-GARCH"]:
-        for dist in ["normal", "t", "skewt"]:
-            for p in range(1,3):
-                for q in range(1,3):
-                    try:
-                        model = arch_model(returns, vol=vol, p=p, q=q, dist=dist, mean="Constant")
-                        res = model.fit(disp="off")
-                        forecast = res.forecast(horizon=1)
-                        predicted_var = forecast.variance.iloc[-1].values
-                        realized_var = returns.iloc[-1]**2
-                        qlike = qlike_loss(np.array([realized_var]), predicted_var)
-                        
-                        if res.aic < best_aic:
-                            best_aic = res.aic
-                            best_model = res
-                            best_params = [vol, dist, p, q]
-                            best_qlike = qlike
-                    except:
-                        continue
-    
-    if best_model is None:
-        return "failed to build model."
+def _get_pool(n_jobs: int):
+    # one long lived pool per process, starting workers costs more than a single fit
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != n_jobs:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs)
+            _pool_workers = n_jobs
+        return _pool
+
+def _reset_pool():
+    # a fit past its deadline keeps its worker busy, the only way to stop it is to end the process
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            return
+        processes = list((getattr(_pool, "_processes", None) or {}).values())
+        _pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        _pool, _pool_workers = None, None
 
+@contextmanager
+def _deadline(seconds: float):
+    """
+        raises TimeoutError in the block after seconds (SIGALRM). only where signals can be used:
+        the main thread of a process, which is where pool workers run their tasks. elsewhere (api
+        threads, windows) the block runs without a deadline.
+    """
+    if not seconds or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TimeoutError(f"fit took longer than {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
     try:
-        model = arch_model(returns, vol=best_params[0], p=best_params[2], q=best_params[3], dist=best_params[1], mean="Constant")
-        res = model.fit(disp="off")
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-        # Forecast next 5 days ahead
+def _fit_spec(returns: pd.Series, vol: str, dist: str, p: int, q: int, starting_values=None, timeout: float = None):
+    """
+        fits one spec and returns (aic, qlike, predicted_var, params) or None if it failed or ran
+        longer than timeout seconds. runs inside the pool workers so it must stay at module level.
+    """
+    try:
+        model = arch_model(returns, vol=vol, p=p, q=q, dist=dist, mean="Constant")
+        if starting_values is not None:
+            starting_values = np.asarray(starting_values, dtype=float)
+        with _deadline(timeout):
+            res = model.fit(disp="off", starting_values=starting_values)
         forecast = res.forecast(horizon=1)
-
-        # Extract variance forecast
         predicted_var = forecast.variance.iloc[-1].values
-        predicted_vol = np.sqrt(predicted_var)
-    except Exception as e:
-        return f"Error while training/predicting: {e}"
-    
+        realized_var = returns.iloc[-1]**2
+        qlike = qlike_loss(np.array([realized_var]), predicted_var)
+        return res.aic, qlike, predicted_var, res.params.tolist()
+    except Exception:
+        return None
+
+def _fit_specs(returns: pd.Series, specs: list, n_jobs: int, fit_timeout: float):
+    """
+        fits every spec, on the process pool when n_jobs > 1, and returns {spec: fit} for the ones that worked.
+        fit_timeout is the deadline of each fit, a fit running longer is stopped and dropped. when no
+        fit finishes for fit_timeout + FIT_TIMEOUT_GRACE the pool is recycled and the rest dropped.
+    """
+    if n_jobs <= 1:
+        fits = {spec: _fit_spec(returns, *spec, timeout=fit_timeout) for spec in specs}
+    else:
+        pool = _get_pool(n_jobs)
+        futures = {pool.submit(_fit_spec, returns, *spec, timeout=fit_timeout): spec for spec in specs}
+        fits, pending = {}, set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=fit_timeout + FIT_TIMEOUT_GRACE if fit_timeout else None,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"[WARN] GARCH fit did not stop at its deadline, restarting the pool and dropping {len(pending)} specs")
+                _reset_pool()
+                break
+            for future in done:
+                fits[futures[future]] = future.result()
+    return {spec: fit for spec, fit in fits.items() if fit is not None}
+
+def _search_specs(returns: pd.Series, n_jobs: int, fit_timeout: float, prune: bool):
+    """
+        runs the model selection grid, returns {spec: fit}.
+        with prune the grid runs in waves (normal, then t, then skewt) and a richer distribution
+        is only tried where the previous one beat the simpler one by PRUNE_AIC_MARGIN.
+    """
+    bases = [(vol, p, q) for vol in VOL_TYPES for p, q in ORDERS]
+    if not prune:
+        specs = [(vol, dist, p, q) for vol in VOL_TYPES for dist in DISTRIBUTIONS for p, q in ORDERS]
+        return _fit_specs(returns, specs, n_jobs, fit_timeout)
+
+    fits = _fit_specs(returns, [(vol, DISTRIBUTIONS[0], p, q) for vol, p, q in bases], n_jobs, fit_timeout)
+    alive = [base for base in bases if (base[0], DISTRIBUTIONS[0], base[1], base[2]) in fits]
+    for i, dist in enumerate(DISTRIBUTIONS[1:], start=1):
+        if not alive:
+            break
+        wave = _fit_specs(returns, [(vol, dist, p, q) for vol, p, q in alive], n_jobs, fit_timeout)
+        fits.update(wave)
+        # next (richer) distribution only where this one clearly beat the simpler one
+        simpler = DISTRIBUTIONS[i - 1]
+        alive = [
+            (vol, p, q) for vol, p, q in alive
+            if (vol, dist, p, q) in wave
+            and wave[(vol, dist, p, q)][0] < fits[(vol, simpler, p, q)][0] - PRUNE_AIC_MARGIN
+        ]
+    return fits
+
+def _model_reply(predicted_var, best_aic, best_params, best_qlike):
+    predicted_vol = np.sqrt(predicted_var)
+
     # setting model prediction in a dictionary
     model_prediction = {
         "Predicted Change/Volume": predicted_vol,
@@ -69,3 +164,189 @@ def volatility_predict(df: pd.DataFrame):
     }
 
     return model_reply
+
+def _stored_spec_fit(returns: pd.Series, ticker: str, registry):
+    """
+        fits only the spec stored for ticker, warm started from its stored parameters.
+        returns None when the grid has to run again (no entry, due for reselection, failed or degraded fit).
+    """
+    entry = registry.get(ticker)
+    if entry is None or registry.needs_reselection(entry):
+        return None
+    spec = entry["spec"]
+    fit = _fit_spec(returns, *spec, starting_values=entry["params"])
+    if fit is None or registry.degraded(entry, fit[0], fit[1], len(returns)):
+        print(f"[INFO] Stored GARCH spec for {ticker} degraded, running the full grid")
+        return None
+    registry.update(ticker, spec, fit[0], fit[1], fit[3], len(returns), reselected=False)
+    return spec, fit
+
+def select_spec(returns: pd.Series, n_jobs: int = 1, fit_timeout: float = None, prune: bool = False,
+                ticker: str = None, registry=None):
+    """
+        returns (spec, fit) for the lowest aic spec, fit being (aic, qlike, predicted_var, params),
+        or None when nothing could be fitted. see volatility_predict for the options.
+    """
+    if registry is not None and ticker is not None:
+        selected = _stored_spec_fit(returns, ticker, registry)
+        if selected is not None:
+            return selected
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    fits = _search_specs(returns, n_jobs, fit_timeout, prune)
+
+    best_aic, best_fit, best_params = 1e10, None, None
+
+    # same order as the grid so ties resolve to the same spec as a sequential search
+    for vol in VOL_TYPES:
+        for dist in DISTRIBUTIONS:
+            for p, q in ORDERS:
+                fit = fits.get((vol, dist, p, q))
+                if fit is not None and fit[0] < best_aic:
+                    best_aic, best_fit = fit[0], fit
+                    best_params = [vol, dist, p, q]
+
+    if best_fit is None:
+        return None
+
+    if registry is not None and ticker is not None:
+        registry.update(ticker, best_params, best_aic, best_fit[1], best_fit[3], len(returns), reselected=True)
+    return best_params, best_fit
+
+def volatility_predict(df: pd.DataFrame, n_jobs: int = 1, fit_timeout: float = None, prune: bool = False,
+                       ticker: str = None, registry=None):
+    """
+        picks the garch family spec with the lowest aic and forecasts next day variance.
+        n_jobs > 1 (or -1 for all cores) runs the grid on a process pool, fit_timeout is the
+        deadline (seconds) of each fit and prune skips distributions that do not pay off.
+        with a ticker and a script.garch_registry.GarchSpecRegistry only the stored spec is
+        fitted until the registry asks for a new grid search.
+    """
+    try:
+        returns = 100 * df['Close'].pct_change().dropna()
+    except Exception as e:
+        return f"Model Failed while computing. {e}"
+
+    selected = select_spec(returns, n_jobs, fit_timeout, prune, ticker=ticker, registry=registry)
+    if selected is None:
+        return "failed to build model."
+
+    # the winning fit already carries its one step forecast, no need to refit it
+    best_params, best_fit = selected
+    return _model_reply(best_fit[2], best_fit[0], best_params, best_fit[1])
+
+
+class VolatilityForecaster:
+    """
+        holds a fitted garch/egarch/gjr spec and its last variance state so every new daily
+        return costs one step of the variance recursion instead of a full mle refit.
+        predict() returns the same payload as volatility_predict. refit() runs the model
+        selection again and is only needed on demand (or when the registry asks for it).
+
+        returns are in percent like volatility_predict (100 * pct_change).
+    """
+
+    def __init__(self, spec: list, params: list, resid, variance, aic: float, last_return: float = None,
+                 last_date=None):
+        vol, dist, p, q = spec
+        self.spec = list(spec)
+        self.aic = aic
+        self.last_date = last_date
+        self.last_return = last_return
+        model = arch_model(np.zeros(10), vol=vol, p=p, q=q, dist=dist, mean="Constant")
+        names = model.parameter_names() + model.volatility.parameter_names() + model.distribution.parameter_names()
+        values = dict(zip(names, params))
+        self.egarch = vol.upper() == "EGARCH"
+        self.mu = values["mu"]
+        self.omega = values["omega"]
+        self.alpha = np.array([values[f"alpha[{i}]"] for i in range(1, p + 1)])
+        self.gamma = np.array([values[n] for n in names if n.startswith("gamma[")])
+        self.beta = np.array([values[f"beta[{j}]"] for j in range(1, q + 1)])
+        lags = max(len(self.alpha), len(self.gamma), len(self.beta), 1)
+        # newest first, only as many lags as the recursion needs
+        self._resid = list(np.asarray(resid, dtype=float)[::-1][:lags])
+        self._variance = list(np.asarray(variance, dtype=float)[::-1][:lags])
+        self._next_variance = self._step()
+        # state before the last update, a return arriving again with the same date is re-applied on it
+        self._previous = None
+
+    @classmethod
+    def from_returns(cls, returns: pd.Series, spec: list, params: list, aic: float = None):
+        """
+            rebuilds the variance state by filtering returns with already fitted params. the last
+            return is fed through update() so a revised value of it can be re-applied later.
+        """
+        vol, dist, p, q = spec
+        model = arch_model(returns, vol=vol, p=p, q=q, dist=dist, mean="Constant")
+        res = model.fix(np.asarray(params, dtype=float))
+        aic = res.aic if aic is None else aic
+        forecaster = cls(spec, params, res.resid.values[:-1], res.conditional_volatility.values[:-1] ** 2, aic,
+                         last_date=returns.index[-2])
+        forecaster.update(float(returns.iloc[-1]), returns.index[-1])
+        return forecaster
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, **options):
+        """
+            runs the model selection on df (options as in volatility_predict) and returns a forecaster,
+            or None when no spec could be fitted.
+        """
+        returns = 100 * df['Close'].pct_change().dropna()
+        selected = select_spec(returns, **options)
+        if selected is None:
+            return None
+        spec, fit = selected
+        return cls.from_returns(returns, spec, fit[3], aic=fit[0])
+
+    def refit(self, df: pd.DataFrame, **options):
+        """ full refit on demand, returns a new forecaster (None if the fit failed). """
+        return VolatilityForecaster.fit(df, **options)
+
+    def _step(self):
+        # one step of the conditional variance recursion from the current state
+        p, o, q = len(self.alpha), len(self.gamma), len(self.beta)
+        resid, variance = np.array(self._resid), np.array(self._variance)
+        if self.egarch:
+            std_resid = resid / np.sqrt(variance)
+            log_var = (self.omega
+                       + self.alpha @ (np.abs(std_resid[:p]) - np.sqrt(2 / np.pi))
+                       + self.gamma @ std_resid[:o]
+                       + self.beta @ np.log(variance[:q]))
+            return float(np.exp(log_var))
+        return float(self.omega
+                     + self.alpha @ resid[:p] ** 2
+                     + self.gamma @ (resid[:o] ** 2 * (resid[:o] < 0))
+                     + self.beta @ variance[:q])
+
+    def update(self, new_return: float, date=None):
+        """
+            feeds one new (percent) return, O(1) in the length of the history. a return with the
+            date of the last one replaces it (that daily bar was still forming when it was fed):
+            the state from before it is taken back and the new value applied instead.
+        """
+        if date is not None and date == self.last_date and self._previous is not None:
+            if new_return == self.last_return:
+                return self._next_variance
+            self._resid, self._variance, self._next_variance = self._previous
+        self._previous = (self._resid, self._variance, self._next_variance)
+        resid = new_return - self.mu
+        self._resid = ([resid] + self._resid)[:len(self._resid)]
+        self._variance = ([self._next_variance] + self._variance)[:len(self._variance)]
+        self._next_variance = self._step()
+        self.last_return = float(new_return)
+        self.last_date = date
+        return self._next_variance
+
+    def update_many(self, returns):
+        """ feeds a series of new returns in order, the first one may repeat the last date (see update). """
+        for date, value in returns.items():
+            self.update(value, date)
+        return self._next_variance
+
+    def predict(self):
+        """ next day forecast in the volatility_predict payload format. """
+        predicted_var = np.array([self._next_variance])
+        qlike = None
+        if self.last_return is not None:
+            qlike = qlike_loss(np.array([self.last_return ** 2]), predicted_var)
+        return _model_reply(predicted_var, self.aic, self.spec, qlike)
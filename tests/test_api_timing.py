@@ -0,0 +1,65 @@
+import json
+import os
+import time
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+import script.metrics
+from script.metrics import trace_http_request, span
+
+
+def timed_app():
+    # the middleware api_app installs, on an app of its own (no model, bar store or data files)
+    app = FastAPI()
+    app.middleware("http")(trace_http_request)
+
+    @app.get("/work")
+    def work():
+        with span("features"):
+            return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_timing_line_only_with_the_flag(capsys, monkeypatch):
+    client = timed_app()
+    monkeypatch.setattr(script.metrics, "TIMING_LOG", False)
+    response = client.get("/work")
+    assert "features=" in response.headers["X-Stage-Timings"]
+    assert "[TIMING]" not in capsys.readouterr().out
+
+    monkeypatch.setattr(script.metrics, "TIMING_LOG", True)
+    client.get("/work")
+    out = capsys.readouterr().out
+    assert "[TIMING]" in out and '"request": "/work"' in out
+
+
+def test_streamed_body_is_part_of_the_trace(capsys, monkeypatch):
+    app = FastAPI()
+    app.middleware("http")(trace_http_request)
+
+    @app.get("/stream")
+    def stream():
+        def body():
+            for i in range(3):
+                with span("garch"):
+                    time.sleep(0.05)
+                yield f"{i}\n".encode()
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    monkeypatch.setattr(script.metrics, "TIMING_LOG", True)
+    response = TestClient(app).get("/stream")
+    assert response.text == "0\n1\n2\n"
+    # the header went out before the body, the timing line covers the whole body
+    assert "garch" not in response.headers["X-Stage-Timings"]
+    line = json.loads(capsys.readouterr().out.split("[TIMING] ", 1)[1])
+    assert line["spans"] == 3 and line["stages"]["garch"] >= 0.15
+    assert line["seconds"] >= 0.15
+
+
+def test_profile_file_named_in_the_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(script.metrics, "PROFILE_FOLDER", str(tmp_path))
+    response = timed_app().get("/work?profile=1")
+    path = response.headers["X-Profile"]
+    assert path.startswith(str(tmp_path)) and path.endswith("_work.txt")
+    assert os.path.exists(path)
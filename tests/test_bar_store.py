@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+from script.bar_store import BarStore
+from script.providers import FakeProvider, SyntheticProvider
+
+WORKERS, SAVES = 4, 30
+
+
+def save_repeatedly(folder: str, worker: int, start):
+    store = BarStore(folder, provider=SyntheticProvider(n_bars=300 + worker))
+    df, meta = store._full_fetch("SYN.NS", "1d", "5y")
+    start.wait()
+    for _ in range(SAVES):
+        store._save("SYN.NS", "1d", df, meta)
+        loaded, _ = store._load("SYN.NS", "1d")
+        assert len(loaded) in range(300, 300 + WORKERS)
+
+
+def test_workers_saving_the_same_ticker(tmp_path):
+    folder = str(tmp_path)
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(WORKERS)
+    workers = [context.Process(target=save_repeatedly, args=(folder, w, start)) for w in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * WORKERS
+    assert [name for name in os.listdir(folder) if name.endswith(".tmp")] == []
+    assert not BarStore(folder, provider=SyntheticProvider()).history("SYN.NS", "1d", "1y").empty
+
+
+def test_first_short_read_backfills_the_full_history(tmp_path):
+    # the cache key lookup reads 5d of a ticker the store has not seen, fetch_latest reads 5y next
+    provider = FakeProvider(SyntheticProvider())
+    store = BarStore(str(tmp_path), provider=provider)
+    assert len(store.history("SYN.NS", "1d", "5d")) <= 5
+    full = store.history("SYN.NS", "1d", "5y")
+    assert provider.calls == 1
+    assert full.equals(SyntheticProvider().history("SYN.NS", interval="1d", period="5y"))
+    # longer than the backfill period still asks for what was requested
+    store.history("SYN.NS", "1d", "max")
+    assert provider.calls == 2
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from script.classifier_model_training import stack_models_fast, update_stack, retune_meta, BASE_LEARNERS
+
+NUM_COLS, CAT_COLS = ["a", "b", "c"], ["sector"]
+
+
+def rows(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 3)), columns=NUM_COLS)
+    X["sector"] = rng.choice(["Energy", "Technology", "Healthcare"], n)
+    logit = 1.5 * X["a"] - X["b"] + 0.5 * (X["sector"] == "Energy")
+    y = pd.Series((rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int), index=X.index)
+    return X, y
+
+
+def tree_count(name, learner):
+    if name == "xgb":
+        return learner.get_booster().num_boosted_rounds()
+    if name == "lgbm":
+        return learner.booster_.current_iteration()
+    return learner.tree_count_
+
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    X, y = rows(1500, 0)
+    oof_path = str(tmp_path_factory.mktemp("oof") / "oof.npz")
+    return stack_models_fast(X, y, NUM_COLS, CAT_COLS, n_jobs=1, cv=3, oof_path=oof_path), oof_path
+
+
+def test_update_stack_continues_the_boosters_on_appended_rows(trained):
+    model, _ = trained
+    X_check, _ = rows(200, 2)
+    before = model.predict_proba(X_check)
+    learners = dict(model.named_steps["stack"].estimators)
+    counts = {name: tree_count(name, learner) for name, learner in learners.items()}
+
+    X_new, y_new = rows(100, 1)
+    # the rows appended after the training set
+    X_new.index = y_new.index = X_new.index + 10_000
+    updated = update_stack(model, X_new, y_new, rounds=5, n_jobs=1)
+
+    stack = updated.named_steps["stack"]
+    # preprocessor and meta learner are kept, every booster has its trees plus the new rounds
+    assert updated.named_steps["preprocessor"] is model.named_steps["preprocessor"]
+    assert stack.final_estimator is model.named_steps["stack"].final_estimator
+    assert [name for name, _ in stack.estimators] == list(BASE_LEARNERS)
+    for name, learner in stack.estimators:
+        assert learner is not learners[name]
+        assert tree_count(name, learner) == counts[name] + 5, name
+
+    # the previous trees are unchanged: xgb over its first trees gives the old model's margins
+    Xt = model.named_steps["preprocessor"].transform(X_check)
+    new_xgb = dict(stack.estimators)["xgb"]
+    np.testing.assert_allclose(new_xgb.predict_proba(Xt, iteration_range=(0, counts["xgb"])),
+                               learners["xgb"].predict_proba(Xt), rtol=1e-6)
+
+    # the model it started from still predicts as before, the update nudges the probabilities
+    np.testing.assert_array_equal(model.predict_proba(X_check), before)
+    after = updated.predict_proba(X_check)
+    assert not np.array_equal(after, before)
+    assert np.abs(after - before).max() < 0.2
+
+
+def test_retune_meta_refits_only_the_meta_learner(trained):
+    model, oof_path = trained
+    stack = model.named_steps["stack"]
+    learners = list(stack.estimators)
+    counts = {name: tree_count(name, learner) for name, learner in learners}
+    previous = stack.final_estimator
+
+    retuned = retune_meta(model, oof_path, LogisticRegression(C=0.01, max_iter=2000))
+    stack = retuned.named_steps["stack"]
+    assert stack.final_estimator is not previous
+    assert not np.allclose(stack.final_estimator.coef_, previous.coef_)
+    assert all(new is old for (_, new), (_, old) in zip(stack.estimators, learners))
+    assert {name: tree_count(name, learner) for name, learner in stack.estimators} == counts
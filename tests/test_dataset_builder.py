@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from script.dataset_builder import build_dataset, load_dataset, dataset_last_date
+from script.model_data_fetch import ticker_metadata
+from script.providers import SyntheticProvider
+
+TICKERS = ["AAA.NS", "BBB.NS", "CCC.NS"]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    # sectors stay "Unknown", no info lookups
+    monkeypatch.setattr(ticker_metadata, "refresh_missing", lambda tickers: [])
+    monkeypatch.setattr(ticker_metadata, "fill_async", lambda ticker: None)
+    return SyntheticProvider(n_bars=500)
+
+
+def next_close_up(provider, ticker):
+    close = provider.history(ticker, interval="1d", period="5y")["Close"]
+    return (close.shift(-1) > close)[:-1]
+
+
+@pytest.mark.parametrize("panel", [True, False])
+def test_newest_bar_is_left_out(provider, tmp_path, panel):
+    folder = str(tmp_path / "dataset")
+    build_dataset(TICKERS, folder=folder, store=provider, panel=panel, max_workers=2)
+    X, y, _, _ = load_dataset(folder)
+    newest = dataset_last_date(folder)
+    for ticker in TICKERS:
+        labels = next_close_up(provider, ticker)
+        rows = (X["ticker"] == ticker).to_numpy()
+        # the rows with a full feature history, up to the bar before the newest one
+        expected = labels.iloc[len(labels) - rows.sum():]
+        assert expected.index[-1] < newest
+        assert (y[rows].to_numpy() == expected.to_numpy()).all(), ticker
+
+
+def test_update_tail_starts_at_trained_until(provider, tmp_path):
+    full = str(tmp_path / "dataset")
+    build_dataset(TICKERS, folder=full, store=provider, panel=True)
+    dates = provider.history(TICKERS[0], interval="1d", period="5y").index
+    # the model was trained three bars ago: that bar got its label since, the newest bar has none
+    trained_until = dates[-3]
+    tail = str(tmp_path / "update")
+    build_dataset(TICKERS, folder=tail, store=provider, panel=True, since=str(trained_until))
+    X, y, _, _ = load_dataset(tail)
+    assert list(X["ticker"].astype(str)) == [t for t in TICKERS for _ in range(2)]
+    for ticker in TICKERS:
+        labels = next_close_up(provider, ticker)
+        assert (y[(X["ticker"] == ticker).to_numpy()].to_numpy() == labels.loc[trained_until:].to_numpy()).all()
+    # the full dataset is not touched by the tail build, since on it gives the same rows
+    X_since, y_since, _, _ = load_dataset(full, since=str(trained_until))
+    np.testing.assert_array_equal(X_since["ticker"].astype(str), X["ticker"].astype(str))
+    np.testing.assert_array_equal(y_since, y)
+    assert dataset_last_date(tail) == dataset_last_date(full) == dates[-1]
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from script.feature_engine import StreamingFeatureEngine
+from script.model_data_fetch import add_features, FEATURE_COLUMNS
+from script.providers import synthetic_daily_bars
+
+TICKER, SECTOR = "SYN.NS", "Technology"
+TEXT_COLUMNS = ("sector", "day_of_week", "ticker")
+# (rtol, atol) per column, pandas' online rolling kurt drifts on low variance windows (up to 5e-4
+# relative, a few 1e-6 absolute) while the engine computes each window exactly
+TOLERANCE = {"rolling_kurt_5": (5e-4, 1e-5)}
+
+
+def bars(n_bars: int = 600, seed: int = 1):
+    return synthetic_daily_bars(seed, n_bars=n_bars)
+
+
+def expected(df: pd.DataFrame):
+    _, X, _ = add_features(df.copy(), SECTOR, TICKER)
+    return X
+
+
+def assert_row_matches(row: dict, reference: pd.Series):
+    for column in FEATURE_COLUMNS:
+        if column in TEXT_COLUMNS:
+            assert row[column] == reference[column], column
+        else:
+            rtol, atol = TOLERANCE.get(column, (1e-8, 1e-10))
+            assert np.isclose(row[column], float(reference[column]), rtol=rtol, atol=atol), column
+
+
+def test_every_bar_matches_add_features():
+    df = bars()
+    X = expected(df)
+    engine = StreamingFeatureEngine(TICKER, SECTOR)
+    rows = {}
+    for timestamp, bar in df.iterrows():
+        row = engine.update(timestamp, bar["High"], bar["Low"], bar["Close"], bar["Volume"])
+        if row is not None:
+            rows[timestamp] = row
+    assert list(rows) == list(X.index)
+    for timestamp, row in rows.items():
+        assert_row_matches(row, X.loc[timestamp])
+
+
+def test_from_history_gives_the_last_row():
+    df = bars()
+    features = StreamingFeatureEngine.from_history(df, TICKER, SECTOR).features()
+    assert list(features.columns) == FEATURE_COLUMNS
+    assert features.index[0] == df.index[-1]
+    assert_row_matches(features.iloc[0].to_dict(), expected(df).iloc[-1])
+
+
+def test_warm_up_gives_none_until_first_valid():
+    df = bars()
+    first_valid = expected(df).index[0]
+    engine = StreamingFeatureEngine(TICKER, SECTOR)
+    for timestamp, bar in df.loc[:first_valid].iloc[:-1].iterrows():
+        assert engine.update(timestamp, bar["High"], bar["Low"], bar["Close"], bar["Volume"]) is None
+        assert engine.features() is None
+    assert engine.first_valid is None
+    engine.update_frame(df.loc[first_valid:first_valid])
+    assert engine.first_valid == first_valid
+    assert engine.features() is not None
+
+
+def test_same_timestamp_replaces_the_last_bar():
+    df = bars()
+    engine = StreamingFeatureEngine.from_history(df, TICKER, SECTOR)
+    revised = df.copy()
+    revised.iloc[-1, revised.columns.get_loc("Close")] *= 1.03
+    revised.iloc[-1, revised.columns.get_loc("High")] = revised["Close"].iloc[-1] * 1.01
+    revised.iloc[-1, revised.columns.get_loc("Volume")] += 12345
+    last = revised.iloc[-1]
+    row = engine.update(revised.index[-1], last["High"], last["Low"], last["Close"], last["Volume"])
+    assert_row_matches(row, expected(revised).iloc[-1])
+    # and again, a bar can be revised more than once
+    row = engine.update(df.index[-1], df["High"].iloc[-1], df["Low"].iloc[-1], df["Close"].iloc[-1], df["Volume"].iloc[-1])
+    assert_row_matches(row, expected(df).iloc[-1])
+
+
+def test_older_bar_is_rejected():
+    df = bars()
+    engine = StreamingFeatureEngine.from_history(df, TICKER, SECTOR)
+    bar = df.iloc[-5]
+    with pytest.raises(ValueError):
+        engine.update(df.index[-5], bar["High"], bar["Low"], bar["Close"], bar["Volume"])
+
+
+def test_is_consistent_after_history_was_adjusted():
+    df = bars()
+    engine = StreamingFeatureEngine.from_history(df, TICKER, SECTOR)
+    assert engine.is_consistent(df)
+    # a split: every bar before the last one is divided by 2
+    adjusted = df.copy()
+    adjusted.iloc[:-1, adjusted.columns.get_indexer(["Open", "High", "Low", "Close"])] /= 2
+    assert not engine.is_consistent(adjusted)
+    # the bar before the last one is gone from the new history
+    assert not engine.is_consistent(df.drop(df.index[-2]))
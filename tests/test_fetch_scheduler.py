@@ -0,0 +1,90 @@
+import threading
+import time
+import pytest
+from script.fetch_scheduler import FetchScheduler, TokenBucket
+from script.providers import FakeProvider, SyntheticProvider
+
+
+def scheduler(latency: float = 0.0, failure_rate: float = 0.0, **options):
+    provider = FakeProvider(SyntheticProvider(n_bars=300), latency=latency, failure_rate=failure_rate)
+    options = dict(dict(rate=1000.0, burst=1000, backoff_base=0.01, seed=0), **options)
+    return FetchScheduler(provider, **options), provider
+
+
+def run_together(n_threads: int, call):
+    barrier = threading.Barrier(n_threads)
+    results = [None] * n_threads
+
+    def worker(i):
+        barrier.wait()
+        results[i] = call(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_requests_make_one_upstream_call():
+    fetcher, provider = scheduler(latency=0.3)
+    frames = run_together(10, lambda i: fetcher.history("SYN.NS", interval="1d", period="1y"))
+    assert provider.calls == 1
+    assert fetcher.stats()["coalesced"] == 9
+    assert fetcher.stats()["in_flight"] == 0
+    # every caller gets the same bars in its own frame
+    assert all(df.equals(frames[0]) for df in frames)
+    assert len({id(df) for df in frames}) == 10
+
+
+def test_different_requests_are_not_coalesced():
+    fetcher, provider = scheduler(latency=0.1)
+    run_together(4, lambda i: fetcher.history(f"SYN{i}.NS", interval="1d", period="1y"))
+    assert provider.calls == 4
+    assert fetcher.stats()["coalesced"] == 0
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=20.0, burst=2)
+    start = time.monotonic()
+    for _ in range(12):
+        bucket.acquire()
+    # the first two are the burst, the other ten wait 1/rate each
+    assert time.monotonic() - start >= 10 / 20.0 * 0.95
+
+
+def test_scheduler_paces_upstream_calls():
+    fetcher, provider = scheduler(rate=20.0, burst=2)
+    start = time.monotonic()
+    for i in range(12):
+        fetcher.history(f"SYN{i}.NS", interval="1d", period="1y")
+    assert time.monotonic() - start >= 10 / 20.0 * 0.95
+    assert provider.calls == 12
+
+
+def test_failed_request_is_retried_then_raised():
+    fetcher, provider = scheduler(failure_rate=1.0, retries=3)
+    with pytest.raises(ConnectionError):
+        fetcher.history("SYN.NS", interval="1d", period="1y")
+    assert provider.calls == 4
+    stats = fetcher.stats()
+    assert (stats["requests"], stats["failures"], stats["retries"]) == (4, 4, 3)
+
+
+def test_flaky_provider_succeeds_after_retries():
+    fetcher, provider = scheduler(failure_rate=0.5, retries=10)
+    for i in range(20):
+        assert not fetcher.history(f"SYN{i}.NS", interval="1d", period="1y").empty
+    stats = fetcher.stats()
+    assert stats["failures"] > 0
+    assert stats["requests"] == provider.calls == 20 + stats["failures"]
+
+
+def test_backoff_is_capped_by_backoff_max():
+    # uncapped, the three sleeps could take up to 10 + 20 + 40 seconds
+    fetcher, _ = scheduler(failure_rate=1.0, retries=3, backoff_base=10.0, backoff_max=0.05)
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        fetcher.history("SYN.NS", interval="1d", period="1y")
+    assert time.monotonic() - start < 3 * 0.05 + 0.5
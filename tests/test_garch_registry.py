@@ -0,0 +1,42 @@
+import json
+import multiprocessing
+import os
+from script.garch_registry import GarchSpecRegistry
+
+WORKERS, TICKERS_PER_WORKER = 4, 25
+
+
+def write_entries(path: str, worker: int, start):
+    # every worker loads the file before any of them has written, like api workers started together
+    registry = GarchSpecRegistry(path)
+    start.wait()
+    for i in range(TICKERS_PER_WORKER):
+        registry.update(f"W{worker}T{i}.NS", ["Garch", "normal", 1, 1], 1000.0 + i, 0.5, [0.1, 0.1, 0.1, 0.8],
+                        nobs=500, reselected=True)
+
+
+def test_workers_sharing_the_file_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "garch_specs.json")
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(WORKERS)
+    workers = [context.Process(target=write_entries, args=(path, w, start)) for w in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    with open(path) as f:
+        entries = json.load(f)
+    assert len(entries) == WORKERS * TICKERS_PER_WORKER
+    assert GarchSpecRegistry(path).get("W3T24.NS")["aic"] == 1024.0
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_save_picks_up_entries_written_by_another_process(tmp_path):
+    path = str(tmp_path / "garch_specs.json")
+    first, second = GarchSpecRegistry(path), GarchSpecRegistry(path)
+    first.update("A.NS", ["Garch", "normal", 1, 1], 900.0, 0.5, [0.1, 0.1, 0.1, 0.8], nobs=500, reselected=True)
+    second.update("B.NS", ["EGARCH", "t", 1, 1], 800.0, 0.4, [0.1, 0.1, 0.1, 0.9, 8.0], nobs=500, reselected=True)
+    assert second.get("A.NS")["aic"] == 900.0
+    assert sorted(GarchSpecRegistry(path)._entries) == ["A.NS", "B.NS"]
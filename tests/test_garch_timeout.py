@@ -0,0 +1,46 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from script import train_volatility_prediction as tvp
+
+
+@pytest.fixture(scope="module")
+def returns():
+    rng = np.random.default_rng(0)
+    return pd.Series(rng.standard_t(5, 1000), index=pd.bdate_range(end="2025-09-26", periods=1000))
+
+
+def test_deadline_interrupts_the_block():
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        with tvp._deadline(0.2):
+            time.sleep(5)
+    assert time.perf_counter() - start < 1
+
+
+def test_fit_past_its_deadline_is_dropped(returns):
+    assert tvp._fit_spec(returns, "Garch", "normal", 1, 1, timeout=1e-4) is None
+    fit = tvp._fit_spec(returns, "Garch", "normal", 1, 1, timeout=60)
+    assert fit is not None and np.isfinite(fit[0])
+
+
+def test_pool_fits_past_their_deadline_free_the_workers(returns):
+    specs = [("GJR-GARCH", "skewt", 2, 2)] * 4
+    start = time.perf_counter()
+    assert tvp._fit_specs(returns, specs, n_jobs=2, fit_timeout=1e-3) == {}
+    assert time.perf_counter() - start < tvp.FIT_TIMEOUT_GRACE
+    # same pool, the workers are free again
+    assert len(tvp._fit_specs(returns, [("Garch", "normal", 1, 1)], n_jobs=2, fit_timeout=60)) == 1
+
+
+def test_reset_pool_ends_a_stuck_worker():
+    pool = tvp._get_pool(1)
+    pool.submit(time.sleep, 60)
+    time.sleep(0.5)
+    processes = list(pool._processes.values())
+    tvp._reset_pool()
+    for process in processes:
+        process.join(5)
+        assert not process.is_alive()
+    assert tvp._pool is None
@@ -0,0 +1,20 @@
+import script.intraday_store
+from script.intraday_store import IntradayStore
+from script.providers import SyntheticProvider
+
+TODAY = "2025-09-26"  # a friday, the last session of the synthetic market
+
+
+def test_default_session_is_the_latest_completed_one(tmp_path, monkeypatch):
+    # before the close: today's bars are there but still forming
+    monkeypatch.setattr(script.intraday_store, "today", lambda: TODAY)
+    store = IntradayStore(str(tmp_path), provider=SyntheticProvider(end=TODAY))
+    monkeypatch.setattr(store, "_complete", lambda day: day < TODAY)
+    latest = store.session("SYN.NS")
+    assert set(latest.index.strftime("%Y-%m-%d")) == {"2025-09-25"}
+    assert not store.session("SYN.NS", TODAY).empty
+
+    # after the close today is the latest session
+    monkeypatch.setattr(store, "_complete", lambda day: day <= TODAY)
+    monkeypatch.setattr(store, "refresh_interval", 0)
+    assert set(store.session("SYN.NS").index.strftime("%Y-%m-%d")) == {TODAY}
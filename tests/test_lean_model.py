@@ -0,0 +1,64 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from script.lean_model import LeanModel, load_model, lean_path, export_lean_model
+from script.model_data_fetch import add_features, FEATURE_COLUMNS
+from script.providers import synthetic_daily_bars
+
+MODEL_PATH = "model/stock_prediction26-09-2025_21-59-07.pkl"
+NUMERIC = [c for c in FEATURE_COLUMNS if c not in ("sector", "day_of_week", "ticker")]
+
+
+@pytest.fixture(scope="module")
+def models():
+    return joblib.load(MODEL_PATH), load_model(MODEL_PATH)
+
+
+def rows():
+    """ feature rows of known tickers and sectors, an unknown sector, an unknown ticker and nan holes. """
+    parts = []
+    for seed, (ticker, sector) in enumerate([("TCS.NS", "Technology"), ("RELIANCE.NS", "Energy"),
+                                             ("NOTLISTED.NS", "Technology"), ("INFY.NS", "Space Mining")]):
+        _, X, _ = add_features(synthetic_daily_bars(seed, n_bars=450), sector, ticker)
+        parts.append(X.tail(40))
+    X = pd.concat(parts, ignore_index=True)
+    rng = np.random.default_rng(0)
+    holes = X.sample(40, random_state=1).index
+    for i in holes:
+        X.loc[i, rng.choice(NUMERIC, 3, replace=False)] = np.nan
+    X.loc[holes[0], NUMERIC] = np.nan  # every numeric feature missing
+    return X[FEATURE_COLUMNS]
+
+
+def test_load_model_picks_the_lean_artifact(models):
+    _, lean = models
+    assert isinstance(lean, LeanModel)
+    assert sorted(lean.feature_names_in_) == sorted(FEATURE_COLUMNS)
+
+
+def test_lean_matches_pipeline(models):
+    pipeline, lean = models
+    X = rows()
+    assert X[NUMERIC].isna().any(axis=1).sum() == 40
+    np.testing.assert_allclose(lean.predict_proba(X), pipeline.predict_proba(X), rtol=1e-6, atol=1e-7)
+    np.testing.assert_array_equal(lean.predict(X), pipeline.predict(X))
+
+
+def test_unknown_categories_and_missing_values(models):
+    pipeline, lean = models
+    X = rows()
+    unknown = X[(X["sector"] == "Space Mining") | (X["ticker"] == "NOTLISTED.NS")]
+    missing = X[X[NUMERIC].isna().any(axis=1)]
+    assert len(unknown) == 80 and len(missing) == 40
+    for part in (unknown, missing):
+        np.testing.assert_allclose(lean.predict_proba(part), pipeline.predict_proba(part), rtol=1e-6, atol=1e-7)
+
+
+def test_export_round_trip(models, tmp_path):
+    pipeline, lean = models
+    path = str(tmp_path / "model.lean.npz")
+    export_lean_model(pipeline, path, source_path=MODEL_PATH)
+    X = rows()
+    np.testing.assert_array_equal(LeanModel.load(path).predict_proba(X), lean.predict_proba(X))
+    assert lean_path(MODEL_PATH).endswith(".lean.npz")
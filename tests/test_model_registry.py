@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+from script.model_registry import register_model, read_manifest, scan_folder
+
+WORKERS, MODELS_PER_WORKER = 4, 10
+
+
+def register_models(folder: str, worker: int, start):
+    start.wait()
+    for i in range(MODELS_PER_WORKER):
+        path = os.path.join(folder, f"model_w{worker}_{i}.pkl")
+        with open(path, "wb") as f:
+            f.write(f"{worker}-{i}".encode())
+        register_model(path, activate=True)
+
+
+def test_concurrent_registrations_keep_every_version(tmp_path):
+    folder = str(tmp_path)
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(WORKERS + 1)
+    workers = [context.Process(target=register_models, args=(folder, w, start)) for w in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    # a watcher scanning the folder while the training runs register their models
+    start.wait()
+    for _ in range(20):
+        scan_folder(folder)
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    manifest = read_manifest(folder)
+    assert len(manifest["versions"]) == WORKERS * MODELS_PER_WORKER
+    assert manifest["active"] in manifest["versions"]
+    assert [name for name in os.listdir(folder) if name.endswith(".tmp")] == []
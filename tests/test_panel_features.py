@@ -0,0 +1,122 @@
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from script.model_data_fetch import add_features, FEATURE_COLUMNS
+from script.panel_features import panel_features
+from script.providers import synthetic_daily_bars
+
+TEXT_COLUMNS = ("sector", "day_of_week", "ticker")
+# (rtol, atol) per column against add_features. pandas' rolling skew and kurt are online sums that
+# drift on low variance windows (kurt by up to 5e-4 relative on market like bars) while the panel
+# computes each window in two passes, the other features agree to ~1e-13
+TOLERANCE = {"rolling_kurt_5": (5e-4, 1e-5), "rolling_skew_5": (1e-6, 1e-9)}
+DEFAULT_TOLERANCE = (1e-9, 1e-10)
+
+# (bars, last date) per ticker: unequal lengths and start dates, one too short to keep any row
+UNIVERSE = {
+    "AAA.NS": (600, "2025-09-26"),
+    "BBB.NS": (450, "2025-06-30"),
+    "CCC.NS": (800, "2025-09-26"),
+    "DDD.NS": (380, "2024-12-31"),
+    "EEE.NS": (300, "2025-09-26"),
+}
+SECTORS = {"AAA.NS": "Technology", "BBB.NS": "Energy", "CCC.NS": "Technology", "DDD.NS": "Healthcare"}
+
+
+def universe():
+    return {
+        ticker: synthetic_daily_bars(seed, price=100.0 * (seed + 1), n_bars=n_bars, end=end)
+        for seed, (ticker, (n_bars, end)) in enumerate(UNIVERSE.items())
+    }
+
+
+def long_table(bars: dict):
+    return pd.concat([df.assign(ticker=ticker) for ticker, df in bars.items()])
+
+
+def assert_ticker_matches(X: pd.DataFrame, y: pd.Series, ticker: str, df: pd.DataFrame, sectors: dict = SECTORS):
+    _, expected_X, expected_y = add_features(df.copy(), sectors.get(ticker, "Unknown"), ticker)
+    rows = (X["ticker"] == ticker).to_numpy()
+    got_X, got_y = X[rows], y[rows]
+    assert list(got_X.index) == list(expected_X.index), ticker
+    assert (got_y.to_numpy() == expected_y.to_numpy().astype(int)).all(), ticker
+    for column in FEATURE_COLUMNS:
+        if column in TEXT_COLUMNS:
+            assert (got_X[column].astype(str).to_numpy() == expected_X[column].astype(str).to_numpy()).all(), column
+        else:
+            rtol, atol = TOLERANCE.get(column, DEFAULT_TOLERANCE)
+            np.testing.assert_allclose(got_X[column].to_numpy(float), expected_X[column].to_numpy(float),
+                                       rtol=rtol, atol=atol, err_msg=f"{ticker} {column}")
+
+
+def test_matches_add_features_per_ticker():
+    bars = universe()
+    X, y = panel_features(long_table(bars), SECTORS)
+    assert list(X.columns) == FEATURE_COLUMNS
+    assert len(X) == len(y)
+    for ticker, df in bars.items():
+        assert_ticker_matches(X, y, ticker, df)
+    # the 300 bar ticker never has a complete row (return_365d), as with add_features
+    assert "EEE.NS" not in set(X["ticker"])
+    assert set(X["sector"][X["ticker"] == "DDD.NS"]) == {"Healthcare"}
+
+
+def test_rows_are_ordered_by_ticker_then_date():
+    X, _ = panel_features(long_table(universe()), SECTORS)
+    tickers = X["ticker"].astype(str).to_numpy()
+    assert list(dict.fromkeys(tickers)) == sorted(set(tickers))
+    for ticker in set(tickers):
+        assert X.index[tickers == ticker].is_monotonic_increasing
+
+
+def test_ticker_boundaries_inside_a_chunk():
+    # a short ticker right after a long one in the same chunk: its first windows must not see the
+    # other ticker's tail, whatever the chunk size and the input order
+    bars = universe()
+    reference_X, reference_y = panel_features(long_table(bars), SECTORS)
+    shuffled = long_table(bars).sample(frac=1.0, random_state=0)
+    for chunk_size in (1, 2, 3, 256):
+        X, y = panel_features(shuffled, SECTORS, chunk_size=chunk_size)
+        pd.testing.assert_frame_equal(X, reference_X)
+        pd.testing.assert_series_equal(y, reference_y)
+    first_rows = reference_X.groupby("ticker", observed=True).head(1)
+    for _, row in first_rows.iterrows():
+        ticker = row["ticker"]
+        _, expected_X, _ = add_features(bars[ticker].copy(), SECTORS.get(ticker, "Unknown"), ticker)
+        assert row.name == expected_X.index[0]
+        assert np.isclose(row["return_365d"], expected_X["return_365d"].iloc[0], rtol=1e-12)
+        assert np.isclose(row["sma200"], expected_X["sma200"].iloc[0], rtol=1e-12)
+
+
+def exact_moments(window):
+    """ (skew, excess kurt) of one window as pandas defines them, the moments in exact fractions. """
+    values = [Fraction(v) for v in window]
+    n = len(values)
+    mean = sum(values) / n
+    m2, m3, m4 = (sum((v - mean) ** k for v in values) / n for k in (2, 3, 4))
+    kurt = ((n + 1) * (m4 / (m2 * m2) - 3) + 6) * (n - 1) / ((n - 2) * (n - 3))
+    skew = (n * (n - 1)) ** 0.5 / (n - 2) * float(m3) / float(m2) ** 1.5
+    return skew, float(kurt)
+
+
+def test_rolling_moments_on_low_variance_windows():
+    # stretches of closes within 0.1% of 100 between a random walk around 500: right after the walk
+    # pandas' online sums lose most digits (kurt is off by up to ~80%), so the panel is checked
+    # against the exact moments of every window instead
+    df = synthetic_daily_bars(7, n_bars=500)
+    flat = np.arange(len(df)) % 40 < 10
+    df.loc[flat, "Close"] = 100.0 * (1 + 1e-3 * np.random.default_rng(1).normal(size=flat.sum()))
+    for column in ("Open", "High", "Low"):
+        df.loc[flat, column] = df.loc[flat, "Close"]
+    X, _ = panel_features(long_table({"FLAT.NS": df}), {"FLAT.NS": "Energy"})
+    closes = df["Close"]
+    checked = 0
+    for date, row in X.iterrows():
+        end = closes.index.get_loc(date) + 1
+        if not flat[end - 5:end].all():
+            continue
+        skew, kurt = exact_moments(closes.iloc[end - 5:end])
+        assert np.isclose(row["rolling_skew_5"], skew, rtol=1e-8, atol=1e-10), date
+        assert np.isclose(row["rolling_kurt_5"], kurt, rtol=1e-8, atol=1e-10), date
+        checked += 1
+    assert checked > 20
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+import pytest
+import script.engine
+from script.bar_store import BarStore
+from script.engine import PredictionEngine
+from script.model_data_fetch import ticker_metadata, ticker_sector
+from script.prediction_cache import PredictionCache
+from script.providers import SyntheticProvider
+
+TICKER = "SYN.NS"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # no background info lookups, the test says what the metadata index knows
+    monkeypatch.setattr(ticker_metadata, "fill_async", lambda ticker: None)
+    monkeypatch.delitem(ticker_metadata._entries, TICKER, raising=False)
+    calls = []
+
+    def predict_ticker(model, ticker, threshold, **kwargs):
+        calls.append(ticker)
+        return {"Direction Prediction": {"Probability": 0.7, "Direction": "Up", "Sector": ticker_sector(ticker)}}
+
+    monkeypatch.setattr(script.engine, "predict_ticker", predict_ticker)
+    registry = SimpleNamespace(current=lambda: SimpleNamespace(version="v1", model=None))
+    engine = PredictionEngine(registry, BarStore(str(tmp_path / "bars"), provider=SyntheticProvider()),
+                              PredictionCache(maxsize=100, ttl=600))
+    engine.calls = calls
+    return engine
+
+
+def test_reply_is_cached_per_sector(engine, monkeypatch):
+    first = engine.reply(TICKER, 0.5)
+    assert first["Direction Prediction"]["Sector"] == "Unknown"
+    assert engine.reply(TICKER, 0.5) == first
+    assert len(engine.calls) == 1
+
+    # the metadata fill lands, the reply made with "Unknown" is not served any more
+    monkeypatch.setitem(ticker_metadata._entries, TICKER, {"sector": "Technology"})
+    second = engine.reply(TICKER, 0.5)
+    assert second["Direction Prediction"]["Sector"] == "Technology"
+    assert len(engine.calls) == 2
+    assert engine.reply(TICKER, 0.5) == second
+    assert len(engine.calls) == 2
+
+
+def test_key_holds_the_sector():
+    cache = PredictionCache(maxsize=10, ttl=600)
+    assert cache.make_key(TICKER, "2025-09-26", "v1", 0.5, "Unknown") != \
+        cache.make_key(TICKER, "2025-09-26", "v1", 0.5, "Technology")
+    assert cache.make_key(TICKER, "2025-09-26", "v1", 0.501, "Technology") == \
+        cache.make_key(TICKER, "2025-09-26", "v1", 0.5, "Technology")
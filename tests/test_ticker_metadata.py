@@ -0,0 +1,20 @@
+import json
+from script.providers import SyntheticProvider
+from script.ticker_metadata import TickerMetadataIndex
+
+
+def test_indexes_sharing_the_file_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "ticker_metadata.json")
+    # two api workers started on the same (empty) file
+    first = TickerMetadataIndex(path, provider=SyntheticProvider())
+    second = TickerMetadataIndex(path, provider=SyntheticProvider())
+    first.refresh(["A.NS", "B.NS"])
+    second.fill_async("C.NS").result()
+    second.refresh(["D.NS"])
+
+    with open(path) as f:
+        assert sorted(json.load(f)) == ["A.NS", "B.NS", "C.NS", "D.NS"]
+    # the second one picked the first one's entries up when it saved
+    assert second.get("A.NS")["sector"] == first.get("A.NS")["sector"]
+    assert first.get("C.NS") is None
+    assert [name for name in tmp_path.iterdir() if name.suffix == ".tmp"] == []
@@ -0,0 +1,66 @@
+from datetime import date
+from script.engine import Prediction, TradeSetup
+from script.precompute_store import PrecomputeStore
+from script.stream_encoding import encode_ndjson, decode_ndjson
+from script.trade_calculator import precomputed_trade_setups, trade_setup
+
+
+def reply(probability: float):
+    return {
+        "Direction Prediction": {"Direction": "Up" if probability >= 0.5 else "Down", "Probability": probability},
+        "Volatility Prediction": {
+            "Prediction": {"Predicted Change/Volume": 2.5, "Predicted Variance": 1.2},
+            "Model Description": {"QLIKE Score": 0.8, "Model AIC": 1000.0},
+        },
+    }
+
+
+def store_with_two_versions(tmp_path):
+    store = PrecomputeStore(str(tmp_path / "precomputed.sqlite"))
+    today = date.today().isoformat()
+    store.put_many(today, "old", {"A.NS": (reply(0.9), 100.0)})
+    # the newer run, latest_run without a version would pick it for every caller
+    store.put_many(today, "new", {"A.NS": (reply(0.1), 100.0), "B.NS": (reply(0.8), 50.0)})
+    return store
+
+
+def test_reads_the_run_of_the_served_version(tmp_path):
+    store = store_with_two_versions(tmp_path)
+    rows, run_date = precomputed_trade_setups(["A.NS", "B.NS"], 1.0, "old", store=store)
+    assert run_date == date.today().isoformat()
+    assert list(rows) == ["A.NS"]
+    assert rows["A.NS"][1] == "Long" and rows["A.NS"][2] == 0.9
+
+    rows, _ = precomputed_trade_setups(["A.NS", "B.NS"], 1.0, "new", store=store)
+    assert sorted(rows) == ["A.NS", "B.NS"]
+    assert rows["A.NS"][1] == "Short"
+
+
+def test_no_run_for_the_served_version(tmp_path):
+    store = store_with_two_versions(tmp_path)
+    assert precomputed_trade_setups(["A.NS"], 1.0, "other", store=store) == ({}, None)
+    # the served version is not known (api down), everything is predicted live
+    assert precomputed_trade_setups(["A.NS"], 1.0, None, store=store) == ({}, None)
+
+
+def test_failed_volatility_fit(tmp_path):
+    # volatility_predict answers with a message when the garch fit failed
+    failed = dict(reply(0.7), **{"Volatility Prediction": "failed to build model."})
+    store = PrecomputeStore(str(tmp_path / "precomputed.sqlite"))
+    today = date.today().isoformat()
+    store.put_many(today, "v1", {"A.NS": (failed, 100.0), "B.NS": (reply(0.8), 50.0)})
+    rows, _ = precomputed_trade_setups(["A.NS", "B.NS"], 1.0, "v1", store=store)
+    assert rows["A.NS"] == ("A.NS", "Long", 0.7, None, None, None, None, None, None, None)
+    assert rows["B.NS"][3] == 2.5 and rows["B.NS"][6] == 50.0
+    assert trade_setup("A.NS", failed, 1.0, current_price=100.0) == rows["A.NS"]
+
+
+def test_streamed_record_gives_the_same_row():
+    # the Trade Calculator reads /predict/stream records, their row is the one of the full reply
+    full = dict(reply(0.3), **{"Last Close": 100.0})
+    lines = b"".join(encode_ndjson([[Prediction.from_reply("A.NS", full, "v1")]])).splitlines()
+    record, = decode_ndjson(lines)
+    setup = TradeSetup.from_prediction(Prediction(**record), 1.0)
+    assert setup.as_row() == trade_setup("A.NS", full, 1.0)
+    assert setup.type == "Short" and setup.current_price == 100.0
+    assert TradeSetup.from_prediction(Prediction("B.NS", error="No data for B.NS"), 1.0) == TradeSetup("B.NS")
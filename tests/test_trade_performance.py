@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from script.trade_performance import trade_performance_calculator, simulate_trades
+from script.benchmark import synthetic_trades
+
+EXECUTING_INTERVAL, EXECUTING_INTERVAL_PRICE = 5, 0.2
+
+
+def session(closes, start: str = "2025-09-26 09:15"):
+    index = pd.date_range(start, periods=len(closes), freq="1min", tz="Asia/Kolkata", name="Datetime")
+    return pd.DataFrame({"Close": np.asarray(closes, dtype=float)}, index=index)
+
+
+def sheet(rows):
+    """ rows of (ticker, type, current price, stop loss, target) as a Trade Calculator sheet. """
+    return pd.DataFrame(rows, columns=["Ticker", "Type", "Current Price", "SL Price", "Target Price"])
+
+
+def legacy(trades: pd.DataFrame, bars: dict):
+    return [
+        trade_performance_calculator(
+            ticker=row["Ticker"], last_price=row["Current Price"], stop_loss=row["SL Price"],
+            target_price=row["Target Price"], long=row["Type"].lower() == "long",
+            executing_interval=EXECUTING_INTERVAL, executing_interval_price=EXECUTING_INTERVAL_PRICE,
+            bars=bars[row["Ticker"]],
+        )
+        for _, row in trades.iterrows()
+    ]
+
+
+def assert_same(trades: pd.DataFrame, bars: dict):
+    records = simulate_trades(trades, EXECUTING_INTERVAL, EXECUTING_INTERVAL_PRICE, bars=bars)
+    expected = legacy(trades, bars)
+    assert len(records) == len(expected)
+    for record, reference in zip(records, expected):
+        assert record.keys() == reference.keys()
+        for key, value in reference.items():
+            if isinstance(value, str):
+                assert record[key] == value, key
+            else:
+                assert np.isclose(record[key], value), key
+    return records
+
+
+def results(records):
+    return [record["result"] for record in records]
+
+
+# 120 bars rising from 100 to about 106, then falling back below 100
+RISE_AND_FALL = np.concatenate([np.linspace(100, 106, 60), np.linspace(106, 98, 60)])
+
+
+def test_long_and_short_rows():
+    bars = {"A.NS": session(RISE_AND_FALL)}
+    trades = sheet([
+        ("A.NS", "Long", 100.0, 97.0, 103.0),   # target on the way up
+        ("A.NS", "Short", 100.0, 103.0, 97.0),  # stop on the way up
+        ("A.NS", "Long", 100.0, 99.0, 110.0),   # stop on the way down
+        ("A.NS", "Short", 100.0, 110.0, 99.0),  # target on the way down
+    ])
+    records = assert_same(trades, bars)
+    assert results(records) == ["target", "stop_loss", "stop_loss", "target"]
+    assert records[0]["pnl"] > 0 and records[1]["pnl"] < 0
+    assert records[2]["pnl"] < 0 and records[3]["pnl"] > 0
+
+
+def test_trade_never_executed():
+    bars = {"A.NS": session(RISE_AND_FALL), "B.NS": session([])}
+    trades = sheet([
+        ("A.NS", "Long", 90.0, 85.0, 95.0),   # no close in the entry band during the entry window
+        ("A.NS", "Short", 101.0, 102.0, 98.0),  # the band is only reached after the entry window
+        ("B.NS", "Long", 100.0, 95.0, 105.0),  # no bars at all
+    ])
+    records = assert_same(trades, bars)
+    assert results(records) == ["Trade not executed"] * 3
+    assert records[2]["entry_price"] == "Unable to fetch data(error)"
+    assert all(record["pnl"] == 0 for record in records)
+
+
+def test_target_and_stop_in_the_same_bar():
+    # an inverted sheet: the entry bar is past both the target and the stop, the target wins
+    bars = {"A.NS": session(RISE_AND_FALL)}
+    trades = sheet([
+        ("A.NS", "Long", 100.0, 101.0, 99.0),
+        ("A.NS", "Short", 100.0, 99.0, 101.0),
+    ])
+    records = assert_same(trades, bars)
+    assert results(records) == ["target", "target"]
+    assert records[0]["exit_time"] == records[0]["entry_time"]
+
+
+def test_timeout_exit():
+    flat = 100 + 0.1 * np.sin(np.arange(90))
+    bars = {"A.NS": session(flat)}
+    trades = sheet([("A.NS", "Long", 100.0, 95.0, 105.0), ("A.NS", "Short", 100.0, 105.0, 95.0)])
+    records = assert_same(trades, bars)
+    assert results(records) == ["timeout", "timeout"]
+    assert records[0]["exit_time"] == str(bars["A.NS"].index[-15])
+
+
+def test_timeout_exit_on_a_short_session():
+    # fewer than 15 bars after the entry, the trade leaves on its entry bar
+    bars = {"A.NS": session([99.0, 100.0, 100.1, 100.2, 100.1, 100.0, 100.1, 100.2, 100.1, 100.0])}
+    trades = sheet([("A.NS", "Long", 100.0, 95.0, 105.0), ("A.NS", "Short", 100.0, 105.0, 95.0)])
+    records = assert_same(trades, bars)
+    assert results(records) == ["timeout", "timeout"]
+    assert records[0]["exit_time"] == records[0]["entry_time"] == str(bars["A.NS"].index[1])
+    assert records[0]["pnl"] == 0
+
+
+def test_several_rows_per_ticker_keep_their_order():
+    trades, bars = synthetic_trades(300, 7, seed=3)
+    records = assert_same(trades, bars)
+    assert [record["ticker"] for record in records] == trades["Ticker"].tolist()
+    assert len(set(results(records))) > 1
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+from arch import arch_model
+from script.prediction import forecast_volatility
+from script.providers import synthetic_daily_bars
+from script.train_volatility_prediction import VolatilityForecaster
+
+# (spec, params) with clear arch and garch terms, fits on the synthetic bars put alpha at 0
+SPECS = [
+    (["Garch", "normal", 1, 1], [0.05, 0.05, 0.10, 0.85]),
+    (["EGARCH", "t", 1, 1], [0.05, 0.02, 0.15, 0.95, 8.0]),
+    (["EGARCH", "skewt", 2, 1], [0.05, 0.02, 0.10, 0.05, 0.95, 8.0, -0.1]),
+    (["Garch", "t", 1, 2], [0.05, 0.05, 0.12, 0.50, 0.33, 6.0]),
+]
+
+
+def percent_returns(df: pd.DataFrame):
+    return 100 * df["Close"].pct_change().dropna()
+
+
+def arch_forecast(returns: pd.Series, spec: list, params):
+    vol, dist, p, q = spec
+    res = arch_model(returns, vol=vol, p=p, q=q, dist=dist, mean="Constant").fix(np.asarray(params))
+    return float(res.forecast(horizon=1, reindex=False).variance.iloc[-1, 0])
+
+
+def predicted_variance(forecaster):
+    return forecaster.predict()["Prediction"]["Predicted Variance"]
+
+
+@pytest.fixture(scope="module")
+def returns():
+    return percent_returns(synthetic_daily_bars(3, n_bars=800))
+
+
+IDS = ["-".join(map(str, spec)) for spec, _ in SPECS]
+
+
+@pytest.mark.parametrize("spec, params", SPECS, ids=IDS)
+def test_matches_arch_forecast(returns, spec, params):
+    forecaster = VolatilityForecaster.from_returns(returns[:-30], spec, params)
+    assert forecaster._next_variance == pytest.approx(arch_forecast(returns[:-30], spec, params), rel=1e-9)
+    # the new days one recursion step each, as if arch had filtered the whole history
+    forecaster.update_many(returns[-30:])
+    assert forecaster._next_variance == pytest.approx(arch_forecast(returns, spec, params), rel=1e-9)
+    assert forecaster.last_date == returns.index[-1]
+
+
+@pytest.mark.parametrize("spec, params", SPECS[:2], ids=IDS[:2])
+def test_bar_revised_with_the_same_date(returns, spec, params):
+    final = VolatilityForecaster.from_returns(returns, spec, params)
+
+    # the last day was fed while its bar was still forming, then comes in again with the final close
+    forecaster = VolatilityForecaster.from_returns(returns[:-1], spec, params)
+    forming = returns.iloc[-1] - 2.0
+    forecaster.update(forming, returns.index[-1])
+    assert forecaster._next_variance != pytest.approx(final._next_variance, rel=1e-6)
+    forecaster.update_many(returns[returns.index >= forecaster.last_date])
+    assert forecaster._next_variance == pytest.approx(final._next_variance, rel=1e-12)
+    assert forecaster.last_return == returns.iloc[-1]
+    # the same value again changes nothing, the next day steps on from the corrected state
+    forecaster.update(returns.iloc[-1], returns.index[-1])
+    assert forecaster._next_variance == pytest.approx(final._next_variance, rel=1e-12)
+    forecaster.update(0.5, returns.index[-1] + pd.Timedelta(days=1))
+    final.update(0.5, returns.index[-1] + pd.Timedelta(days=1))
+    assert forecaster._next_variance == pytest.approx(final._next_variance, rel=1e-12)
+
+    # a revision that came in through from_returns (the fit saw the forming bar) is taken back too
+    revised = returns.copy()
+    revised.iloc[-1] = forming
+    forecaster = VolatilityForecaster.from_returns(revised, spec, params)
+    forecaster.update(returns.iloc[-1], returns.index[-1])
+    assert forecaster._next_variance == pytest.approx(VolatilityForecaster.from_returns(returns, spec, params)._next_variance,
+                                                     rel=1e-12)
+
+
+class RevisedStore:
+    """ daily bars whose last close moves between calls, like a session still trading. """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def history(self, ticker: str, interval: str, period: str):
+        return self.df.copy()
+
+
+def test_forecast_volatility_re_applies_a_forming_bar():
+    df = synthetic_daily_bars(3, n_bars=800)
+    spec, params = SPECS[0]
+    forming = df.copy()
+    forming.iloc[-1, forming.columns.get_loc("Close")] *= 0.97
+    store = RevisedStore(forming)
+    forecasters = {"SYN.NS": VolatilityForecaster.from_returns(percent_returns(df)[:-1], spec, params)}
+
+    first = forecast_volatility(forecasters, "SYN.NS", store=store)
+    store.df = df
+    second = forecast_volatility(forecasters, "SYN.NS", store=store)
+    expected = arch_forecast(percent_returns(df), spec, params)
+    assert first["Volatility Prediction"]["Prediction"]["Predicted Variance"] != pytest.approx(expected, rel=1e-6)
+    assert predicted_variance(forecasters["SYN.NS"]) == pytest.approx(expected, rel=1e-9)
+    assert second["Last Date"] == str(df.index[-1])